@@ -12,7 +12,15 @@ Other modules should import from here:
     from api import api_service
 """
 
-from .interface import api_service
+
+
+def __getattr__(name):
+    """Import the routes on first use of api_service, so running a submodule like api.prefork stays light"""
+    if name != 'api_service':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from .interface import api_service
+    globals()['api_service'] = api_service
+    return api_service
 
 # Export the main service
 __all__ = ['api_service']
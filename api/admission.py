@@ -0,0 +1,159 @@
+"""
+API Admission Control
+
+Bounds how much expensive work (LLM calls, embeddings, vector queries) the
+process takes on at once. Up to `max_in_flight` expensive requests run, up to
+`max_queue` more wait briefly for a slot, and anything beyond that gets an
+immediate 503 with a Retry-After estimated from recent latency. Cheap routes
+(/health, pages, static files) never pass through the controller, so they stay
+fast while the expensive routes are saturated.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+from monitoring.logs import get_logger
+from monitoring.metrics import registry
+from .config import ADMISSION_CONFIG
+
+logger = get_logger('api.admission')
+
+
+class Overloaded(Exception):
+    """Raised when a request can't be admitted; carries a Retry-After hint"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Slots for expensive requests plus a bounded, time-limited FIFO wait queue"""
+
+    def __init__(self, max_in_flight: int = None, max_queue: int = None, queue_timeout: float = None):
+        self.max_in_flight = max_in_flight or ADMISSION_CONFIG['max_in_flight']
+        self.max_queue = ADMISSION_CONFIG['max_queue'] if max_queue is None else max_queue
+        self.queue_timeout = ADMISSION_CONFIG['queue_timeout'] if queue_timeout is None else queue_timeout
+        self.in_flight = 0
+        self.shed = 0
+        self.operations: Dict[str, int] = {'llm': 0, 'vector': 0}
+        self._waiters = deque()  # Futures of queued requests, oldest first
+        self._avg_seconds = 1.0  # EWMA of admitted request duration
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Rough time until a slot frees up for a newcomer"""
+        backlog = (self.queued + 1) / self.max_in_flight
+        return max(1, math.ceil(self._avg_seconds * backlog))
+
+    async def _acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            self.shed += 1
+            raise Overloaded(self.retry_after(), 'queue full')
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # _release hands its slot straight to the waiter, so in_flight is already counted
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return  # The slot arrived just as the timeout fired
+            self.shed += 1
+            raise Overloaded(self.retry_after(), 'queue timeout')
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # Handed a slot, then cancelled (client gone): pass it on
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of one expensive request, or raise Overloaded"""
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release()
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.perf_counter() - start)
+
+    @contextmanager
+    def operation(self, kind: str):
+        """Count an in-flight LLM or vector operation"""
+        self.operations[kind] = self.operations.get(kind, 0) + 1
+        try:
+            yield
+        finally:
+            self.operations[kind] -= 1
+
+    def snapshot(self) -> Dict:
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'shed_total': self.shed,
+            'operations': dict(self.operations),
+        }
+
+
+class AdmissionMiddleware:
+    """Runs the expensive routes through an AdmissionController; 503s them when saturated"""
+
+    def __init__(self, app, controller: AdmissionController = None, routes=None):
+        self.app = app
+        self.controller = controller or admission_controller
+        self.routes = tuple(routes or ADMISSION_CONFIG['routes'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.routes:
+            return await self.app(scope, receive, send)
+        try:
+            async with self.controller.admit():
+                return await self.app(scope, receive, send)
+        except Overloaded as e:
+            logger.warning("request shed", extra={"path": scope['path'], "reason": e.reason, **self.controller.snapshot()})
+            await send({
+                'type': 'http.response.start',
+                'status': 503,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'retry-after', str(e.retry_after).encode()),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': b'{"detail":"Server busy, retry later"}'})
+
+
+# One controller per process, shared by every app instance
+admission_controller = AdmissionController()
+
+registry.gauge(
+    'capsule_admission_requests', 'Expensive requests in flight and queued', ('state',),
+    lambda: {('in_flight',): admission_controller.in_flight, ('queued',): admission_controller.queued})
+registry.gauge(
+    'capsule_inflight_operations', 'LLM and vector operations in flight', ('kind',),
+    lambda: {(kind,): count for kind, count in admission_controller.operations.items()})
+registry.gauge(
+    'capsule_admission_shed', 'Expensive requests rejected with 503 since start', (),
+    lambda: {(): admission_controller.shed})
@@ -3,6 +3,12 @@
 
 import os
 
+from config.settings import FEATURE_FLAGS, SERVER_CONFIG, RATE_LIMIT_CONFIG as GLOBAL_RATE_LIMIT_CONFIG
+
+# State that must agree across requests (rate-limit buckets, idempotency keys, job
+# progress) lives in process memory with one worker and in shared SQLite files with several
+SHARED_STATE_BACKEND = 'sqlite' if SERVER_CONFIG['workers'] > 1 else 'memory'
+
 # API application configuration
 API_CONFIG = {
     'title': 'Capsule API',
@@ -12,6 +18,9 @@ API_CONFIG = {
     'port': int(os.getenv('PORT', 8001)),
     'reload': False,
     'serve_static': True,  # Whether to serve static files
+    'admin_user_id': os.getenv('ADMIN_USER_ID', 'benjamin'),
+    'users_page_size': int(os.getenv('USERS_PAGE_SIZE', 100)),  # Default page for user listings
+    'users_max_page_size': int(os.getenv('USERS_MAX_PAGE_SIZE', 1000)),
     'debug': os.getenv('DEBUG', 'false').lower() == 'true'
 }
 
@@ -23,9 +32,84 @@ CORS_CONFIG = {
     'allow_headers': ['*']
 }
 
-# Rate limiting configuration (for future enhancement)
+# Response compression (see middleware.py)
+COMPRESSION_CONFIG = {
+    'enabled': os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true',
+    'minimum_size': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),  # Smaller bodies are sent as-is
+    'gzip_level': int(os.getenv('COMPRESSION_GZIP_LEVEL', 6)),
+    'brotli_quality': int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4)),  # Used if brotli is installed
+    'zstd_level': int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3)),  # Used if zstandard is installed
+    'compressible_types': ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'),
+}
+
+# Per-stage Server-Timing headers and slow-request records (see middleware.py)
+SERVER_TIMING_CONFIG = {
+    'enabled': os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true',
+    'routes': ('/query', '/add', '/upload'),
+    'slow_request_ms': float(os.getenv('SLOW_REQUEST_MS', 2000)),  # Log a breakdown above this
+}
+
+# Admission control for the LLM/vector routes (see admission.py)
+ADMISSION_CONFIG = {
+    'enabled': os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true',
+    'routes': ('/query', '/add', '/upload'),
+    'max_in_flight': int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 8)),  # Expensive requests running at once
+    'max_queue': int(os.getenv('ADMISSION_MAX_QUEUE', 16)),  # Waiting beyond this are shed immediately
+    'queue_timeout': float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10)),  # Seconds a request may wait for a slot
+}
+
+# Rate limiting (see ratelimit.py). The LLM-backed routes get their own, smaller
+# budget from the app-wide RATE_LIMIT_CONFIG so one user can't burn provider quota.
 RATE_LIMIT_CONFIG = {
-    'requests_per_minute': 60,
-    'burst_limit': 10,
-    'enabled': False  # Can be enabled later
+    'enabled': FEATURE_FLAGS['enable_rate_limiting'],
+    'per_user': GLOBAL_RATE_LIMIT_CONFIG['enable_per_user_limits'],  # Key by user once the token is verified, else by IP
+    'requests_per_minute': GLOBAL_RATE_LIMIT_CONFIG['requests_per_minute'],  # Expensive routes
+    'burst_limit': GLOBAL_RATE_LIMIT_CONFIG['burst_limit'],
+    'expensive_routes': ('/query', '/add', '/upload'),
+    'general_requests_per_minute': int(os.getenv('GENERAL_REQUESTS_PER_MINUTE', 600)),  # Everything else
+    'general_burst_limit': int(os.getenv('GENERAL_BURST_LIMIT', 120)),
+    'exempt_routes': ('/health', '/ready', '/metrics'),
+    'exempt_prefixes': ('/static/', '/assets/'),
+    'backend': os.getenv('RATE_LIMIT_BACKEND', SHARED_STATE_BACKEND),  # 'memory' (per process) or 'sqlite' (shared by workers)
+    'sqlite_path': os.getenv('RATE_LIMIT_DB', 'ratelimit.db'),
+    'max_buckets': int(os.getenv('RATE_LIMIT_MAX_BUCKETS', 100000)),  # Per process (memory backend), least recently used evicted
+    'idle_seconds': 3600,  # A bucket idle this long has refilled and is deleted
+    'verified_users': 10000,  # Bearer tokens remembered as verified, per process
+    'verified_ttl': 300,  # Seconds before a token is verified again
+}
+
+# Idempotency keys (see idempotency.py). A retried /add or /upload carrying the same
+# Idempotency-Key gets the stored outcome instead of a second LLM call and vector.
+IDEMPOTENCY_CONFIG = {
+    'enabled': os.getenv('IDEMPOTENCY_ENABLED', 'true').lower() == 'true',
+    'header': 'Idempotency-Key',
+    'max_key_length': 255,
+    'ttl_seconds': int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 3600)),
+    'backend': os.getenv('IDEMPOTENCY_BACKEND', SHARED_STATE_BACKEND),  # 'memory' (per process) or 'sqlite' (shared by workers)
+    'sqlite_path': os.getenv('IDEMPOTENCY_DB', 'idempotency.db'),
+}
+
+# Background job progress (see jobs.py). Shared between workers so an admin polling
+# /admin/jobs/{job_id} sees the job whichever worker runs it.
+JOBS_CONFIG = {
+    'max_jobs': 100,
+    'backend': os.getenv('JOBS_BACKEND', SHARED_STATE_BACKEND),  # 'memory' (per process) or 'sqlite' (shared by workers)
+    'sqlite_path': os.getenv('JOBS_DB', 'jobs.db'),
+}
+
+# Startup warm-up (see warmup.py). Serving starts once warm-up finishes or after
+# `timeout` seconds, whichever is first; /ready answers 503 until it has finished.
+WARMUP_CONFIG = {
+    'enabled': os.getenv('WARMUP_ENABLED', 'true').lower() == 'true',
+    'timeout': float(os.getenv('WARMUP_TIMEOUT', 60)),
+}
+
+# Admin-only /admin/profile (see monitoring/profiler.py): collapsed stacks of the
+# worker that serves the request, for CPU or allocation investigations in production
+PROFILER_CONFIG = {
+    'enabled': os.getenv('PROFILER_ENABLED', 'true').lower() == 'true',
+    'default_seconds': 10,
+    'max_seconds': float(os.getenv('PROFILER_MAX_SECONDS', 60)),
+    'interval_ms': float(os.getenv('PROFILER_INTERVAL_MS', 10)),  # 100 samples per second
+    'alloc_frames': int(os.getenv('PROFILER_ALLOC_FRAMES', 25)),  # Stack depth recorded per allocation
 }
@@ -7,6 +7,11 @@ It creates and manages service instances from other modules.
 
 import sys
 import os
+import time
+
+from monitoring.logs import get_logger
+
+logger = get_logger('api')
 
 # Mock imports for when modules aren't available
 class MockService:
@@ -45,6 +50,38 @@ def get_auth_service():
         return MockService("authentication")
 
 
+def get_frontend_service():
+    """Get frontend service instance (serves the cached HTML pages)"""
+    from frontend.interface import frontend_service
+    return frontend_service
+
+
+def get_user_store():
+    """Get the shared user store used by the auth routes"""
+    return get_auth_service().get_user_store()
+
+
+def initialize_services() -> dict:
+    """
+    Build the service singletons (users database, provider clients) up front.
+    
+    Importing the modules only creates empty shells; the lifespan calls this before
+    serving so the first request doesn't pay for construction. A service that fails
+    here is logged and retried on first use. Returns seconds spent per service.
+    """
+    timings = {}
+    for name, get_service in (('authentication', get_auth_service),
+                              ('database', get_database_service),
+                              ('llm', get_llm_service)):
+        start = time.perf_counter()
+        try:
+            get_service().initialize()
+        except Exception as e:
+            logger.error("service initialization failed", extra={"service": name, "error": str(e)})
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
 def health_check_all_services():
     """Check health of all services"""
     services = {
@@ -0,0 +1,158 @@
+"""
+API Idempotency Keys
+
+A client may send `Idempotency-Key: <unique id>` with /add or /upload and
+reuse it when retrying. The first successful outcome is stored per user and
+key for IDEMPOTENCY_CONFIG['ttl_seconds']; a retry gets that outcome back
+(marked `Idempotent-Replayed: true`) without repeating the LLM refinement or
+inserting a second vector. A retry that arrives while the original is still
+running waits for it. Reusing a key with a different payload is a 422.
+
+Failed requests are not stored, so retrying after an error runs again.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from concurrency.process import ForkSafeLocal
+from concurrency.singleflight import AsyncSingleFlight, normalize_key
+from monitoring.logs import get_logger
+from .config import IDEMPOTENCY_CONFIG
+
+logger = get_logger('api.idempotency')
+
+# (fingerprint, status code, JSON body)
+Outcome = Tuple[str, int, str]
+
+
+class MemoryIdempotencyStore:
+    """Outcomes in process memory; expired entries are pruned as new ones arrive"""
+
+    def __init__(self, prune_every: int = 1000):
+        self._outcomes = {}  # key -> (expires, outcome)
+        self._lock = threading.Lock()
+        self._prune_every = prune_every
+        self._puts = 0
+
+    async def get(self, key: str) -> Optional[Outcome]:
+        with self._lock:
+            entry = self._outcomes.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._outcomes[key]
+                return None
+            return entry[1]
+
+    async def put(self, key: str, outcome: Outcome, ttl: float):
+        now = time.monotonic()
+        with self._lock:
+            self._outcomes[key] = (now + ttl, outcome)
+            self._puts += 1
+            if self._puts % self._prune_every == 0:
+                expired = [k for k, (expires, _) in self._outcomes.items() if expires <= now]
+                for k in expired:
+                    del self._outcomes[k]
+
+    def close(self):
+        pass
+
+
+class SQLiteIdempotencyStore:
+    """Outcomes in a shared SQLite file so a retry landing on another worker still replays"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = ForkSafeLocal()  # Per thread, and never inherited by a forked worker
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency "
+            "(key TEXT PRIMARY KEY, fingerprint TEXT, status INTEGER, body TEXT, expires REAL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[Outcome]:
+        row = self._connection().execute(
+            "SELECT fingerprint, status, body FROM idempotency WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _put(self, key: str, outcome: Outcome, ttl: float):
+        now = time.time()  # Wall clock: shared between processes
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?, ?)", (key, *outcome, now + ttl))
+        conn.execute("DELETE FROM idempotency WHERE expires <= ?", (now,))
+
+    async def get(self, key: str) -> Optional[Outcome]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, outcome: Outcome, ttl: float):
+        await asyncio.to_thread(self._put, key, outcome, ttl)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_idempotency_store(backend: str = None):
+    backend = backend or IDEMPOTENCY_CONFIG['backend']
+    if backend == 'memory':
+        return MemoryIdempotencyStore()
+    if backend == 'sqlite':
+        return SQLiteIdempotencyStore(IDEMPOTENCY_CONFIG['sqlite_path'])
+    raise ValueError(f"Unknown idempotency backend '{backend}'")
+
+
+class IdempotencyGuard:
+    """Runs a handler at most once per (route, user, Idempotency-Key) within the TTL"""
+
+    def __init__(self, store=None, config: dict = None):
+        self.config = config or IDEMPOTENCY_CONFIG
+        self.store = store or create_idempotency_store(self.config['backend'])
+        self._flights = AsyncSingleFlight('idempotency')
+
+    async def run(self, request: Request, user_id: str, payload, handler: Callable[[], Awaitable[dict]]):
+        """Return the handler's result, or the stored outcome of an earlier request with the same key"""
+        key = request.headers.get(self.config['header'])
+        if not self.config['enabled'] or key is None:
+            return await handler()
+        if not key or len(key) > self.config['max_key_length']:
+            raise HTTPException(status_code=400, detail=f"Invalid {self.config['header']} header")
+
+        scoped_key = f"{request.url.path}:{user_id}:{key}"
+        fingerprint = hashlib.sha256(normalize_key(payload).encode()).hexdigest()
+        # A retry racing the original waits for it rather than running alongside it
+        outcome, replayed = await self._flights.do(scoped_key, self._run_once, scoped_key, fingerprint, handler)
+
+        if outcome[0] != fingerprint:
+            raise HTTPException(status_code=422, detail=f"{self.config['header']} was already used for a different request")
+        if not replayed:
+            return json.loads(outcome[2])
+        logger.info("idempotent replay", extra={"user_id": user_id, "path": request.url.path})
+        return JSONResponse(json.loads(outcome[2]), status_code=outcome[1], headers={'Idempotent-Replayed': 'true'})
+
+    async def _run_once(self, scoped_key: str, fingerprint: str, handler) -> Tuple[Outcome, bool]:
+        stored = await self.store.get(scoped_key)
+        if stored is not None:
+            return stored, True
+        result = await handler()  # Errors propagate and nothing is stored
+        outcome = (fingerprint, 200, json.dumps(result))
+        await self.store.put(scoped_key, outcome, self.config['ttl_seconds'])
+        return outcome, False
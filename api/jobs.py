@@ -0,0 +1,167 @@
+"""
+API Background Jobs
+
+Long-running admin work (like purging a deleted user's vectors) runs after the
+HTTP response is sent. Each job records its progress so admins can poll it.
+With several workers the progress goes to a shared SQLite file, so a poll
+answered by any worker sees it.
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from concurrency.process import ForkSafeLocal
+from .config import JOBS_CONFIG
+
+
+class NamespaceDeletionJob:
+    """Deletes the vector namespaces of one or more users, one namespace at a time"""
+
+    def __init__(self, user_ids: List[str]):
+        self.job_id = uuid.uuid4().hex
+        self.kind = 'delete_namespaces'
+        self.status = 'pending'
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.results = [{'user_id': user_id, 'status': 'pending', 'vectors': None, 'error': None} for user_id in user_ids]
+
+    @property
+    def done(self) -> int:
+        return sum(1 for r in self.results if r['status'] not in ('pending', 'running'))
+
+    async def run(self, database_service, on_progress: Callable[['NamespaceDeletionJob'], None] = None) -> None:
+        """Delete each namespace in a worker thread so the event loop stays free"""
+        on_progress = on_progress or (lambda job: None)
+        self.status = 'running'
+        self.started_at = datetime.now().isoformat()
+        await asyncio.to_thread(on_progress, self)
+        for result in self.results:
+            result['status'] = 'running'
+            try:
+                try:
+                    result['vectors'] = await asyncio.to_thread(database_service.count_namespace, result['user_id'])
+                except Exception:
+                    result['vectors'] = None  # Stats are informational only
+                deleted = await asyncio.to_thread(database_service.delete_namespace, result['user_id'])
+                result['status'] = 'deleted' if deleted else 'empty'
+            except Exception as e:
+                result['status'] = 'failed'
+                result['error'] = str(e)
+            await asyncio.to_thread(on_progress, self)
+        self.status = 'failed' if any(r['status'] == 'failed' for r in self.results) else 'completed'
+        self.finished_at = datetime.now().isoformat()
+        await asyncio.to_thread(on_progress, self)
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {'done': self.done, 'total': len(self.results)},
+            'vectors_reclaimed': sum(r['vectors'] or 0 for r in self.results if r['status'] == 'deleted'),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'results': self.results,
+        }
+
+
+class JobRegistry:
+    """In-process registry of recent jobs (oldest finished jobs are dropped first)"""
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, NamespaceDeletionJob]" = OrderedDict()
+
+    def add(self, job: NamespaceDeletionJob) -> NamespaceDeletionJob:
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_jobs:
+            finished = next((j for j in self._jobs.values() if j.status in ('completed', 'failed')), None)
+            if finished is None:
+                break
+            del self._jobs[finished.job_id]
+        return job
+
+    def save(self, job: NamespaceDeletionJob) -> None:
+        pass  # Jobs are live objects here; progress is visible as it happens
+
+    def get(self, job_id: str) -> Optional[NamespaceDeletionJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[NamespaceDeletionJob]:
+        return list(reversed(self._jobs.values()))
+
+
+class StoredJob:
+    """A job snapshot read back from the shared registry"""
+
+    def __init__(self, data: Dict):
+        self.job_id = data['job_id']
+        self.status = data['status']
+        self._data = data
+
+    def to_dict(self) -> Dict:
+        return self._data
+
+
+class SQLiteJobRegistry:
+    """Job snapshots in a shared SQLite file, written as each job progresses"""
+
+    def __init__(self, path: str, max_jobs: int = 100):
+        self.path = path
+        self.max_jobs = max_jobs
+        self._local = ForkSafeLocal()  # Per thread, and never inherited by a forked worker
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, created REAL, status TEXT, data TEXT)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, job: NamespaceDeletionJob) -> NamespaceDeletionJob:
+        conn = self._connection()
+        conn.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)", (job.job_id, time.time(), job.status, json.dumps(job.to_dict())))
+        # Like the in-memory registry: only finished jobs are dropped, oldest first
+        conn.execute(
+            "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN ('completed', 'failed') "
+            "ORDER BY created, rowid LIMIT max(0, (SELECT COUNT(*) FROM jobs) - ?))", (self.max_jobs,))
+        return job
+
+    def save(self, job: NamespaceDeletionJob) -> None:
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, data = ? WHERE job_id = ?", (job.status, json.dumps(job.to_dict()), job.job_id))
+
+    def get(self, job_id: str) -> Optional[StoredJob]:
+        row = self._connection().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return StoredJob(json.loads(row[0])) if row else None
+
+    def list(self) -> List[StoredJob]:
+        rows = self._connection().execute("SELECT data FROM jobs ORDER BY created DESC, rowid DESC").fetchall()
+        return [StoredJob(json.loads(data)) for (data,) in rows]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_job_registry(backend: str = None):
+    backend = backend or JOBS_CONFIG['backend']
+    if backend == 'memory':
+        return JobRegistry(JOBS_CONFIG['max_jobs'])
+    if backend == 'sqlite':
+        return SQLiteJobRegistry(JOBS_CONFIG['sqlite_path'], JOBS_CONFIG['max_jobs'])
+    raise ValueError(f"Unknown jobs backend '{backend}'")
@@ -0,0 +1,61 @@
+"""
+API Lifespan
+
+Startup and shutdown work for the FastAPI application. Anything that would
+otherwise be paid by the first request (building the service singletons,
+opening pools, creating tables, warming up connections and models) runs here,
+once, before the server accepts traffic. Importing the app stays cheap; the
+work starts when the server does.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from .config import WARMUP_CONFIG, RATE_LIMIT_CONFIG, IDEMPOTENCY_CONFIG, JOBS_CONFIG
+from .dependencies import get_user_store, get_frontend_service, initialize_services
+from .warmup import readiness, warm_up
+from config.settings import SERVER_CONFIG
+from frontend.config import FRONTEND_CONFIG
+from monitoring.logs import get_logger
+
+logger = get_logger('api')
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Build the services, open the user store pool, create the users table, warm up, and watch pages in dev"""
+    timings = await asyncio.to_thread(initialize_services)
+    logger.info("services initialized", extra={"init_ms": {name: round(s * 1000, 1) for name, s in timings.items()}})
+    if SERVER_CONFIG['workers'] > 1:
+        per_process = [name for name, config in (
+            ('rate_limit', RATE_LIMIT_CONFIG), ('idempotency', IDEMPOTENCY_CONFIG), ('jobs', JOBS_CONFIG)
+        ) if config['backend'] == 'memory']
+        if per_process:
+            logger.warning("per-process state with several workers; each worker keeps its own",
+                           extra={"workers": SERVER_CONFIG['workers'], "backends": per_process})
+    user_store = get_user_store()
+    await user_store.open()
+    await user_store.init_schema()
+    logger.info("user store ready", extra={"backend": user_store.backend})
+    page_cache = get_frontend_service().page_cache  # Pages and assets are loaded and compressed here
+    if FRONTEND_CONFIG['hot_reload']:
+        page_cache.start_watching()
+        logger.info("watching frontend pages for changes")
+    
+    warmup_task = None
+    if WARMUP_CONFIG['enabled']:
+        warmup_task = asyncio.create_task(warm_up(readiness))
+        try:
+            await asyncio.wait_for(asyncio.shield(warmup_task), WARMUP_CONFIG['timeout'])
+        except asyncio.TimeoutError:
+            # Serve anyway; /ready stays 503 until the remaining steps finish
+            logger.warning("warm-up still running, serving anyway", extra=readiness.snapshot())
+    else:
+        readiness.ready = True
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        page_cache.stop_watching()
+        await user_store.close()
@@ -0,0 +1,292 @@
+"""
+API Middleware
+
+Response compression for the FastAPI app. Bodies are compressed with the best
+encoding the client accepts (brotli, zstd, gzip) when they are large enough to
+be worth it. Already-encoded, incompressible and streaming responses pass
+through untouched, and the CPU time spent compressing is accounted per encoding.
+
+Request metrics: per-route latency histograms for /metrics, plus per-stage
+Server-Timing headers and slow-request records for the memory routes.
+
+Correlation ids: each request gets an X-Request-ID that every log record carries.
+"""
+
+import gzip
+import json
+import logging
+import threading
+import time
+from typing import Dict
+
+from frontend.cache import parse_accept_encoding
+from monitoring.metrics import registry, HTTP_REQUEST_SECONDS
+from monitoring.timing import start_timing
+from monitoring.logs import new_request_id, current_request_id
+from monitoring.tracing import tracer
+from .config import COMPRESSION_CONFIG, SERVER_TIMING_CONFIG
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is always available
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional
+    zstandard = None
+
+slow_request_logger = logging.getLogger('capsule.slow_requests')
+
+
+class RequestIdMiddleware:
+    """Binds a correlation id (incoming X-Request-ID or a new one) and echoes it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope.get('headers') or []).get(b'x-request-id')
+        request_id = new_request_id(incoming.decode('latin-1') if incoming else None)
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': list(message.get('headers', [])) + [(b'x-request-id', request_id.encode('latin-1'))]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
+
+
+
+class TracingMiddleware:
+    """Root span per request (see monitoring/tracing.py); stages inside become its children.
+
+    Continues an incoming W3C `traceparent` and answers with one pointing at this
+    request's span, so a caller can find the request in the exported traces.
+    """
+
+    def __init__(self, app, exempt_paths=('/health', '/ready', '/metrics'), exempt_prefixes=('/static/', '/assets/')):
+        self.app = app
+        self.exempt_paths = tuple(exempt_paths)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or not tracer.enabled or scope['path'] in self.exempt_paths
+                or scope['path'].startswith(self.exempt_prefixes)):
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope.get('headers') or []).get(b'traceparent')
+        attributes = {'http.method': scope['method'], 'request_id': current_request_id()}
+        with tracer.trace(scope['method'], traceparent=incoming.decode('latin-1') if incoming else None, **attributes) as span:
+            status_code = 500
+
+            async def send_with_trace(message):
+                nonlocal status_code
+                if message['type'] == 'http.response.start':
+                    status_code = message['status']
+                    if span.traceparent:
+                        message = {**message, 'headers': list(message.get('headers', [])) + [(b'traceparent', span.traceparent.encode('latin-1'))]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                # Named after the route template, like the metrics, so requests group by endpoint
+                route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+                if span.span_id:
+                    span.name = f"{scope['method']} {route}"
+                span.set(**{'http.route': route, 'http.status_code': status_code})
+
+def _compressors() -> Dict[str, callable]:
+    """Available encodings in server preference order"""
+    compressors = {}
+    if brotli is not None:
+        compressors['br'] = lambda body: brotli.compress(body, quality=COMPRESSION_CONFIG['brotli_quality'])
+    if zstandard is not None:
+        compressors['zstd'] = lambda body: zstandard.ZstdCompressor(level=COMPRESSION_CONFIG['zstd_level']).compress(body)
+    compressors['gzip'] = lambda body: gzip.compress(body, compresslevel=COMPRESSION_CONFIG['gzip_level'], mtime=0)
+    return compressors
+
+
+class CompressionStats:
+    """Thread-safe counters of compression work, per encoding"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self.skipped = 0
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float):
+        with self._lock:
+            stats = self._stats.setdefault(encoding, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0})
+            stats['responses'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['cpu_seconds'] += cpu_seconds
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            encodings = {encoding: dict(stats) for encoding, stats in self._stats.items()}
+            for stats in encodings.values():
+                stats['ratio'] = stats['bytes_out'] / stats['bytes_in'] if stats['bytes_in'] else 1.0
+            return {'encodings': encodings, 'skipped': self.skipped}
+
+
+# Shared counters (Starlette builds middleware lazily, so expose them here)
+compression_stats = CompressionStats()
+
+registry.gauge(
+    'capsule_compression_bytes', 'Response bytes before (in) and after (out) compression', ('encoding', 'direction'),
+    lambda: {(encoding, direction): stats[f'bytes_{direction}']
+             for encoding, stats in compression_stats.snapshot()['encodings'].items() for direction in ('in', 'out')})
+registry.gauge(
+    'capsule_compression_cpu_seconds', 'Thread CPU time spent compressing responses', ('encoding',),
+    lambda: {(encoding,): stats['cpu_seconds'] for encoding, stats in compression_stats.snapshot()['encodings'].items()})
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware so streaming responses are never buffered"""
+
+    def __init__(self, app, minimum_size: int = None, stats: CompressionStats = None):
+        self.app = app
+        self.minimum_size = COMPRESSION_CONFIG['minimum_size'] if minimum_size is None else minimum_size
+        self.compressors = _compressors()
+        self.stats = stats or compression_stats
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get('headers') or [])
+        accepted = parse_accept_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        encoding = next((e for e in self.compressors if accepted.get(e, accepted.get('*', 0)) > 0), None)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                return await send(message)
+
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+
+            if message['type'] != 'http.response.body':
+                return await send(message)
+
+            body = message.get('body', b'')
+            if message.get('more_body', False) or not self._should_compress(start_message, body):
+                # Streaming or not worth compressing: forward everything as-is
+                passthrough = True
+                self.stats.record_skip()
+                await send(start_message)
+                return await send(message)
+
+            cpu_start = time.thread_time()
+            compressed = self.compressors[encoding](body)
+            cpu_seconds = time.thread_time() - cpu_start
+            if len(compressed) >= len(body):
+                passthrough = True
+                self.stats.record_skip()
+                await send(start_message)
+                return await send(message)
+            self.stats.record(encoding, len(body), len(compressed), cpu_seconds)
+
+            response_headers = [(k, v) for k, v in start_message['headers'] if k.lower() != b'content-length']
+            response_headers.append((b'content-encoding', encoding.encode()))
+            response_headers.append((b'content-length', str(len(compressed)).encode()))
+            if not any(k.lower() == b'vary' and b'accept-encoding' in v.lower() for k, v in response_headers):
+                response_headers.append((b'vary', b'Accept-Encoding'))
+            response_headers = [(k, b'W/' + v) if k.lower() == b'etag' and not v.startswith(b'W/') else (k, v)
+                                for k, v in response_headers]
+            await send({**start_message, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _should_compress(self, start_message, body: bytes) -> bool:
+        if start_message['status'] < 200 or start_message['status'] in (204, 304):
+            return False
+        if len(body) < self.minimum_size:
+            return False
+        headers = {k.lower(): v for k, v in start_message['headers']}
+        if b'content-encoding' in headers:
+            return False  # Already compressed (e.g. cached pages and assets)
+        content_type = headers.get(b'content-type', b'').decode('latin-1').split(';')[0].strip()
+        return content_type.startswith(COMPRESSION_CONFIG['compressible_types'])
+
+
+class MetricsMiddleware:
+    """Records request latency labelled by route template (not raw path, to bound cardinality)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope['method'], route=route, status=status_code)
+
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header with each stage of /query and /add, and logs slow requests"""
+
+    def __init__(self, app, routes=None, slow_request_ms: float = None):
+        self.app = app
+        self.routes = tuple(routes or SERVER_TIMING_CONFIG['routes'])
+        self.slow_request_ms = SERVER_TIMING_CONFIG['slow_request_ms'] if slow_request_ms is None else slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.routes:
+            return await self.app(scope, receive, send)
+
+        timing = start_timing()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', timing.server_timing_header().encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total_ms = timing.total * 1000
+            if total_ms >= self.slow_request_ms:
+                slow_request_logger.warning(json.dumps({
+                    'event': 'slow_request',
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    'status': status_code,
+                    'total_ms': round(total_ms, 1),
+                    'stages_ms': timing.breakdown_ms(),
+                }))
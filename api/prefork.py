@@ -0,0 +1,177 @@
+"""
+Pre-Fork Server
+
+Runs several uvicorn workers on one listening socket. The master process loads
+what the workers can share (the local SentenceTransformer when
+USE_LOCAL_EMBEDDINGS=true), freezes the garbage collector so later collections
+in the workers don't write to, and un-share, those objects, binds the port and
+forks. Each worker then builds its own app, event loop, pools and threads.
+The model's pages stay shared copy-on-write, so an extra worker costs its own
+heap rather than another copy of the model.
+
+The master never serves requests. It restarts workers that die and, on SIGTERM
+or SIGINT, stops them gracefully.
+
+Workers see the effective worker count in SERVER_CONFIG['workers'], so with
+more than one the shared state (rate limits, idempotency keys, job progress)
+defaults to SQLite files every worker uses.
+
+Run:
+    python -m api.prefork --workers 4      # or --workers auto: one per CPU
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+from config.settings import SERVER_CONFIG, worker_count
+from monitoring.logs import configure_logging, get_logger, shutdown_logging
+
+logger = get_logger('api.prefork')
+
+DEFAULT_APP = 'develop.app:create_app'
+
+
+def preload() -> list:
+    """Load shared, read-only state in the master; returns what was loaded"""
+    loaded = []
+    if os.getenv('USE_LOCAL_EMBEDDINGS', 'false').lower() == 'true':
+        # Tokenizer threads don't survive fork; workers tokenize on their own threads
+        os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        from database.database import DBHandler
+        # Weights only: the first encode spins up a thread pool, which must happen after the fork
+        DBHandler.load_model()
+        loaded.append('embedding_model')
+    return loaded
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """The listening socket every worker accepts from"""
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """Master process: preload, bind, fork `workers` uvicorn servers and keep them running"""
+
+    def __init__(self, app: str = DEFAULT_APP, workers: int = None, host: str = None, port: int = None,
+                 factory: bool = True, uvicorn_options: dict = None):
+        self.app = app
+        self.workers = worker_count(workers or SERVER_CONFIG['workers'])
+        self.host = host or SERVER_CONFIG['host']
+        self.port = SERVER_CONFIG['port'] if port is None else port
+        self.factory = factory
+        self.uvicorn_options = uvicorn_options or {}
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.stopping = False
+        self.sock = None
+
+    def run(self):
+        # Inherited by the workers, which read it when they import the app's config
+        SERVER_CONFIG['workers'] = self.workers
+        configure_logging()
+        loaded = preload()
+        self.sock = bind_socket(self.host, self.port)
+        logger.info("pre-fork master ready", extra={
+            "pid": os.getpid(), "workers": self.workers, "address": f"{self.host}:{self.sock.getsockname()[1]}",
+            "preloaded": loaded,
+        })
+        # The listener thread doesn't survive fork; workers start their own
+        shutdown_logging()
+        gc.collect()
+        gc.freeze()  # Preloaded objects move to the permanent generation and are never scanned again
+
+        for index in range(self.workers):
+            self._spawn(index)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self._supervise()
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(index)  # Never returns
+        self.children[pid] = index
+
+    def _run_worker(self, index: int):
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.environ['CAPSULE_WORKER_ID'] = str(index)
+            config = uvicorn.Config(self.app, factory=self.factory, log_config=None, **self.uvicorn_options)
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _supervise(self):
+        configure_logging()
+        last_restart = 0.0
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            logger.warning("worker exited, restarting", extra={"worker": index, "pid": pid, "status": status})
+            # Don't spin if workers crash on startup
+            time.sleep(max(0.0, 1.0 - (time.monotonic() - last_restart)))
+            last_restart = time.monotonic()
+            shutdown_logging()
+            self._spawn(index)
+            configure_logging()
+        self.sock.close()
+        logger.info("pre-fork master stopped")
+        shutdown_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked workers sharing preloaded models")
+    parser.add_argument('--app', default=DEFAULT_APP, help="app factory as module:callable")
+    parser.add_argument('--workers', type=worker_count, default=SERVER_CONFIG['workers'], help="a number or 'auto'")
+    parser.add_argument('--host', default=SERVER_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    parser.add_argument('--limit-concurrency', type=int, default=None)
+    parser.add_argument('--timeout-keep-alive', type=int, default=5)
+    parser.add_argument('--forwarded-allow-ips', default=SERVER_CONFIG['forwarded_allow_ips'],
+                        help="comma-separated proxy addresses trusted for X-Forwarded-For, or '*'")
+    args = parser.parse_args()
+
+    PreforkServer(args.app, args.workers, args.host, args.port, uvicorn_options={
+        'limit_concurrency': args.limit_concurrency,
+        'timeout_keep_alive': args.timeout_keep_alive,
+        # The client address (rate limits, logs) is the caller's, not the proxy's
+        'proxy_headers': True,
+        'forwarded_allow_ips': args.forwarded_allow_ips,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+API Rate Limiting
+
+Token buckets keyed by user or client IP. The LLM-backed routes (/query, /add,
+/upload) draw from their own, smaller budget so one user can't exhaust provider
+quota for everyone; all other routes share a generous general budget, and
+health/metrics/static files are never limited.
+
+A bearer token only gets its own bucket once the user store has confirmed it.
+Until then the request is charged to the client IP, so sending a fresh made-up
+token per request doesn't escape the limit. Behind a proxy the client IP is
+the one uvicorn takes from X-Forwarded-For (FORWARDED_ALLOW_IPS).
+
+Buckets live in process memory by default, at most `max_buckets` of them. With
+RATE_LIMIT_BACKEND=sqlite they live in one SQLite file, so every worker on the
+host shares the same budget. Either way idle buckets are deleted.
+"""
+
+import asyncio
+import itertools
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from concurrency.process import ForkSafeLocal
+from monitoring.logs import get_logger
+from .config import RATE_LIMIT_CONFIG
+from .dependencies import get_user_store
+
+logger = get_logger('api.ratelimit')
+
+
+class Budget:
+    """Token-bucket parameters: `burst` tokens, refilled at `per_minute` per minute"""
+
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.capacity = float(burst)
+        self.rate = per_minute / 60.0  # tokens per second
+
+    def take(self, tokens: float, updated: float, now: float) -> Tuple[bool, float, float]:
+        """Refill and try to take one token -> (allowed, tokens left, seconds until next token)"""
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return True, tokens - 1, 0.0
+        return False, tokens, (1 - tokens) / self.rate if self.rate else math.inf
+
+
+class MemoryBucketStore:
+    """Per-process buckets, least recently used first; idle ones and those beyond `max_buckets` are dropped"""
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_CONFIG['max_buckets'],
+                 idle_seconds: float = RATE_LIMIT_CONFIG['idle_seconds']):
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+        self.max_buckets = max_buckets
+        self.idle_seconds = idle_seconds
+
+    async def take(self, budget: Budget, key: str) -> Tuple[bool, float, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (budget.capacity, now))
+            allowed, tokens, retry_after = budget.take(tokens, updated, now)
+            self._buckets[key] = (tokens, now)
+            self._evict(now)
+        return allowed, tokens, retry_after
+
+    def _evict(self, now: float):
+        # A bucket idle long enough to have refilled completely is the same as no bucket. Evicting a
+        # busy one early hands its caller a fresh burst, which the cap makes rare.
+        while self._buckets:
+            _, updated = next(iter(self._buckets.values()))
+            if len(self._buckets) <= self.max_buckets and now - updated <= self.idle_seconds:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def close(self):
+        pass
+
+
+class SQLiteBucketStore:
+    """Buckets in a shared SQLite file so all workers on a host enforce one budget"""
+
+    def __init__(self, path: str, idle_seconds: float = RATE_LIMIT_CONFIG['idle_seconds'], prune_every: int = 1000):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self._prune_every = prune_every
+        self._calls = itertools.count(1)
+        self._local = ForkSafeLocal()  # Per thread, and never inherited by a forked worker
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # Losing a few refills on power loss is fine
+            self._local.conn = conn
+        return conn
+
+    def _take(self, budget: Budget, key: str) -> Tuple[bool, float, float]:
+        now = time.time()  # Wall clock: shared between processes
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (budget.capacity, now)
+            allowed, tokens, retry_after = budget.take(tokens, min(updated, now), now)
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if next(self._calls) % self._prune_every == 0:
+            self.prune(now)
+        return allowed, tokens, retry_after
+
+    def prune(self, now: float = None) -> int:
+        """Delete buckets idle long enough to have refilled; returns how many"""
+        now = time.time() if now is None else now
+        return self._connection().execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_seconds,)).rowcount
+
+    async def take(self, budget: Budget, key: str) -> Tuple[bool, float, float]:
+        return await asyncio.to_thread(self._take, budget, key)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_bucket_store(backend: str = None):
+    backend = backend or RATE_LIMIT_CONFIG['backend']
+    if backend == 'memory':
+        return MemoryBucketStore()
+    if backend == 'sqlite':
+        return SQLiteBucketStore(RATE_LIMIT_CONFIG['sqlite_path'])
+    raise ValueError(f"Unknown rate limit backend '{backend}'")
+
+
+class RateLimitMiddleware:
+    """Answers 429 with Retry-After once a caller's bucket is empty"""
+
+    def __init__(self, app, store=None, config: dict = None, verify=None):
+        self.app = app
+        self.config = config or RATE_LIMIT_CONFIG
+        self.store = store or create_bucket_store(self.config['backend'])
+        self.expensive = Budget('expensive', self.config['requests_per_minute'], self.config['burst_limit'])
+        self.general = Budget('general', self.config['general_requests_per_minute'], self.config['general_burst_limit'])
+        self.verify = verify or _lookup_user  # async token -> user_id or None
+        self._verified = OrderedDict()  # token -> (user_id, expires), least recently used first
+
+    @staticmethod
+    def _bearer(scope) -> Optional[str]:
+        authorization = dict(scope.get('headers') or []).get(b'authorization', b'')
+        scheme, _, token = authorization.decode('latin-1').partition(' ')
+        return token if scheme.lower() == 'bearer' and token else None
+
+    def _identity(self, scope, token: Optional[str]) -> str:
+        if token is not None:
+            entry = self._verified.get(token)
+            if entry and entry[1] > time.monotonic():
+                self._verified.move_to_end(token)
+                return f"user:{entry[0]}"
+        client = scope.get('client')
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def _remember(self, token: str):
+        """Verify a token so the caller's next requests use their own bucket"""
+        try:
+            user_id = await self.verify(token)
+        except Exception:
+            logger.debug("token verification failed", exc_info=True)
+            return
+        if not user_id:
+            return
+        self._verified.pop(token, None)
+        self._verified[token] = (user_id, time.monotonic() + self.config['verified_ttl'])
+        while len(self._verified) > self.config['verified_users']:
+            self._verified.popitem(last=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        path = scope['path']
+        if path in self.config['exempt_routes'] or path.startswith(self.config['exempt_prefixes']):
+            return await self.app(scope, receive, send)
+
+        budget = self.expensive if path in self.config['expensive_routes'] else self.general
+        token = self._bearer(scope) if self.config['per_user'] else None
+        identity = self._identity(scope, token)
+        allowed, remaining, retry_after = await self.store.take(budget, f"{budget.name}:{identity}")
+        if allowed:
+            if token is not None and identity.startswith('ip:'):
+                # Charged to the IP already, so made-up tokens cost lookups only within the IP's budget
+                await self._remember(token)
+            return await self.app(scope, receive, send)
+
+        logger.info("rate limited", extra={"budget": budget.name, "path": path, "identity": identity.split(':', 1)[0]})
+        retry_after = max(1, math.ceil(retry_after))
+        await send({
+            'type': 'http.response.start',
+            'status': 429,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'retry-after', str(retry_after).encode()),
+                (b'x-ratelimit-limit', str(int(budget.capacity)).encode()),
+                (b'x-ratelimit-remaining', str(int(remaining)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'{"detail":"Rate limit exceeded"}'})
+
+
+async def _lookup_user(token: str) -> Optional[str]:
+    return await get_user_store().get_user(token)
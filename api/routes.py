@@ -1,14 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Form
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Form, Query, BackgroundTasks, Body, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any
+from typing import Optional
 import os
+import json
+import asyncio
 from pathlib import Path
 
-from .config import API_CONFIG
-from .dependencies import get_database_service, get_llm_service, get_auth_service
+from .config import API_CONFIG, COMPRESSION_CONFIG, SERVER_TIMING_CONFIG, RATE_LIMIT_CONFIG, ADMISSION_CONFIG, PROFILER_CONFIG
+from .dependencies import get_database_service, get_llm_service, get_auth_service, get_user_store, get_frontend_service
+from .lifespan import lifespan
+from .jobs import NamespaceDeletionJob, create_job_registry
+from .middleware import CompressionMiddleware, MetricsMiddleware, ServerTimingMiddleware, RequestIdMiddleware, TracingMiddleware
+from .ratelimit import RateLimitMiddleware
+from .admission import AdmissionMiddleware, admission_controller
+from .idempotency import IdempotencyGuard
+from .warmup import readiness
+from concurrency.singleflight import AsyncSingleFlight, normalize_key
+from monitoring.metrics import registry as metrics_registry
+from monitoring.timing import stage
+from monitoring.logs import configure_logging, get_logger
+from monitoring.profiler import AllocationProfiler, ProfilerBusy, SamplingProfiler
+from frontend.assets import IMMUTABLE_CACHE_CONTROL
+
+logger = get_logger('api')
+
+ASSET_MEDIA_TYPES = {".js": "application/javascript; charset=utf-8", ".css": "text/css; charset=utf-8"}
 
 class APIRoutes:
     """
@@ -16,11 +35,16 @@ class APIRoutes:
     """
     
     def __init__(self):
+        configure_logging()
         self.app = FastAPI(
             title=API_CONFIG['title'],
             description=API_CONFIG['description'],
-            version=API_CONFIG['version']
+            version=API_CONFIG['version'],
+            lifespan=lifespan
         )
+        self.jobs = create_job_registry()
+        self.query_flights = AsyncSingleFlight('query')
+        self.idempotency = IdempotencyGuard()
         self._setup_middleware()
         self._setup_routes()
     
@@ -33,57 +57,60 @@ class APIRoutes:
             allow_methods=["*"],
             allow_headers=["*"]
         )
+        if ADMISSION_CONFIG['enabled']:
+            # Inside the timing middleware, so time spent queued for a slot shows up in the total
+            self.app.add_middleware(AdmissionMiddleware)
+        if SERVER_TIMING_CONFIG['enabled']:
+            self.app.add_middleware(ServerTimingMiddleware)
+        if COMPRESSION_CONFIG['enabled']:
+            self.app.add_middleware(CompressionMiddleware)
+        if RATE_LIMIT_CONFIG['enabled']:
+            self.app.add_middleware(RateLimitMiddleware)
+        if metrics_registry.enabled:
+            # Added late so it wraps everything, compression included
+            self.app.add_middleware(MetricsMiddleware)
+        # Root span around everything but the correlation id, which it records
+        self.app.add_middleware(TracingMiddleware)
+        # Outermost: every log record of the request carries its correlation id
+        self.app.add_middleware(RequestIdMiddleware)
     
     def _setup_routes(self):
         """Setup all API routes"""
         
         @self.app.get("/", response_class=HTMLResponse)
-        async def root():
+        async def root(request: Request):
             """Root endpoint - Serve the web interface"""
-            try:
-                # Get the frontend HTML file
-                frontend_path = Path(__file__).parent.parent / "frontend" / "components" / "portfolio_landing.html"
-                if frontend_path.exists():
-                    return frontend_path.read_text(encoding='utf-8')
-                else:
-                    # Fallback to API info if frontend not found
-                    return """
+            # Fallback to API info if frontend not found
+            return self._serve_page(request, "portfolio_landing.html", """
                     <html><body>
                     <h1>🧠 Capsule - Personal Memory System</h1>
                     <p>Frontend interface not found. API is running at <a href="/docs">/docs</a></p>
                     </body></html>
-                    """
-            except Exception as e:
-                return f"""
-                <html><body>
-                <h1>🧠 Capsule - Personal Memory System</h1>
-                <p>Error loading interface: {e}</p>
-                <p>API is running at <a href="/docs">/docs</a></p>
-                </body></html>
-                """
+                    """)
+
         @self.app.get("/capsule", response_class=HTMLResponse)
-        async def capsule_interface():
+        async def capsule_interface(request: Request):
             """Capsule signin/interface page"""
-            try:
-                # Get the Capsule interface  
-                frontend_path = Path(__file__).parent.parent / "frontend" / "components" / "interface.html"
-                if frontend_path.exists():
-                    return frontend_path.read_text(encoding='utf-8')
-                else:
-                    return "<h1>Capsule interface not found</h1>"
-            except Exception as e:
-                return f"<h1>Error loading Capsule interface: {e}</h1>"
-
-
+            return self._serve_page(request, "interface.html", "<h1>Capsule interface not found</h1>")
 
         @self.app.get("/admin", response_class=HTMLResponse)
-        async def admin_page():
+        async def admin_page(request: Request):
             """Serve the admin interface"""
-            frontend_path = Path(__file__).parent.parent / "frontend" / "components" / "admin.html"
-            if frontend_path.exists():
-                return frontend_path.read_text(encoding='utf-8')
-            else:
-                return "<h1>Admin page not found</h1>"
+            return self._serve_page(request, "admin.html", "<h1>Admin page not found</h1>")
+
+        @self.app.get("/assets/{name}")
+        async def asset(name: str, request: Request):
+            """Serve a fingerprinted frontend asset; its URL changes with its content"""
+            asset = get_frontend_service().get_asset(name)
+            if asset is None:
+                raise HTTPException(status_code=404, detail="Asset not found")
+            return self._cached_response(request, asset, media_type=ASSET_MEDIA_TYPES.get(Path(name).suffix, "application/octet-stream"), cache_control=IMMUTABLE_CACHE_CONTROL)
+
+        if metrics_registry.enabled:
+            @self.app.get("/metrics")
+            async def metrics():
+                """Prometheus scrape endpoint (FEATURE_FLAGS['enable_metrics'])"""
+                return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
         @self.app.get("/api")
         async def api_info():
@@ -98,6 +125,7 @@ class APIRoutes:
                     "add": "POST /add - Add a memory",
                     "query": "GET /query?q=your_question - Query memories",
                     "upload": "POST /upload - Upload MCP data",
+                    "ready": "GET /ready - Readiness (startup warm-up finished)",
                     "health": "GET /health - Health check",
                     "users": "GET /users - List users (admin)",
                     "docs": "GET /docs - API documentation"
@@ -107,105 +135,46 @@ class APIRoutes:
         @self.app.post("/register")
         async def register(user_id: str = Form(), password: str = Form()):
             """Register a new user"""
-            print(f"[REGISTER] User: {user_id}")
             try:
-                import sqlite3
-                from passlib.context import CryptContext
-
-                pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-                database_url = os.getenv('DATABASE_URL')
-
-                if database_url and database_url.startswith('postgresql'):
-                    print("[REGISTER] Using PostgreSQL")
-                    try:
-                        import psycopg
-                        conn = psycopg.connect(database_url)
-                    except ImportError:
-                        import psycopg2
-                        conn = psycopg2.connect(database_url)
-
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (user_id,))
-                    if cursor.fetchone():
-                        cursor.close()
-                        conn.close()
-                        raise HTTPException(status_code=400, detail="User already exists")
-
-                    hashed_password = pwd_context.hash(password)
-                    cursor.execute("INSERT INTO users (user_id, hashed_password) VALUES (%s, %s)", (user_id, hashed_password))
-                    conn.commit()
-                    cursor.close()
-                    conn.close()
-                    print(f"[REGISTER] Success: {user_id}")
-                else:
-                    print("[REGISTER] Using SQLite")
-                    auth_service = get_auth_service()
-                    auth_service.register(user_id, password)
-
+                if not await get_user_store().register(user_id, password):
+                    raise HTTPException(status_code=400, detail="User already exists")
+                logger.info("user registered", extra={"user_id": user_id})
                 return {"status": "registered"}
             except HTTPException:
                 raise
             except Exception as e:
-                print(f"[REGISTER] Error: {e}")
+                logger.exception("register failed", extra={"user_id": user_id})
                 raise HTTPException(status_code=500, detail=str(e))
         
         @self.app.post("/login")
         async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             """Login a user"""
-            print(f"[LOGIN] User: {form_data.username}")
             try:
-                import sqlite3
-                from passlib.context import CryptContext
-
-                pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-                database_url = os.getenv('DATABASE_URL')
-
-                if database_url and database_url.startswith('postgresql'):
-                    print("[LOGIN] Using PostgreSQL")
-                    try:
-                        import psycopg
-                        conn = psycopg.connect(database_url)
-                    except ImportError:
-                        import psycopg2
-                        conn = psycopg2.connect(database_url)
-
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT hashed_password FROM users WHERE user_id = %s", (form_data.username,))
-                    user = cursor.fetchone()
-                    cursor.close()
-                    conn.close()
-
-                    if not user:
-                        print(f"[LOGIN] User not found")
-                        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-                    if not pwd_context.verify(form_data.password, user[0]):
-                        print(f"[LOGIN] Wrong password")
-                        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-                    print(f"[LOGIN] Success")
-                    return {"access_token": form_data.username, "token_type": "bearer"}
-                else:
-                    print("[LOGIN] Using SQLite")
-                    auth_service = get_auth_service()
-                    return auth_service.login(form_data.username, form_data.password)
+                if not await get_user_store().authenticate(form_data.username, form_data.password):
+                    logger.info("login rejected", extra={"user_id": form_data.username})
+                    raise HTTPException(status_code=401, detail="Invalid credentials")
+
+                logger.info("login succeeded", extra={"user_id": form_data.username})
+                return {"access_token": form_data.username, "token_type": "bearer"}
             except HTTPException:
                 raise
             except Exception as e:
-                print(f"[LOGIN] Error: {e}")
+                logger.exception("login failed", extra={"user_id": form_data.username})
                 raise HTTPException(status_code=500, detail=str(e))
         
         @self.app.post("/add")
-        async def add_memory(memory: str = Form(), user: dict = Depends(self._get_current_user)):
+        async def add_memory(request: Request, memory: str = Form(), user: dict = Depends(self._get_current_user)):
             """Add a memory for the authenticated user"""
-            try:
+            user_id = user["user_id"]
+            
+            async def add():
                 llm_service = get_llm_service()
                 database_service = get_database_service()
                 
-                user_id = user["user_id"]
-                
                 # Process the memory through LLM
-                refined_memory = llm_service.process_input(
+                refined_memory = await self._offload(
+                    'llm',
+                    llm_service.process_input,
                     user_id, 
                     memory, 
                     is_query=False, 
@@ -213,75 +182,43 @@ class APIRoutes:
                 )
                 
                 # Store in database
-                database_service.add_memory(user_id, refined_memory)
+                await self._offload('vector', database_service.add_memory, user_id, refined_memory)
                 
                 return {"status": "added"}
-                
+            
+            try:
+                # A retry with the same Idempotency-Key replays the first outcome
+                return await self.idempotency.run(request, user_id, memory, add)
+            except HTTPException:
+                raise
             except Exception as e:
-                print(f"Error in /add: {str(e)}")
+                logger.exception("add failed", extra={"user_id": user_id})
                 raise HTTPException(status_code=500, detail=str(e))
         
         @self.app.get("/query")
         async def query_memories(q: str, user: dict = Depends(self._get_current_user)):
             """Query memories for the authenticated user"""
+            user_id = user["user_id"]
             try:
-                llm_service = get_llm_service()
-                database_service = get_database_service()
-                
-                user_id = user["user_id"]
-                print(f"Processing query for user {user_id}: {q}")
-                
-                # Process the query through LLM
-                refined_query = llm_service.process_input(
-                    user_id, 
-                    q, 
-                    is_query=True, 
-                    db_provider=database_service.get_provider()
-                )
-                print(f"Refined query: {refined_query}")
-                
-                # Query the database
-                results = database_service.query_memories(user_id, refined_query)
-                print(f"Query results: {results}")
-                
-                if results and len(results) > 0:
-                    # Filter out empty results
-                    filtered_results = [r for r in results if r and str(r).strip()]
-                    if filtered_results:
-                        # Generate natural language response
-                        summary_prompt = f"Answer this question: '{q}' using only this information: {filtered_results}. Give a direct, natural answer without any metadata."
-                        response = llm_service.process_input(user_id, summary_prompt, is_query=False)
-                        print(f"LLM response: {response}")
-                        
-                        # Handle response based on type
-                        if isinstance(response, str):
-                            response_text = response
-                        elif isinstance(response, dict):
-                            response_text = response.get('content', f"Based on your memories: {', '.join(filtered_results)}")
-                        else:
-                            response_text = str(response) if response else "No response generated"
-                        
-                        return {"results": response_text}
-                
-                return {"results": "No matching memories found."}
-                
+                # Duplicate queries in flight (double-click, several tabs) share one pipeline run
+                return await self.query_flights.do((user_id, normalize_key(q)), self._run_query, user_id, q)
             except Exception as e:
-                print(f"Error in /query: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("query failed", extra={"user_id": user_id})
                 return {"results": f"Error processing query: {str(e)}"}
         
         @self.app.post("/upload")
-        async def upload_data(mcp_data: dict, user: dict = Depends(self._get_current_user)):
+        async def upload_data(request: Request, mcp_data: dict, user: dict = Depends(self._get_current_user)):
             """Upload MCP data for the authenticated user"""
-            try:
+            user_id = user["user_id"]
+            
+            async def upload():
                 llm_service = get_llm_service()
                 database_service = get_database_service()
                 
-                user_id = user["user_id"]
-                
                 # Process the data through LLM
-                refined_data = llm_service.process_input(
+                refined_data = await self._offload(
+                    'llm',
+                    llm_service.process_input,
                     user_id, 
                     mcp_data, 
                     is_query=False, 
@@ -289,34 +226,50 @@ class APIRoutes:
                 )
                 
                 # Store in database
-                database_service.add_memory(user_id, refined_data)
+                await self._offload('vector', database_service.add_memory, user_id, refined_data)
                 
                 return {"status": "uploaded"}
-                
+            
+            try:
+                return await self.idempotency.run(request, user_id, mcp_data, upload)
+            except HTTPException:
+                raise
             except Exception as e:
-                print(f"Error in /upload: {str(e)}")
+                logger.exception("upload failed", extra={"user_id": user_id})
                 raise HTTPException(status_code=500, detail=str(e))
         
+        @self.app.get("/ready")
+        async def ready():
+            """Readiness: 200 once startup warm-up has finished, 503 before"""
+            snapshot = readiness.snapshot()
+            return JSONResponse(snapshot, status_code=200 if snapshot['ready'] else 503)
+        
         @self.app.get("/health")
         async def health_check():
             """Health check endpoint"""
             try:
                 llm_service = get_llm_service()
                 database_service = get_database_service()
-                auth_service = get_auth_service()
                 
+                # Provider checks make network calls, so they run in threads, concurrently
+                llm_ok, database_ok, auth_ok = await asyncio.gather(
+                    asyncio.to_thread(llm_service.health_check),
+                    asyncio.to_thread(database_service.health_check),
+                    get_user_store().health_check()
+                )
                 health_status = {
                     "api": "healthy",
-                    "llm": llm_service.health_check(),
-                    "database": database_service.health_check(),
-                    "authentication": auth_service.health_check()
+                    "llm": llm_ok,
+                    "database": database_ok,
+                    "authentication": auth_ok
                 }
                 
                 all_healthy = all(health_status.values())
                 
                 return {
                     "status": "healthy" if all_healthy else "degraded",
-                    "services": health_status
+                    "services": health_status,
+                    "load": admission_controller.snapshot()
                 }
                 
             except Exception as e:
@@ -326,12 +279,16 @@ class APIRoutes:
                 }
         
         @self.app.get("/users")
-        async def list_users(user: dict = Depends(self._get_current_user)):
-            """List all users (admin function)"""
+        async def list_users(
+            after: Optional[str] = None,
+            limit: Optional[int] = Query(None, ge=1),
+            user: dict = Depends(self._get_current_user)
+        ):
+            """List users one keyset page at a time (admin function)"""
             try:
-                auth_service = get_auth_service()
-                users = auth_service.list_users()
-                return {"users": users}
+                limit = self._page_limit(limit)
+                users = await get_user_store().list_users(after=after, limit=limit)
+                return {"users": users, "next_after": users[-1] if len(users) == limit else None}
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
 
@@ -347,104 +304,135 @@ class APIRoutes:
                 return {"llm": "unknown", "storage": "unknown"}
 
         @self.app.get("/admin/users")
-        async def list_all_users(user: dict = Depends(self._get_current_user)):
-            """List all users (admin only)"""
-            print(f"[ADMIN] List users request by {user['user_id']}")
-
-            # Admin check - only benjamin can access
-            if user["user_id"] != "benjamin":
-                print(f"[ADMIN] Access denied")
-                raise HTTPException(status_code=403, detail="Admin access required")
+        async def list_all_users(
+            after: Optional[str] = None,
+            limit: Optional[int] = Query(None, ge=1),
+            format: str = Query("json", pattern="^(json|ndjson)$"),
+            user: dict = Depends(self._get_current_user)
+        ):
+            """List users (admin only) - keyset pages as JSON, or the full table streamed as NDJSON"""
+            self._require_admin(user)
 
             try:
-                import sqlite3
-                database_url = os.getenv('DATABASE_URL')
-
-                if database_url and database_url.startswith('postgresql'):
-                    print("[ADMIN] Using PostgreSQL")
-                    try:
-                        import psycopg
-                        conn = psycopg.connect(database_url)
-                    except ImportError:
-                        import psycopg2
-                        conn = psycopg2.connect(database_url)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT user_id FROM users")
-                    users = [row[0] for row in cursor.fetchall()]
-                    cursor.close()
-                    conn.close()
-                else:
-                    print("[ADMIN] Using SQLite")
-                    conn = sqlite3.connect("users.db")
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT user_id FROM users")
-                    users = [row[0] for row in cursor.fetchall()]
-                    conn.close()
-
-                print(f"[ADMIN] Found users: {users}")
-                return {"users": users, "count": len(users)}
+                store = get_user_store()
+                if format == "ndjson":
+                    return StreamingResponse(self._stream_users(store, after, limit), media_type="application/x-ndjson")
+
+                limit = self._page_limit(limit)
+                users = await store.list_users(after=after, limit=limit)
+                page = {"users": users, "next_after": users[-1] if len(users) == limit else None}
+                # Total count only on the first page - later pages shouldn't pay for COUNT(*)
+                if after is None:
+                    page["count"] = await store.count_users()
+
+                return page
             except Exception as e:
-                print(f"[ADMIN] Error: {e}")
+                logger.exception("admin user listing failed")
                 raise HTTPException(status_code=500, detail=str(e))
 
         @self.app.delete("/admin/users/{user_id}")
-        async def delete_user(user_id: str, user: dict = Depends(self._get_current_user)):
-            """Delete a specific user (admin only)"""
-            print(f"[DELETE] Request to delete user: {user_id} by {user['user_id']}")
-
-            # Admin check
-            if user["user_id"] != "benjamin":
-                print(f"[DELETE] Access denied - not admin")
-                raise HTTPException(status_code=403, detail="Admin access required")
+        async def delete_user(user_id: str, background_tasks: BackgroundTasks, user: dict = Depends(self._get_current_user)):
+            """Delete a specific user (admin only); their vectors are purged in the background"""
+            self._require_admin(user)
 
             # Prevent self-deletion
-            if user_id == "benjamin":
-                print(f"[DELETE] Cannot delete admin")
+            if user_id == API_CONFIG['admin_user_id']:
                 raise HTTPException(status_code=400, detail="Cannot delete admin user")
 
             try:
-                import sqlite3
-                database_url = os.getenv('DATABASE_URL')
-                print(f"[DELETE] DATABASE_URL exists: {bool(database_url)}")
-
-                if database_url and database_url.startswith('postgresql'):
-                    print(f"[DELETE] Using PostgreSQL")
-                    try:
-                        import psycopg
-                        conn = psycopg.connect(database_url)
-                    except ImportError:
-                        import psycopg2
-                        conn = psycopg2.connect(database_url)
-                    try:
-                        with conn.cursor() as cursor:
-                            cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
-                            print(f"[DELETE] Rows affected: {cursor.rowcount}")
-                            if cursor.rowcount == 0:
-                                raise HTTPException(status_code=404, detail="User not found")
-                            conn.commit()
-                    finally:
-                        conn.close()
-                else:
-                    print(f"[DELETE] Using SQLite")
-                    conn = sqlite3.connect("users.db")
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-                    if cursor.rowcount == 0:
-                        conn.close()
-                        raise HTTPException(status_code=404, detail="User not found")
-                    conn.commit()
-                    conn.close()
-
-                print(f"[DELETE] Success: {user_id}")
-                return {"status": "deleted", "user_id": user_id}
+                if not await get_user_store().delete_user(user_id):
+                    raise HTTPException(status_code=404, detail="User not found")
+
+                job = await self._schedule_namespace_deletion([user_id], background_tasks)
+                logger.info("user deleted", extra={"user_id": user_id, "job_id": job.job_id, "admin": user["user_id"]})
+                return {"status": "deleted", "user_id": user_id, "job_id": job.job_id}
             except HTTPException:
                 raise
             except Exception as e:
-                print(f"[DELETE] Exception: {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("user delete failed", extra={"user_id": user_id})
                 raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+        @self.app.post("/admin/users/bulk-delete", status_code=202)
+        async def bulk_delete_users(
+            background_tasks: BackgroundTasks,
+            user_ids: list[str] = Body(..., embed=True),
+            user: dict = Depends(self._get_current_user)
+        ):
+            """Delete many users (admin only) and purge their vectors in one background job.
+
+            Namespaces are purged even for ids that no longer have a users row, so
+            vectors left behind by earlier deletions can be reclaimed too.
+            """
+            self._require_admin(user)
+            user_ids = [u for u in dict.fromkeys(user_ids) if u != API_CONFIG['admin_user_id']]
+            if not user_ids:
+                raise HTTPException(status_code=400, detail="No deletable users given")
+
+            try:
+                store = get_user_store()
+                deleted, missing = [], []
+                for user_id in user_ids:
+                    (deleted if await store.delete_user(user_id) else missing).append(user_id)
+
+                job = await self._schedule_namespace_deletion(user_ids, background_tasks)
+                logger.info("users bulk deleted", extra={"deleted": len(deleted), "missing": len(missing), "job_id": job.job_id, "admin": user["user_id"]})
+                return {"status": "accepted", "deleted": deleted, "missing": missing, "job_id": job.job_id}
+            except Exception as e:
+                logger.exception("bulk delete failed")
+                raise HTTPException(status_code=500, detail=str(e))
+
+        @self.app.get("/admin/jobs")
+        async def list_jobs(user: dict = Depends(self._get_current_user)):
+            """List recent background jobs (admin only)"""
+            self._require_admin(user)
+            return {"jobs": [job.to_dict() for job in await asyncio.to_thread(self.jobs.list)]}
+
+        @self.app.get("/admin/jobs/{job_id}")
+        async def get_job(job_id: str, user: dict = Depends(self._get_current_user)):
+            """Get the progress of a background job (admin only)"""
+            self._require_admin(user)
+            job = await asyncio.to_thread(self.jobs.get, job_id)
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
+            return job.to_dict()
+
+        @self.app.get("/admin/profile")
+        async def profile(
+            seconds: float = Query(PROFILER_CONFIG['default_seconds'], gt=0, le=PROFILER_CONFIG['max_seconds']),
+            mode: str = Query("cpu", pattern="^(cpu|wall|alloc)$"),
+            interval_ms: float = Query(PROFILER_CONFIG['interval_ms'], ge=1, le=1000),
+            user: dict = Depends(self._get_current_user)
+        ):
+            """Profile this worker for `seconds` (admin only) - collapsed stacks for flamegraph tools
+
+            cpu/wall: stack samples of every thread, weighted by sample count.
+            alloc: memory allocated during the window and still held, weighted by bytes.
+            """
+            self._require_admin(user)
+            if not PROFILER_CONFIG['enabled']:
+                raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+            if mode == "alloc":
+                profiler = AllocationProfiler(PROFILER_CONFIG['alloc_frames'])
+            else:
+                profiler = SamplingProfiler(interval_ms / 1000, mode)
+            try:
+                profiler.start()
+            except ProfilerBusy:
+                raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                # Snapshotting and grouping take a while with many allocations; keep them off the event loop
+                await asyncio.to_thread(profiler.stop)
+            body = await asyncio.to_thread(profiler.collapsed)
+
+            summary = profiler.summary()
+            logger.info("profile taken", extra={"admin": user["user_id"], **{f"profile_{k}": v for k, v in summary.items()}})
+            headers = {f"X-Profile-{key.replace('_', '-').title()}": str(value) for key, value in summary.items()}
+            headers["X-Worker-PID"] = str(os.getpid())
+            return Response(body, media_type="text/plain; charset=utf-8", headers=headers)
+
         # Mount static files (for web interface)
         if API_CONFIG['serve_static']:
             try:
@@ -452,49 +440,116 @@ class APIRoutes:
                 frontend_static_path = Path(__file__).parent.parent / "frontend" / "static"
                 if frontend_static_path.exists():
                     self.app.mount("/static", StaticFiles(directory=str(frontend_static_path)), name="frontend_static")
-                    print(f"✅ Mounted frontend static files from {frontend_static_path}")
+                    logger.info("mounted frontend static files", extra={"path": str(frontend_static_path)})
             except Exception as e:
-                print(f"⚠️ Could not mount static files: {e}")
+                logger.warning("could not mount static files: %s", e)
+    
+    async def _run_query(self, user_id: str, q: str) -> dict:
+        """Refine the query, search the user's memories and answer from the matches"""
+        llm_service = get_llm_service()
+        database_service = get_database_service()
+        logger.debug("query received", extra={"user_id": user_id, "query_chars": len(q)})
+        
+        # Process the query through LLM
+        refined_query = await self._offload(
+            'llm',
+            llm_service.process_input,
+            user_id, 
+            q, 
+            is_query=True, 
+            db_provider=database_service.get_provider()
+        )
+        
+        # Query the database
+        results = await self._offload('vector', database_service.query_memories, user_id, refined_query)
+        logger.debug("query matched", extra={"user_id": user_id, "matches": len(results or [])})
+        
+        if results and len(results) > 0:
+            # Filter out empty results
+            filtered_results = [r for r in results if r and str(r).strip()]
+            if filtered_results:
+                # Generate natural language response
+                summary_prompt = f"Answer this question: '{q}' using only this information: {filtered_results}. Give a direct, natural answer without any metadata."
+                response = await self._offload('llm', llm_service.process_input, user_id, summary_prompt, is_query=False)
+                
+                # Handle response based on type
+                if isinstance(response, str):
+                    response_text = response
+                elif isinstance(response, dict):
+                    response_text = response.get('content', f"Based on your memories: {', '.join(filtered_results)}")
+                else:
+                    response_text = str(response) if response else "No response generated"
+                
+                return {"results": response_text}
+        
+        return {"results": "No matching memories found."}
+    
+    async def _offload(self, kind: str, fn, *args, **kwargs):
+        """Run a blocking LLM/vector call in a worker thread, counted as in-flight work"""
+        with admission_controller.operation(kind):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+    
+    def _serve_page(self, request: Request, name: str, fallback: str) -> Response:
+        """Serve an HTML component from the in-memory page cache"""
+        page = get_frontend_service().get_page(name)
+        if page is None:
+            return HTMLResponse(fallback)
+        return self._cached_response(request, page, media_type="text/html; charset=utf-8", cache_control="no-cache")
     
-    def _get_current_user(self, token: str = Depends(get_auth_service().get_oauth2_scheme())):
+    def _cached_response(self, request: Request, cached, media_type: str, cache_control: str) -> Response:
+        """Build a response from a precompressed cache entry, honouring If-None-Match"""
+        encoding, body, etag = cached.select(request.headers.get("accept-encoding", ""))
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": cache_control}
+        if cached.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=media_type, headers=headers)
+    
+    def _require_admin(self, user: dict):
+        """Reject non-admin users with 403"""
+        if user["user_id"] != API_CONFIG['admin_user_id']:
+            logger.warning("admin access denied", extra={"user_id": user["user_id"]})
+            raise HTTPException(status_code=403, detail="Admin access required")
+    
+    async def _schedule_namespace_deletion(self, user_ids: list, background_tasks: BackgroundTasks) -> NamespaceDeletionJob:
+        """Register a vector cleanup job and run it after the response is sent"""
+        job = await asyncio.to_thread(self.jobs.add, NamespaceDeletionJob(user_ids))
+        background_tasks.add_task(job.run, get_database_service(), self.jobs.save)
+        return job
+    
+    def _page_limit(self, limit: Optional[int]) -> int:
+        """Clamp a requested page size to the configured bounds"""
+        return min(limit or API_CONFIG['users_page_size'], API_CONFIG['users_max_page_size'])
+    
+    async def _stream_users(self, store, after: Optional[str], limit: Optional[int], batch_size: int = 1000):
+        """Stream user ids as NDJSON, one chunk per keyset batch"""
+        lines, sent = [], 0
+        async for user_id in store.iter_users(after=after, batch_size=batch_size):
+            lines.append(json.dumps({"user_id": user_id}) + "\n")
+            sent += 1
+            if len(lines) >= batch_size:
+                yield "".join(lines)
+                lines = []
+            if limit is not None and sent >= limit:
+                break
+        if lines:
+            yield "".join(lines)
+    
+    async def _get_current_user(self, token: str = Depends(get_auth_service().get_oauth2_scheme())):
         """Get current user dependency"""
-        print(f"[AUTH] Validating token: {token}")
-
-        import sqlite3
-        database_url = os.getenv('DATABASE_URL')
-
         try:
-            if database_url and database_url.startswith('postgresql'):
-                print("[AUTH] Using PostgreSQL")
-                try:
-                    import psycopg
-                    conn = psycopg.connect(database_url)
-                except ImportError:
-                    import psycopg2
-                    conn = psycopg2.connect(database_url)
-
-                cursor = conn.cursor()
-                cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (token,))
-                user = cursor.fetchone()
-                cursor.close()
-                conn.close()
-
-                if not user:
-                    print(f"[AUTH] User not found")
-                    raise HTTPException(status_code=401, detail="Not authenticated")
-
-                print(f"[AUTH] Valid token")
-                return {"user_id": user[0]}
-            else:
-                print("[AUTH] Using SQLite")
-                auth_service = get_auth_service()
-                return auth_service.get_user_from_token(token)
+            with stage("auth") as span:
+                user_id = await get_user_store().get_user(token)
+                span.set(authenticated=bool(user_id))
+            if not user_id:
+                raise HTTPException(status_code=401, detail="Not authenticated")
+
+            return {"user_id": user_id}
         except HTTPException:
             raise
         except Exception as e:
-            print(f"[AUTH] Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("token validation failed")
             raise HTTPException(status_code=401, detail="Not authenticated")
     
     def get_app(self) -> FastAPI:
@@ -7,6 +7,7 @@ It can be run independently to test just the API functionality.
 
 import uvicorn
 import os
+from config.settings import SERVER_CONFIG
 from .config import API_CONFIG
 from .routes import api_routes
 
@@ -33,7 +34,9 @@ def start_server():
         app,
         host=API_CONFIG['host'],
         port=API_CONFIG['port'],
-        reload=API_CONFIG['reload']
+        reload=API_CONFIG['reload'],
+        proxy_headers=True,
+        forwarded_allow_ips=SERVER_CONFIG['forwarded_allow_ips']
     )
 
 if __name__ == "__main__":
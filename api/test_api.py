@@ -7,16 +7,36 @@ Run this to test all API functionality before merging to develop.
 import os
 import sys
 import unittest
+import gzip
+import json
+import tempfile
+import time
+from pathlib import Path
 from unittest.mock import Mock, patch
 from fastapi.testclient import TestClient
 
 # Add current directory to path for imports
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from routes import api_routes
-from interface import api_service
-from config import API_CONFIG, CORS_CONFIG
-from dependencies import get_database_service, get_llm_service, get_auth_service
+from api.routes import api_routes, APIRoutes
+from api.interface import api_service
+from api.config import API_CONFIG, CORS_CONFIG, RATE_LIMIT_CONFIG as API_RATE_LIMIT_CONFIG
+from api.dependencies import get_database_service, get_llm_service, get_auth_service, initialize_services
+from api.middleware import CompressionMiddleware, CompressionStats
+from api.ratelimit import RateLimitMiddleware, MemoryBucketStore, SQLiteBucketStore, Budget
+from api.admission import AdmissionController, AdmissionMiddleware, Overloaded
+from api.idempotency import IdempotencyGuard, MemoryIdempotencyStore, SQLiteIdempotencyStore
+from frontend.cache import StaticPageCache
+from monitoring.timing import stage
+from monitoring.tracing import MemoryExporter, tracer
+from monitoring.profiler import SamplingProfiler
+from frontend.assets import minify_js
+from benchmarks.import_time import profile_import
+from api import warmup
+from api.warmup import Readiness, warm_up
+from api.prefork import preload
+from api.jobs import NamespaceDeletionJob, SQLiteJobRegistry
+from config.settings import worker_count
 
 
 class TestAPIModule(unittest.TestCase):
@@ -169,6 +189,746 @@ class TestAPIConfiguration(unittest.TestCase):
         self.assertIn('allow_headers', CORS_CONFIG)
 
 
+class TestPageCache(unittest.TestCase):
+    """Test the in-memory HTML page cache"""
+    
+    def setUp(self):
+        self.client = TestClient(api_routes.get_app())
+    
+    def test_page_served_from_memory(self):
+        """Landing page requests should not read the file again"""
+        with patch.object(Path, 'read_text', side_effect=AssertionError("disk read")), \
+             patch.object(Path, 'read_bytes', side_effect=AssertionError("disk read")):
+            response = self.client.get("/admin", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response.headers)
+        self.assertNotIn("Content-Encoding", response.headers)
+    
+    def test_gzip_variant_and_304(self):
+        """Test content negotiation and conditional requests"""
+        response = self.client.get("/capsule", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        
+        etag = response.headers["ETag"]
+        response = self.client.get("/capsule", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+    
+    def test_fingerprinted_assets(self):
+        """HTML points at hashed assets that are cached forever"""
+        page = self.client.get("/capsule").text
+        self.assertNotIn('"/static/js/app.js"', page)
+        url = next(part for part in page.split('"') if part.startswith("/assets/app."))
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("javascript", response.headers["Content-Type"])
+        self.assertEqual(self.client.get("/assets/app.0000000000.js").status_code, 404)
+    
+    def test_minify_js(self):
+        """Comments and indentation go, template literals stay intact"""
+        source = "// header\nfunction f() {\n    /* note */\n    return `a\n    b`;\n}\n"
+        self.assertEqual(minify_js(source), "function f() {\nreturn `a\n    b`;\n}\n")
+    
+    def test_refresh_picks_up_changes(self):
+        """Test reloading pages that changed on disk"""
+        with tempfile.TemporaryDirectory() as tmp:
+            page = Path(tmp) / "page.html"
+            page.write_text("<h1>one</h1>")
+            cache = StaticPageCache(Path(tmp))
+            self.assertEqual(cache.load(), 1)
+            old_etag = cache.get("page.html").select("")[2]
+            
+            page.write_text("<h1>two</h1>")
+            os.utime(page, (0, 0))
+            self.assertEqual(cache.refresh(), ["page.html"])
+            
+            encoding, body, etag = cache.get("page.html").select("gzip, br;q=0")
+            self.assertEqual(encoding, "gzip")
+            self.assertEqual(gzip.decompress(body), b"<h1>two</h1>")
+            self.assertNotEqual(etag, old_etag)
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+    """Test negotiated response compression"""
+    
+    def setUp(self):
+        from fastapi import FastAPI
+        from fastapi.responses import StreamingResponse
+        
+        app = FastAPI()
+        
+        @app.get("/big")
+        async def big():
+            return {"memories": ["I like pizza"] * 500}
+        
+        @app.get("/small")
+        async def small():
+            return {"status": "ok"}
+        
+        @app.get("/stream")
+        async def stream():
+            return StreamingResponse(iter([b"x" * 4096, b"y" * 4096]), media_type="text/plain")
+        
+        self.stats = CompressionStats()
+        app.add_middleware(CompressionMiddleware, minimum_size=1024, stats=self.stats)
+        self.client = TestClient(app)
+    
+    def test_large_json_compressed(self):
+        response = self.client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(len(response.json()["memories"]), 500)
+        
+        stats = self.stats.snapshot()["encodings"]["gzip"]
+        self.assertEqual(stats["responses"], 1)
+        self.assertLess(stats["bytes_out"], stats["bytes_in"])
+        self.assertGreaterEqual(stats["cpu_seconds"], 0)
+    
+    def test_small_and_streaming_skipped(self):
+        self.assertNotIn("Content-Encoding", self.client.get("/small", headers={"Accept-Encoding": "gzip"}).headers)
+        response = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(len(response.content), 8192)
+        self.assertEqual(self.stats.snapshot()["skipped"], 2)
+    
+    def test_no_accept_encoding(self):
+        response = self.client.get("/big", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+class TestServerTiming(unittest.TestCase):
+    """Test per-stage Server-Timing headers and slow-request records"""
+    
+    def setUp(self):
+        self.client = TestClient(api_routes.get_app())
+        store = Mock()
+        
+        async def get_user(token):
+            return token
+        store.get_user = get_user
+        
+        def process_input(user_id, text, is_query=False, db_provider=None):
+            with stage("llm_query" if is_query else "llm_answer"):
+                return "refined"
+        
+        def query_memories(user_id, query):
+            with stage("embed"), stage("vector_query"):
+                return ["I like pizza"]
+        
+        llm = Mock(process_input=process_input)
+        db = Mock(query_memories=query_memories)
+        db.get_provider.return_value = "pinecone"
+        self.patches = [
+            patch('api.routes.get_user_store', return_value=store),
+            patch('api.routes.get_llm_service', return_value=llm),
+            patch('api.routes.get_database_service', return_value=db),
+        ]
+        for p in self.patches:
+            p.start()
+    
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+    
+    def test_query_stages(self):
+        response = self.client.get("/query?q=food", headers={"Authorization": "Bearer test_user"})
+        self.assertEqual(response.status_code, 200)
+        header = response.headers["Server-Timing"]
+        for name in ("auth", "llm_query", "embed", "vector_query", "llm_answer", "total"):
+            self.assertIn(f"{name};dur=", header)
+    
+    def test_slow_request_logged(self):
+        with patch('api.middleware.SERVER_TIMING_CONFIG', {'routes': ('/query',), 'slow_request_ms': 0, 'enabled': True}):
+            client = TestClient(APIRoutes().get_app())
+            with self.assertLogs('capsule.slow_requests', level='WARNING') as logs:
+                client.get("/query?q=food", headers={"Authorization": "Bearer test_user"})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/query")
+        self.assertIn("vector_query", record["stages_ms"])
+    
+    def test_untimed_route(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api").headers)
+    
+    def test_request_id(self):
+        """Correlation ids are generated or propagated"""
+        self.assertTrue(self.client.get("/api").headers["X-Request-ID"])
+        self.assertEqual(self.client.get("/api", headers={"X-Request-ID": "abc123"}).headers["X-Request-ID"], "abc123")
+
+
+class TestRateLimit(unittest.TestCase):
+    """Test token-bucket rate limiting"""
+    
+    def setUp(self):
+        from fastapi import FastAPI
+        
+        app = FastAPI()
+        
+        @app.get("/query")
+        async def query():
+            return {"results": "ok"}
+        
+        @app.get("/api")
+        async def api():
+            return {"status": "running"}
+        
+        @app.get("/health")
+        async def health():
+            return {"status": "healthy"}
+        
+        config = {**API_RATE_LIMIT_CONFIG, 'per_user': True, 'requests_per_minute': 1, 'burst_limit': 2,
+                  'general_requests_per_minute': 1, 'general_burst_limit': 3}
+        
+        async def verify(token):
+            return token if token in ('alice', 'bob') else None
+        app.add_middleware(RateLimitMiddleware, store=MemoryBucketStore(), config=config, verify=verify)
+        self.client = TestClient(app)
+    
+    def test_expensive_budget(self):
+        headers = {"Authorization": "Bearer alice"}
+        # The first request is charged to the IP while the token gets verified, the rest to alice
+        statuses = [self.client.get("/query", headers=headers).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 200])
+        response = self.client.get("/query", headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        
+        # Other users and the general budget are unaffected
+        self.assertEqual(self.client.get("/query", headers={"Authorization": "Bearer bob"}).status_code, 200)
+        self.assertEqual(self.client.get("/api", headers=headers).status_code, 200)
+    
+    def test_ip_budget_and_exempt_routes(self):
+        statuses = [self.client.get("/api").status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(self.client.get("/health").status_code, 200)
+    
+    def test_unverified_tokens_share_the_ip_budget(self):
+        statuses = [self.client.get("/api", headers={"Authorization": f"Bearer made-up-{i}"}).status_code
+                    for i in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+    
+    def test_forwarded_client_ip(self):
+        """Behind a trusted proxy each forwarded client gets its own IP bucket"""
+        from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+        client = TestClient(ProxyHeadersMiddleware(self.client.app, trusted_hosts="*"))
+        statuses = [client.get("/api", headers={"X-Forwarded-For": "203.0.113.7"}).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(client.get("/api", headers={"X-Forwarded-For": "203.0.113.8"}).status_code, 200)
+    
+    def test_memory_store_bounded(self):
+        import asyncio
+        budget = Budget('general', per_minute=60, burst=5)
+        store = MemoryBucketStore(max_buckets=2)
+        for key in ('a', 'b', 'c'):
+            asyncio.run(store.take(budget, key))
+        self.assertEqual(len(store), 2)
+        idle = MemoryBucketStore(idle_seconds=0)
+        asyncio.run(idle.take(budget, 'a'))
+        time.sleep(0.01)
+        asyncio.run(idle.take(budget, 'b'))
+        self.assertEqual(len(idle), 1)
+    
+    def test_sqlite_backend_shared(self):
+        """Two stores on one file (two workers) share a bucket"""
+        import asyncio
+        budget = Budget('expensive', per_minute=1, burst=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ratelimit.db")
+            first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+            try:
+                self.assertTrue(asyncio.run(first.take(budget, "user:alice"))[0])
+                self.assertFalse(asyncio.run(second.take(budget, "user:alice"))[0])
+                self.assertEqual(first.prune(time.time() + 3601), 1)  # Idle buckets are deleted
+            finally:
+                first.close()
+                second.close()
+
+
+class TestAdmission(unittest.TestCase):
+    """Test admission control and load shedding"""
+    
+    def test_shed_when_saturated(self):
+        """Expensive routes 503 with Retry-After while cheap routes keep serving"""
+        from fastapi import FastAPI
+        
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        app = FastAPI()
+        
+        @app.get("/query")
+        async def query():
+            return {"results": "ok"}
+        
+        @app.get("/health")
+        async def health():
+            return {"status": "healthy"}
+        
+        app.add_middleware(AdmissionMiddleware, controller=controller, routes=("/query",))
+        client = TestClient(app)
+        
+        self.assertEqual(client.get("/query").status_code, 200)
+        controller.in_flight = 1  # Simulate a slot held by another request
+        response = client.get("/query")
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        self.assertEqual(client.get("/health").status_code, 200)
+        self.assertEqual(controller.snapshot()["shed_total"], 1)
+    
+    def test_queued_request_gets_freed_slot(self):
+        import asyncio
+        
+        async def scenario():
+            controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+            order = []
+            
+            async def request(name, hold):
+                async with controller.admit():
+                    order.append(name)
+                    await asyncio.sleep(hold)
+            
+            first = asyncio.create_task(request("first", 0.05))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(request("second", 0))
+            await asyncio.sleep(0)
+            self.assertEqual(controller.queued, 1)
+            with self.assertRaises(Overloaded):
+                await request("third", 0)  # Queue is full
+            await asyncio.gather(first, second)
+            return order, controller.in_flight
+        
+        order, in_flight = asyncio.run(scenario())
+        self.assertEqual(order, ["first", "second"])
+        self.assertEqual(in_flight, 0)
+    
+    def test_queue_timeout(self):
+        import asyncio
+        
+        async def scenario():
+            controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+            controller.in_flight = 1
+            with self.assertRaises(Overloaded) as raised:
+                async with controller.admit():
+                    pass
+            return raised.exception.reason, controller.queued
+        
+        self.assertEqual(asyncio.run(scenario()), ("queue timeout", 0))
+    
+    def test_cancelled_waiter_passes_its_slot_on(self):
+        """A queued request cancelled just after being handed a slot doesn't keep it"""
+        import asyncio
+        
+        async def wait_for(future, timeout):
+            # As wait_for on Python 3.12+: a cancellation arriving with the result still raises
+            return await future
+        
+        async def scenario():
+            controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+            await controller._acquire()
+            
+            async def request():
+                async with controller.admit():
+                    pass
+            
+            queued = asyncio.create_task(request())
+            await asyncio.sleep(0)
+            controller._release()  # Hands the slot to the queued request
+            queued.cancel()  # The client disconnects before it runs
+            with self.assertRaises(asyncio.CancelledError):
+                await queued
+            return controller.in_flight, controller.queued
+        
+        with patch('api.admission.asyncio.wait_for', wait_for):
+            self.assertEqual(asyncio.run(scenario()), (0, 0))
+
+
+class TestIdempotency(unittest.TestCase):
+    """Test Idempotency-Key handling on /add and /upload"""
+    
+    def setUp(self):
+        self.routes = APIRoutes()
+        self.routes.idempotency = IdempotencyGuard(store=MemoryIdempotencyStore())
+        self.client = TestClient(self.routes.get_app())
+        store = Mock()
+        
+        async def get_user(token):
+            return token
+        store.get_user = get_user
+        
+        self.llm = Mock()
+        self.llm.process_input.return_value = {"content": "refined"}
+        self.db = Mock()
+        self.db.get_provider.return_value = "pinecone"
+        self.patches = [
+            patch('api.routes.get_user_store', return_value=store),
+            patch('api.routes.get_llm_service', return_value=self.llm),
+            patch('api.routes.get_database_service', return_value=self.db),
+        ]
+        for p in self.patches:
+            p.start()
+    
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+    
+    def _add(self, memory="I like pizza", key="key-1", user="alice"):
+        headers = {"Authorization": f"Bearer {user}"}
+        if key is not None:
+            headers["Idempotency-Key"] = key
+        return self.client.post("/add", data={"memory": memory}, headers=headers)
+    
+    def test_retry_replays_without_rerunning(self):
+        first = self._add()
+        retry = self._add()
+        self.assertEqual(first.json(), {"status": "added"})
+        self.assertEqual(retry.json(), {"status": "added"})
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(self.llm.process_input.call_count, 1)
+        self.assertEqual(self.db.add_memory.call_count, 1)
+    
+    def test_keys_scoped_per_user_and_optional(self):
+        self._add(user="alice")
+        self._add(user="bob")
+        self._add(key=None)
+        self._add(key=None)
+        self.assertEqual(self.db.add_memory.call_count, 4)
+    
+    def test_key_reused_for_different_payload(self):
+        self._add(memory="I like pizza")
+        response = self._add(memory="I like sushi")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.db.add_memory.call_count, 1)
+    
+    def test_failure_not_stored(self):
+        self.db.add_memory.side_effect = [RuntimeError("pinecone down"), None]
+        self.assertEqual(self._add().status_code, 500)
+        self.assertEqual(self._add().status_code, 200)
+        self.assertEqual(self.db.add_memory.call_count, 2)
+    
+    def test_upload(self):
+        headers = {"Authorization": "Bearer alice", "Idempotency-Key": "upload-1"}
+        for _ in range(2):
+            self.assertEqual(self.client.post("/upload", json={"b": 1, "a": 2}, headers=headers).json(), {"status": "uploaded"})
+        self.assertEqual(self.db.add_memory.call_count, 1)
+    
+    def test_sqlite_store_shared_and_expires(self):
+        import asyncio
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "idempotency.db")
+            first, second = SQLiteIdempotencyStore(path), SQLiteIdempotencyStore(path)
+            try:
+                asyncio.run(first.put("/add:alice:k", ("fp", 200, '{"status": "added"}'), ttl=60))
+                asyncio.run(first.put("/add:alice:old", ("fp", 200, '{}'), ttl=-1))
+                self.assertEqual(asyncio.run(second.get("/add:alice:k")), ("fp", 200, '{"status": "added"}'))
+                self.assertIsNone(asyncio.run(second.get("/add:alice:old")))
+            finally:
+                first.close()
+                second.close()
+
+
+class TestColdStart(unittest.TestCase):
+    """Test that importing the app is cheap and the lifespan builds the services"""
+    
+    def test_import_profile(self):
+        """Regression guard: no provider clients, models or network calls at import time"""
+        profile = profile_import('develop.app')
+        for heavy in ('sentence_transformers', 'httpcore'):
+            self.assertNotIn(heavy, profile.modules, f"{heavy} imported eagerly\n{profile.report()}")
+        self.assertLess(profile.seconds, 5, profile.report())
+    
+    def test_services_not_built_on_import(self):
+        import subprocess
+        check = ("import develop.app, database, llm, authentication; "
+                 "assert database.database_service._db_handler is None; "
+                 "assert llm.llm_service._llm_handler is None; "
+                 "assert authentication.auth_service._auth_handler is None")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', check], cwd=root, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+    
+    def test_initialize_services(self):
+        """Every service is built up front; one failing doesn't stop the others"""
+        db, llm, auth = Mock(), Mock(), Mock()
+        llm.initialize.side_effect = ValueError("No GROQ_API_KEY")
+        with patch('api.dependencies.get_database_service', return_value=db), \
+             patch('api.dependencies.get_llm_service', return_value=llm), \
+             patch('api.dependencies.get_auth_service', return_value=auth):
+            timings = initialize_services()
+        self.assertEqual(set(timings), {'authentication', 'database', 'llm'})
+        db.initialize.assert_called_once()
+        auth.initialize.assert_called_once()
+
+
+class TestWarmUp(unittest.TestCase):
+    """Test the startup warm-up and /ready"""
+    
+    def setUp(self):
+        self._readiness = (warmup.readiness.ready, dict(warmup.readiness.steps))
+    
+    def tearDown(self):
+        warmup.readiness.ready, warmup.readiness.steps = self._readiness
+    
+    def test_failed_step_recorded_not_fatal(self):
+        import asyncio
+        
+        def failing():
+            raise ConnectionError("index unreachable")
+        
+        readiness = asyncio.run(warm_up(Readiness(), {'llm_connection': lambda: None, 'vector_index': failing}))
+        self.assertTrue(readiness.ready)
+        self.assertNotIn('error', readiness.steps['llm_connection'])
+        self.assertEqual(readiness.steps['vector_index']['error'], "index unreachable")
+    
+    def test_ready_endpoint(self):
+        client = TestClient(api_routes.get_app())
+        warmup.readiness.ready = False
+        self.assertEqual(client.get("/ready").status_code, 503)
+        warmup.readiness.ready = True
+        self.assertEqual(client.get("/ready").status_code, 200)
+    
+    def test_lifespan_serves_after_timeout(self):
+        """A slow step doesn't hold startup past WARMUP_TIMEOUT; /ready flips when it ends"""
+        import threading
+        release = threading.Event()
+        store = Mock(backend='sqlite')
+        
+        async def noop(*args):
+            return None
+        store.open = store.init_schema = store.close = noop
+        
+        warmup.readiness.ready = False
+        with patch('api.lifespan.initialize_services', return_value={}), \
+             patch('api.lifespan.get_user_store', return_value=store), \
+             patch('api.lifespan.WARMUP_CONFIG', {'enabled': True, 'timeout': 0.05}), \
+             patch('api.warmup.default_steps', return_value={'vector_index': lambda: release.wait(5)}):
+            with TestClient(APIRoutes().get_app()) as client:
+                self.assertEqual(client.get("/ready").status_code, 503)
+                self.assertEqual(client.get("/api").status_code, 200)
+                release.set()
+                for _ in range(100):
+                    if client.get("/ready").status_code == 200:
+                        break
+                    time.sleep(0.01)
+                self.assertEqual(client.get("/ready").json()["steps"]["vector_index"].keys(), {"ms"})
+
+
+class TestPrefork(unittest.TestCase):
+    """Test the pre-fork server mode"""
+    
+    @patch('database.database.DBHandler.load_model')  # Imports the module before the env var is set
+    @patch.dict(os.environ, {'USE_LOCAL_EMBEDDINGS': 'true'})
+    def test_preload_loads_model_in_master(self, mock_load):
+        self.assertEqual(preload(), ['embedding_model'])
+        mock_load.assert_called_once()
+    
+    @patch.dict(os.environ, {'USE_LOCAL_EMBEDDINGS': 'false'})
+    def test_preload_nothing_without_local_embeddings(self):
+        self.assertEqual(preload(), [])
+    
+    def test_workers_serve_and_stop(self):
+        """Two workers accept on one socket; SIGTERM stops master and workers cleanly"""
+        import signal
+        import socket
+        import subprocess
+        import urllib.request
+        
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'PYTHONPATH': root, 'WARMUP_ENABLED': 'false', 'LOG_FILE': '',
+                   'USERS_DB_PATH': os.path.join(tmp, 'users.db')}
+            master = subprocess.Popen(
+                [sys.executable, '-m', 'api.prefork', '--workers', '2', '--host', '127.0.0.1', '--port', str(port)],
+                cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            try:
+                status = None
+                for _ in range(100):
+                    try:
+                        status = urllib.request.urlopen(f"http://127.0.0.1:{port}/api", timeout=1).status
+                        break
+                    except OSError:
+                        time.sleep(0.1)
+                self.assertEqual(status, 200)
+            finally:
+                master.send_signal(signal.SIGTERM)
+                _, stderr = master.communicate(timeout=20)
+            self.assertEqual(master.returncode, 0)
+            self.assertIn('"workers": 2', stderr.decode())
+            # With several workers, shared state defaults to SQLite files
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'ratelimit.db')))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'jobs.db')))
+
+
+class TestMultiWorker(unittest.TestCase):
+    """Test the state shared between worker processes"""
+    
+    def test_worker_count(self):
+        self.assertEqual(worker_count('3'), 3)
+        self.assertEqual(worker_count(0), 1)
+        self.assertGreaterEqual(worker_count('auto'), 1)
+    
+    def test_prefork_master_does_not_import_app(self):
+        """The master must not read api.config before it sets the worker count"""
+        import subprocess
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run(
+            [sys.executable, '-c', "import sys, api.prefork; print('api.config' in sys.modules, 'api.routes' in sys.modules)"],
+            cwd=root, capture_output=True, text=True, timeout=60
+        ).stdout
+        self.assertIn('False False', out)
+    
+    def test_sqlite_job_registry_shared(self):
+        """A job run by one worker is visible, with its progress, to another"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'jobs.db')
+            worker_a, worker_b = SQLiteJobRegistry(path), SQLiteJobRegistry(path)
+            job = worker_a.add(NamespaceDeletionJob(['u1', 'u2']))
+            self.assertEqual(worker_b.get(job.job_id).to_dict()['status'], 'pending')
+            
+            database_service = Mock()
+            database_service.count_namespace.return_value = 3
+            database_service.delete_namespace.return_value = True
+            import asyncio
+            asyncio.run(job.run(database_service, worker_a.save))
+            
+            seen = worker_b.get(job.job_id).to_dict()
+            self.assertEqual(seen['status'], 'completed')
+            self.assertEqual(seen['progress'], {'done': 2, 'total': 2})
+            self.assertEqual(seen['vectors_reclaimed'], 6)
+            self.assertEqual([j.job_id for j in worker_b.list()], [job.job_id])
+            self.assertIsNone(worker_b.get('missing'))
+            worker_a.close()
+            worker_b.close()
+    
+    def test_sqlite_job_registry_drops_oldest_finished(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = SQLiteJobRegistry(os.path.join(tmp, 'jobs.db'), max_jobs=2)
+            first = registry.add(NamespaceDeletionJob(['u1']))
+            first.status = 'completed'
+            registry.save(first)
+            running = registry.add(NamespaceDeletionJob(['u2']))
+            latest = registry.add(NamespaceDeletionJob(['u3']))
+            self.assertEqual([j.job_id for j in registry.list()], [latest.job_id, running.job_id])
+            registry.close()
+
+
+class TestProfileEndpoint(unittest.TestCase):
+    """Test /admin/profile"""
+    
+    def setUp(self):
+        with patch.dict(API_RATE_LIMIT_CONFIG, {'enabled': False}):
+            self.client = TestClient(APIRoutes().get_app())
+        store = Mock()
+        
+        async def get_user(token):
+            return token
+        store.get_user = get_user
+        self.patch = patch('api.routes.get_user_store', return_value=store)
+        self.patch.start()
+        self.admin = {"Authorization": f"Bearer {API_CONFIG['admin_user_id']}"}
+    
+    def tearDown(self):
+        self.patch.stop()
+    
+    def test_admin_only(self):
+        response = self.client.get("/admin/profile?seconds=0.1", headers={"Authorization": "Bearer alice"})
+        self.assertEqual(response.status_code, 403)
+    
+    def test_sampling_profile(self):
+        response = self.client.get("/admin/profile?seconds=0.2&mode=wall&interval_ms=5", headers=self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertEqual(response.headers["X-Profile-Mode"], "wall")
+        self.assertGreater(int(response.headers["X-Profile-Samples"]), 0)
+        self.assertEqual(response.headers["X-Worker-PID"], str(os.getpid()))
+        for line in response.text.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack and int(count) > 0)
+    
+    def test_allocation_profile(self):
+        response = self.client.get("/admin/profile?seconds=0.1&mode=alloc", headers=self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Profile-Mode"], "alloc")
+        self.assertGreaterEqual(int(response.headers["X-Profile-Bytes"]), 0)
+    
+    def test_rejects_bad_parameters_and_concurrent_profiles(self):
+        self.assertEqual(self.client.get("/admin/profile?mode=heap", headers=self.admin).status_code, 422)
+        self.assertEqual(self.client.get("/admin/profile?seconds=3600", headers=self.admin).status_code, 422)
+        with SamplingProfiler():
+            response = self.client.get("/admin/profile?seconds=0.1", headers=self.admin)
+        self.assertEqual(response.status_code, 409)
+
+
+class TestTracingMiddleware(unittest.TestCase):
+    """Test request spans end to end, with the real handlers over in-process providers"""
+    
+    def setUp(self):
+        from benchmarks.fakes import LocalPinecone, VectorStore
+        from benchmarks.micro.suites import CannedSession
+        from database.database import DBHandler
+        from database.interface import DatabaseService
+        from llm.interface import LLMService
+        from llm.llm import LLMHandler
+        
+        with patch.dict(API_RATE_LIMIT_CONFIG, {'enabled': False}):
+            self.client = TestClient(APIRoutes().get_app())
+        store = Mock()
+        
+        async def get_user(token):
+            return token
+        store.get_user = get_user
+        with patch.dict(os.environ, {'GROQ_API_KEY': 'test'}):
+            llm = LLMService()
+            llm.llm_handler = LLMHandler(session=CannedSession("You parked on level three."))
+        db = DatabaseService()
+        db.db_handler = DBHandler(client=LocalPinecone(VectorStore(dimension=64)))
+        db.add_memory('alice', "I parked on level three")
+        self.exporter = MemoryExporter()
+        self.patches = [
+            patch('api.routes.get_user_store', return_value=store),
+            patch('api.routes.get_llm_service', return_value=llm),
+            patch('api.routes.get_database_service', return_value=db),
+            patch.object(tracer, 'enabled', True),
+            patch.object(tracer, 'exporter', self.exporter),
+        ]
+        for p in self.patches:
+            p.start()
+    
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+    
+    def test_query_spans(self):
+        response = self.client.get("/query?q=where%20did%20I%20park", headers={"Authorization": "Bearer alice"})
+        self.assertEqual(response.status_code, 200)
+        tracer.flush()
+        spans = {span['name']: span for span in self.exporter.spans}
+        self.assertEqual(set(spans), {'GET /query', 'auth', 'llm_query', 'embed', 'vector_query', 'llm_answer'})
+        root = spans['GET /query']
+        self.assertEqual(root['parent_id'], None)
+        self.assertEqual(root['attributes']['http.status_code'], 200)
+        self.assertEqual(root['attributes']['request_id'], response.headers['X-Request-ID'])
+        self.assertEqual(response.headers['traceparent'], f"00-{root['trace_id']}-{root['span_id']}-01")
+        for name in ('auth', 'llm_query', 'embed', 'vector_query', 'llm_answer'):
+            self.assertEqual(spans[name]['parent_id'], root['span_id'])
+        self.assertTrue(spans['auth']['attributes']['authenticated'])
+        self.assertIn('model', spans['llm_answer']['attributes'])
+        self.assertGreaterEqual(spans['vector_query']['attributes']['matches'], 1)
+    
+    def test_continues_incoming_trace_and_skips_probes(self):
+        traceparent = '00-' + 'c' * 32 + '-' + 'd' * 16 + '-01'
+        self.client.get("/health")
+        self.client.get("/query?q=x", headers={"Authorization": "Bearer alice", "traceparent": traceparent})
+        tracer.flush()
+        roots = [span for span in self.exporter.spans if span['kind'] == 'server']
+        self.assertEqual([span['name'] for span in roots], ['GET /query'])
+        self.assertEqual(roots[0]['trace_id'], 'c' * 32)
+        self.assertEqual(roots[0]['parent_id'], 'd' * 16)
+
+
 def run_all_tests():
     """Run all API module tests"""
     print("=" * 60)
@@ -182,6 +942,18 @@ def run_all_tests():
     # Add all test classes
     suite.addTests(loader.loadTestsFromTestCase(TestAPIModule))
     suite.addTests(loader.loadTestsFromTestCase(TestAPIConfiguration))
+    suite.addTests(loader.loadTestsFromTestCase(TestPageCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestCompressionMiddleware))
+    suite.addTests(loader.loadTestsFromTestCase(TestServerTiming))
+    suite.addTests(loader.loadTestsFromTestCase(TestRateLimit))
+    suite.addTests(loader.loadTestsFromTestCase(TestAdmission))
+    suite.addTests(loader.loadTestsFromTestCase(TestIdempotency))
+    suite.addTests(loader.loadTestsFromTestCase(TestColdStart))
+    suite.addTests(loader.loadTestsFromTestCase(TestWarmUp))
+    suite.addTests(loader.loadTestsFromTestCase(TestPrefork))
+    suite.addTests(loader.loadTestsFromTestCase(TestMultiWorker))
+    suite.addTests(loader.loadTestsFromTestCase(TestProfileEndpoint))
+    suite.addTests(loader.loadTestsFromTestCase(TestTracingMiddleware))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
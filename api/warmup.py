@@ -0,0 +1,67 @@
+"""
+API Warm-Up
+
+Work the first requests after a deploy would otherwise pay for: resolving the
+vector index (a `list_indexes()` round trip), opening its connection, loading
+and exercising the local embedding model, and the TLS handshake with the LLM
+provider. The lifespan runs the steps concurrently, in threads, after the
+services are built and the user store pool is open.
+
+`readiness` records what each step cost. It is marked ready only when every
+step has finished (a failed step is recorded, not fatal: the request that
+needs it will retry), and GET /ready reports it for the platform health check.
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+from monitoring.logs import get_logger
+from .dependencies import get_database_service, get_llm_service
+
+logger = get_logger('api.warmup')
+
+
+class Readiness:
+    """Warm-up progress: per-step duration or error, and whether it has finished"""
+
+    def __init__(self):
+        self.ready = False
+        self.steps: Dict[str, dict] = {}
+        self.started: Optional[float] = None
+        self.seconds: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        return {'ready': self.ready, 'seconds': self.seconds, 'steps': dict(self.steps)}
+
+
+def default_steps() -> Dict[str, Callable[[], None]]:
+    return {
+        'vector_index': get_database_service().warm_up,
+        'llm_connection': get_llm_service().warm_up,
+    }
+
+
+async def _run_step(readiness: Readiness, name: str, step: Callable[[], None]):
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(step)
+        readiness.steps[name] = {'ms': round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        readiness.steps[name] = {'ms': round((time.perf_counter() - start) * 1000, 1), 'error': str(e)}
+        logger.warning("warm-up step failed", extra={"step": name, "error": str(e)})
+
+
+async def warm_up(readiness: Readiness, steps: Dict[str, Callable[[], None]] = None) -> Readiness:
+    """Run every step concurrently, then mark `readiness` ready"""
+    steps = default_steps() if steps is None else steps
+    readiness.started = time.perf_counter()
+    await asyncio.gather(*(_run_step(readiness, name, step) for name, step in steps.items()))
+    readiness.seconds = round(time.perf_counter() - readiness.started, 3)
+    readiness.ready = True
+    logger.info("warm-up finished", extra=readiness.snapshot())
+    return readiness
+
+
+# One per process, read by GET /ready
+readiness = Readiness()
@@ -1,79 +1,69 @@
 import sqlite3
 import os
-from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from config.settings import SECURITY_CONFIG, DATABASE_CONFIG
+from monitoring.logs import get_logger
+from .store import SQLiteUserStore, pwd_context, hash_password, verify_password, users_page_query
+
+# Stateless, so routes can declare the dependency before any handler exists
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+logger = get_logger('authentication')
 
 class AuthHandler:
     def __init__(self):
-        self.pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-        self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+        self.pwd_context = pwd_context
+        self.oauth2_scheme = oauth2_scheme
         self.db_path = DATABASE_CONFIG['users_db_path']
+        self.store = SQLiteUserStore(self.db_path)
         self._init_database()
     
     def _init_database(self):
         """Initialize the SQLite database for users"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, hashed_password TEXT)")
-        conn.commit()
-        conn.close()
-        print("✅ Authentication database initialized")
+        with self.store.connection() as conn:
+            self.store.create_schema(conn)
+        logger.info("Authentication database initialized")
     
     def hash_password(self, password: str) -> str:
         """Hash a password"""
-        # Truncate password to 72 bytes for argon2 compatibility
-        truncated_password = password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
-        return self.pwd_context.hash(truncated_password)
+        return hash_password(password)
     
     def verify_password(self, password: str, hashed_password: str) -> bool:
         """Verify a password against its hash"""
-        truncated_password = password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
-        return self.pwd_context.verify(truncated_password, hashed_password)
+        return verify_password(password, hashed_password)
     
     def register_user(self, user_id: str, password: str) -> bool:
         """Register a new user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Check if user already exists
-            cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
-            if cursor.fetchone():
-                conn.close()
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID exists")
-            
-            # Hash password and insert user
-            hashed_password = self.hash_password(password)
-            cursor.execute("INSERT INTO users (user_id, hashed_password) VALUES (?, ?)", (user_id, hashed_password))
-            conn.commit()
-            conn.close()
+            with self.store.connection() as conn:
+                # Check if user already exists
+                if conn.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,)).fetchone():
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID exists")
+                
+                # Hash password and insert user
+                hashed_password = self.hash_password(password)
+                conn.execute("INSERT INTO users (user_id, hashed_password, created_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                             (user_id, hashed_password))
+                conn.commit()
             return True
             
         except HTTPException:
-            conn.close()
             raise
         except Exception as e:
-            conn.close()
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Registration failed: {str(e)}")
     
     def authenticate_user(self, user_id: str, password: str) -> bool:
         """Authenticate a user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute("SELECT hashed_password FROM users WHERE user_id = ?", (user_id,))
-            user = cursor.fetchone()
-            conn.close()
+            with self.store.connection() as conn:
+                user = conn.execute("SELECT hashed_password FROM users WHERE user_id = ?", (user_id,)).fetchone()
             
             if not user or not self.verify_password(password, user[0]):
                 return False
             return True
             
         except Exception:
-            conn.close()
             return False
     
     def login_user(self, form_data: OAuth2PasswordRequestForm) -> dict:
@@ -93,13 +83,9 @@ class AuthHandler:
     
     def get_current_user(self, token: str) -> dict:
         """Get current user from token"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (token,))
-            user = cursor.fetchone()
-            conn.close()
+            with self.store.connection() as conn:
+                user = conn.execute("SELECT user_id FROM users WHERE user_id = ?", (token,)).fetchone()
             
             if not user:
                 raise HTTPException(
@@ -112,7 +98,6 @@ class AuthHandler:
         except HTTPException:
             raise
         except Exception:
-            conn.close()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, 
                 detail="Invalid credentials"
@@ -120,43 +105,37 @@ class AuthHandler:
     
     def delete_user(self, user_id: str) -> bool:
         """Delete a user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-            deleted = cursor.rowcount > 0
-            conn.commit()
-            conn.close()
+            with self.store.connection() as conn:
+                deleted = conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,)).rowcount > 0
+                conn.commit()
             return deleted
             
         except Exception:
-            conn.close()
             return False
     
-    def list_users(self) -> list:
-        """List all users (for admin purposes)"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def list_users(self, after: str = None, limit: int = None) -> list:
+        """List users in user_id order, optionally one keyset page at a time (for admin purposes)"""
         try:
-            cursor.execute("SELECT user_id FROM users")
-            users = [row[0] for row in cursor.fetchall()]
-            conn.close()
-            return users
+            with self.store.connection() as conn:
+                return [row[0] for row in conn.execute(*users_page_query(after, limit)).fetchall()]
             
         except Exception:
-            conn.close()
             return []
     
+    def count_users(self) -> int:
+        """Count users without fetching them"""
+        try:
+            with self.store.connection() as conn:
+                return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        except Exception:
+            return 0
+    
     def health_check(self) -> bool:
         """Check if authentication system is healthy"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM users")
-            cursor.fetchone()
-            conn.close()
+            with self.store.connection() as conn:
+                conn.execute("SELECT COUNT(*) FROM users").fetchone()
             return True
         except Exception:
             return False
@@ -4,14 +4,39 @@ Authentication Module Interface - Clean abstraction layer for other modules
 This is what other modules import to interact with authentication functionality.
 """
 
-from .auth import AuthHandler
+import threading
+
+from .auth import AuthHandler, oauth2_scheme
+from .store import create_user_store
 
 class AuthService:
     """
     Authentication service that provides a clean interface to other modules
     """
     def __init__(self):
-        self.auth_handler = AuthHandler()
+        # Built on first use (or by initialize() at startup), so importing the module stays cheap
+        self._auth_handler = None
+        self._user_store = None
+        self._lock = threading.Lock()
+    
+    @property
+    def auth_handler(self) -> AuthHandler:
+        if self._auth_handler is None:
+            self.initialize()
+        return self._auth_handler
+    
+    @property
+    def user_store(self):
+        if self._user_store is None:
+            self.initialize()
+        return self._user_store
+    
+    def initialize(self) -> None:
+        """Open the users database and pick the async store now rather than on the first request"""
+        with self._lock:
+            if self._auth_handler is None:
+                self._auth_handler = AuthHandler()
+                self._user_store = create_user_store(sqlite_store=self._auth_handler.store)
     
     def register(self, user_id: str, password: str) -> bool:
         """Register a new user"""
@@ -42,17 +67,25 @@ class AuthService:
         """Delete a user"""
         return self.auth_handler.delete_user(user_id)
     
-    def list_users(self) -> list:
-        """List all users"""
-        return self.auth_handler.list_users()
+    def list_users(self, after: str = None, limit: int = None) -> list:
+        """List users, optionally one keyset page at a time"""
+        return self.auth_handler.list_users(after, limit)
+    
+    def count_users(self) -> int:
+        """Count users without fetching them"""
+        return self.auth_handler.count_users()
     
     def health_check(self) -> bool:
         """Check if authentication service is healthy"""
         return self.auth_handler.health_check()
     
+    def get_user_store(self):
+        """Get the async user store (PostgreSQL if DATABASE_URL is set, else SQLite)"""
+        return self.user_store
+    
     def get_oauth2_scheme(self):
         """Get OAuth2 scheme for FastAPI dependency injection"""
-        return self.auth_handler.oauth2_scheme
+        return oauth2_scheme
     
     def get_current_user_dependency(self):
         """Get the current user dependency function for FastAPI"""
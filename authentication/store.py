@@ -0,0 +1,472 @@
+"""
+User Store - Storage backends for user accounts
+
+Routes and the AuthHandler go through a UserStore instead of opening their own
+connections. Drivers are imported once, connections are reused and a single
+CryptContext is shared by the whole process.
+"""
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+
+from passlib.context import CryptContext
+from concurrency.process import reset_after_fork
+from config.settings import SECURITY_CONFIG, DATABASE_CONFIG
+from monitoring.metrics import AUTH_DB_SECONDS
+
+# Shared hashing context - building a CryptContext per request is expensive
+pwd_context = CryptContext(
+    schemes=SECURITY_CONFIG['password_schemes'],
+    deprecated=SECURITY_CONFIG['password_deprecated']
+)
+
+
+def _first_72_bytes(password: str) -> str:
+    """bcrypt only reads the first 72 bytes of a password"""
+    return password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the shared context"""
+    if pwd_context.default_scheme() == 'bcrypt':
+        password = _first_72_bytes(password)
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash with the shared context"""
+    if pwd_context.identify(hashed_password) == 'bcrypt':
+        return pwd_context.verify(_first_72_bytes(password), hashed_password)
+    if pwd_context.verify(password, hashed_password):
+        return True
+    # AuthHandler used to hash only the first 72 bytes, so accounts it registered still need that
+    legacy = _first_72_bytes(password)
+    return legacy != password and pwd_context.verify(legacy, hashed_password)
+
+
+def is_postgres_url(database_url: Optional[str]) -> bool:
+    """Check if a DATABASE_URL points at PostgreSQL"""
+    return bool(database_url) and database_url.startswith('postgresql')
+
+
+def users_page_query(after: str = None, limit: int = None, placeholder: str = '?'):
+    """Build a keyset-paginated user_id query (uses the primary key index, no OFFSET scans)"""
+    sql, params = "SELECT user_id FROM users", ()
+    if after is not None:
+        sql, params = f"{sql} WHERE user_id > {placeholder}", (after,)
+    sql += " ORDER BY user_id"
+    if limit is not None:
+        sql, params = f"{sql} LIMIT {placeholder}", params + (limit,)
+    return sql, params
+
+
+def users_newest_first_query(after: Tuple[str, str] = None, limit: int = None, placeholder: str = '?',
+                             created: str = 'created_at'):
+    """Build a keyset-paginated (created_at, user_id) query, newest first; `after` is the last row's pair"""
+    sql, params = "SELECT user_id, created_at FROM users", ()
+    if after is not None:
+        sql, params = f"{sql} WHERE ({created}, user_id) < ({placeholder}, {placeholder})", tuple(after)
+    sql += f" ORDER BY {created} DESC, user_id DESC"
+    if limit is not None:
+        sql, params = f"{sql} LIMIT {placeholder}", params + (limit,)
+    return sql, params
+
+
+class UserStore:
+    """
+    Base class for user storage backends.
+
+    All data methods are coroutines so PostgreSQL and SQLite backends can be
+    used interchangeably from async route handlers. Nothing here may block the
+    event loop: network I/O is awaited, and blocking work (password hashing,
+    SQLite writes that can wait on a lock) runs in a worker thread.
+    """
+
+    backend = 'base'
+
+    async def open(self) -> None:
+        """Open pooled connections ahead of the first request"""
+        return None
+
+    async def init_schema(self) -> None:
+        """Create the users table if it does not exist"""
+        raise NotImplementedError
+
+    async def get_user(self, user_id: str) -> Optional[str]:
+        """Return the user_id if the user exists, else None"""
+        raise NotImplementedError
+
+    async def get_password_hash(self, user_id: str) -> Optional[str]:
+        """Return the stored password hash for a user, else None"""
+        raise NotImplementedError
+
+    async def create_user(self, user_id: str, hashed_password: str) -> bool:
+        """Insert a user; returns False if the user already exists"""
+        raise NotImplementedError
+
+    async def delete_user(self, user_id: str) -> bool:
+        """Delete a user; returns False if the user did not exist"""
+        raise NotImplementedError
+
+    async def delete_all_users(self) -> int:
+        """Delete every user; returns how many were deleted"""
+        raise NotImplementedError
+
+    async def list_users(self, after: str = None, limit: int = None) -> List[str]:
+        """List user ids in user_id order, starting after a keyset cursor"""
+        raise NotImplementedError
+
+    async def list_users_newest_first(self, after: Tuple[str, str] = None, limit: int = None) -> List[Tuple[str, str]]:
+        """List (user_id, created_at) pairs, newest first, after a (created_at, user_id) keyset cursor.
+        created_at is '' for accounts created before it was recorded"""
+        raise NotImplementedError
+
+    async def count_users(self) -> int:
+        """Count users without fetching them"""
+        raise NotImplementedError
+
+    async def iter_users(self, after: str = None, batch_size: int = 1000) -> AsyncIterator[str]:
+        """Yield all user ids in keyset-paginated batches"""
+        while True:
+            batch = await self.list_users(after=after, limit=batch_size)
+            for user_id in batch:
+                yield user_id
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]
+
+    async def health_check(self) -> bool:
+        """Check if the backend is reachable"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release pooled connections"""
+        return None
+
+    async def register(self, user_id: str, password: str) -> bool:
+        """Hash the password and create the user"""
+        # Argon2 is deliberately slow - keep it off the event loop
+        hashed_password = await asyncio.to_thread(hash_password, password)
+        return await self.create_user(user_id, hashed_password)
+
+    async def authenticate(self, user_id: str, password: str) -> bool:
+        """Check a user's password"""
+        hashed_password = await self.get_password_hash(user_id)
+        if not hashed_password:
+            return False
+        return await asyncio.to_thread(verify_password, password, hashed_password)
+
+
+class SQLiteUserStore(UserStore):
+    """
+    SQLite backend.
+
+    The 'tuned' profile keeps one long-lived connection per thread in WAL mode
+    (readers never block the writer, synchronous=NORMAL, memory-mapped reads,
+    busy timeout instead of immediate "database is locked"). The 'default'
+    profile keeps stock SQLite settings and a small shared connection pool.
+
+    Several worker processes can share one file: SQLite locks it between
+    processes, and a forked worker opens its own connections.
+    """
+
+    backend = 'sqlite'
+    PROFILES = ('tuned', 'default')
+
+    def __init__(self, db_path: str = None, pool_size: int = None, profile: str = None):
+        self.db_path = db_path or DATABASE_CONFIG['users_db_path']
+        self.pool_size = pool_size or DATABASE_CONFIG['max_connections']
+        self.profile = profile or DATABASE_CONFIG['sqlite_profile']
+        if self.profile not in self.PROFILES:
+            raise ValueError(f"Unknown SQLite profile '{self.profile}': Must be in {list(self.PROFILES)}")
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._local = threading.local()
+        self._connections = []
+        self._created = 0
+        self._lock = threading.Lock()
+        reset_after_fork(self)
+
+    def _after_fork(self):
+        # Keep the parent's connections referenced but never use or close them here:
+        # SQLite connections must not be touched across a fork
+        self._inherited = self._connections
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._local = threading.local()
+        self._connections = []
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.profile != 'tuned':
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        else:
+            busy_timeout_ms = DATABASE_CONFIG['sqlite_busy_timeout_ms']
+            conn = sqlite3.connect(self.db_path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(DATABASE_CONFIG['sqlite_mmap_size'])}")
+            conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; rolls back uncommitted work on error"""
+        with AUTH_DB_SECONDS.time(backend='sqlite'):
+            with self._borrow() as conn:
+                yield conn
+
+    @contextmanager
+    def _borrow(self):
+        if self.profile == 'tuned':
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+                with self._lock:
+                    self._created += 1
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            return
+
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._pool.get()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def _fetchone(self, sql: str, params: tuple = ()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> list:
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self.connection() as conn:
+            rowcount = conn.execute(sql, params).rowcount
+            conn.commit()
+            return rowcount
+
+    async def _read(self, fetch, sql: str, params: tuple = ()):
+        # Even WAL readers can wait out busy_timeout (recovery, checkpoints, first connect),
+        # so reads stay off the event loop like writes
+        return await asyncio.to_thread(fetch, sql, params)
+
+    @staticmethod
+    def create_schema(conn: sqlite3.Connection) -> None:
+        """Create the users table, adding created_at to tables that predate it (NULL for those rows)"""
+        conn.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, hashed_password TEXT, created_at TIMESTAMP)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if 'created_at' not in columns:
+            conn.execute("ALTER TABLE users ADD COLUMN created_at TIMESTAMP")
+        conn.commit()
+
+    def _create_schema(self) -> None:
+        with self.connection() as conn:
+            self.create_schema(conn)
+
+    async def init_schema(self) -> None:
+        await asyncio.to_thread(self._create_schema)
+
+    async def get_user(self, user_id: str) -> Optional[str]:
+        row = await self._read(self._fetchone, "SELECT user_id FROM users WHERE user_id = ?", (user_id,))
+        return row[0] if row else None
+
+    async def get_password_hash(self, user_id: str) -> Optional[str]:
+        row = await self._read(self._fetchone, "SELECT hashed_password FROM users WHERE user_id = ?", (user_id,))
+        return row[0] if row else None
+
+    async def create_user(self, user_id: str, hashed_password: str) -> bool:
+        inserted = await asyncio.to_thread(
+            self._write,
+            "INSERT OR IGNORE INTO users (user_id, hashed_password, created_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (user_id, hashed_password)
+        )
+        return inserted > 0
+
+    async def delete_user(self, user_id: str) -> bool:
+        return await asyncio.to_thread(self._write, "DELETE FROM users WHERE user_id = ?", (user_id,)) > 0
+
+    async def delete_all_users(self) -> int:
+        return await asyncio.to_thread(self._write, "DELETE FROM users")
+
+    async def list_users(self, after: str = None, limit: int = None) -> List[str]:
+        rows = await self._read(self._fetchall, *users_page_query(after, limit))
+        return [row[0] for row in rows]
+
+    async def list_users_newest_first(self, after: Tuple[str, str] = None, limit: int = None) -> List[Tuple[str, str]]:
+        # Rows from before created_at was recorded sort last, as ''
+        sql, params = users_newest_first_query(after, limit, created="COALESCE(created_at, '')")
+        rows = await self._read(self._fetchall, sql, params)
+        return [(user_id, created_at or '') for user_id, created_at in rows]
+
+    async def count_users(self) -> int:
+        row = await self._read(self._fetchone, "SELECT COUNT(*) FROM users")
+        return row[0]
+
+    async def health_check(self) -> bool:
+        try:
+            await self._read(self._fetchone, "SELECT COUNT(*) FROM users")
+            return True
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._created = 0
+        for conn in connections:
+            conn.close()
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._local = threading.local()
+
+
+class PostgresUserStore(UserStore):
+    """
+    PostgreSQL backend on psycopg 3 with an async connection pool.
+
+    The pool is opened by the app lifespan (or on first use). Every query is
+    awaited on the event loop, so a slow database only delays the request
+    waiting on it. Statements are executed with prepare=True so the server
+    plans each query once per connection.
+    """
+
+    backend = 'postgresql'
+
+    def __init__(self, database_url: str, min_size: int = None, max_size: int = None):
+        self.database_url = database_url
+        self.min_size = min_size or DATABASE_CONFIG['min_connections']
+        self.max_size = max(max_size or DATABASE_CONFIG['max_connections'], self.min_size)
+        self._pool = None
+        self._pool_lock = None
+        reset_after_fork(self)
+
+    def _after_fork(self):
+        # The pool's connections and event loop belong to the parent
+        self._pool = None
+        self._pool_lock = None
+
+    async def open(self) -> None:
+        await self._get_pool()
+
+    async def _get_pool(self):
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    from psycopg_pool import AsyncConnectionPool
+                    pool = AsyncConnectionPool(
+                        self.database_url,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        timeout=DATABASE_CONFIG['pool_timeout'],
+                        open=False
+                    )
+                    await pool.open()
+                    self._pool = pool
+        return self._pool
+
+    async def _fetchone(self, sql: str, params: tuple = ()):
+        pool = await self._get_pool()
+        with AUTH_DB_SECONDS.time(backend='postgres'):
+            async with pool.connection() as conn:
+                cursor = await conn.execute(sql, params, prepare=True)
+                return await cursor.fetchone()
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> list:
+        pool = await self._get_pool()
+        with AUTH_DB_SECONDS.time(backend='postgres'):
+            async with pool.connection() as conn:
+                cursor = await conn.execute(sql, params, prepare=True)
+                return await cursor.fetchall()
+
+    async def _execute(self, sql: str, params: tuple = ()) -> int:
+        pool = await self._get_pool()
+        with AUTH_DB_SECONDS.time(backend='postgres'):
+            async with pool.connection() as conn:
+                cursor = await conn.execute(sql, params, prepare=True)
+                return cursor.rowcount
+
+    async def init_schema(self) -> None:
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                hashed_password TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    async def get_user(self, user_id: str) -> Optional[str]:
+        row = await self._fetchone("SELECT user_id FROM users WHERE user_id = %s", (user_id,))
+        return row[0] if row else None
+
+    async def get_password_hash(self, user_id: str) -> Optional[str]:
+        row = await self._fetchone("SELECT hashed_password FROM users WHERE user_id = %s", (user_id,))
+        return row[0] if row else None
+
+    async def create_user(self, user_id: str, hashed_password: str) -> bool:
+        inserted = await self._execute(
+            "INSERT INTO users (user_id, hashed_password) VALUES (%s, %s) ON CONFLICT (user_id) DO NOTHING",
+            (user_id, hashed_password)
+        )
+        return inserted > 0
+
+    async def delete_user(self, user_id: str) -> bool:
+        return await self._execute("DELETE FROM users WHERE user_id = %s", (user_id,)) > 0
+
+    async def delete_all_users(self) -> int:
+        return await self._execute("DELETE FROM users")
+
+    async def list_users(self, after: str = None, limit: int = None) -> List[str]:
+        rows = await self._fetchall(*users_page_query(after, limit, placeholder='%s'))
+        return [row[0] for row in rows]
+
+    async def list_users_newest_first(self, after: Tuple[str, str] = None, limit: int = None) -> List[Tuple[str, str]]:
+        rows = await self._fetchall(*users_newest_first_query(after, limit, placeholder='%s'))
+        return [(user_id, str(created_at) if created_at else '') for user_id, created_at in rows]
+
+    async def count_users(self) -> int:
+        row = await self._fetchone("SELECT COUNT(*) FROM users")
+        return row[0]
+
+    async def health_check(self) -> bool:
+        try:
+            await self._fetchone("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def create_user_store(database_url: str = None, sqlite_store: SQLiteUserStore = None) -> UserStore:
+    """Pick the user store for DATABASE_URL (PostgreSQL if set, otherwise SQLite)"""
+    if database_url is None:
+        database_url = os.getenv('DATABASE_URL')
+    if is_postgres_url(database_url):
+        return PostgresUserStore(database_url)
+    return sqlite_store or SQLiteUserStore()
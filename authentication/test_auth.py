@@ -6,6 +6,7 @@ Run this to test all authentication functionality before merging to develop.
 
 import os
 import sys
+import asyncio
 import unittest
 import tempfile
 from unittest.mock import Mock, patch
@@ -13,9 +14,10 @@ from unittest.mock import Mock, patch
 # Add current directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from auth import AuthHandler
-from interface import auth_service
-from config import AUTH_CONFIG, SECURITY_CONFIG
+from authentication.auth import AuthHandler
+from authentication.interface import auth_service
+from authentication.config import AUTH_CONFIG, SECURITY_CONFIG
+from authentication.store import SQLiteUserStore, PostgresUserStore, create_user_store
 
 
 class TestAuthModule(unittest.TestCase):
@@ -212,6 +214,153 @@ class TestAuthServiceInterface(unittest.TestCase):
         self.assertTrue(health)
 
 
+class TestUserStore(unittest.TestCase):
+    """Test the async user store backends"""
+    
+    def setUp(self):
+        """Set up a store on a temporary database"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.store = SQLiteUserStore(self.temp_db.name, pool_size=2)
+        asyncio.run(self.store.init_schema())
+    
+    def tearDown(self):
+        """Close pooled connections and remove the database"""
+        asyncio.run(self.store.close())
+        if os.path.exists(self.temp_db.name):
+            os.unlink(self.temp_db.name)
+    
+    def test_register_and_authenticate(self):
+        """Test registration, duplicate rejection and password checks"""
+        self.assertTrue(asyncio.run(self.store.register("store_user", "secret")))
+        self.assertFalse(asyncio.run(self.store.register("store_user", "other")))
+        self.assertTrue(asyncio.run(self.store.authenticate("store_user", "secret")))
+        self.assertFalse(asyncio.run(self.store.authenticate("store_user", "wrong")))
+        self.assertFalse(asyncio.run(self.store.authenticate("missing", "secret")))
+    
+    def test_get_list_and_delete(self):
+        """Test lookups, listing and deletion"""
+        asyncio.run(self.store.register("user1", "password1"))
+        asyncio.run(self.store.register("user2", "password2"))
+        
+        self.assertEqual(asyncio.run(self.store.get_user("user1")), "user1")
+        self.assertIsNone(asyncio.run(self.store.get_user("missing")))
+        self.assertEqual(sorted(asyncio.run(self.store.list_users())), ["user1", "user2"])
+        
+        self.assertTrue(asyncio.run(self.store.delete_user("user1")))
+        self.assertFalse(asyncio.run(self.store.delete_user("user1")))
+        self.assertEqual(asyncio.run(self.store.list_users()), ["user2"])
+    
+    def test_keyset_pagination_and_count(self):
+        """Test paging through users with an after cursor"""
+        for i in range(7):
+            asyncio.run(self.store.create_user(f"user{i}", "hash"))
+        
+        first = asyncio.run(self.store.list_users(limit=3))
+        second = asyncio.run(self.store.list_users(after=first[-1], limit=3))
+        self.assertEqual(first, ["user0", "user1", "user2"])
+        self.assertEqual(second, ["user3", "user4", "user5"])
+        self.assertEqual(asyncio.run(self.store.count_users()), 7)
+        
+        async def collect():
+            return [user_id async for user_id in self.store.iter_users(batch_size=2)]
+        self.assertEqual(asyncio.run(collect()), [f"user{i}" for i in range(7)])
+    
+    def test_newest_first_pagination(self):
+        """Test paging by (created_at, user_id), newest first, on a table that predates created_at"""
+        import sqlite3
+        legacy = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        legacy.close()
+        conn = sqlite3.connect(legacy.name)
+        conn.execute("CREATE TABLE users (user_id TEXT PRIMARY KEY, hashed_password TEXT)")
+        conn.execute("INSERT INTO users VALUES ('old', 'hash')")
+        conn.commit()
+        conn.close()
+        store = SQLiteUserStore(legacy.name)
+        try:
+            asyncio.run(store.init_schema())
+            for user_id, created_at in (("a", "2024-01-01 00:00:00"), ("b", "2024-01-02 00:00:00"),
+                                        ("c", "2024-01-02 00:00:00")):
+                store._write("INSERT INTO users VALUES (?, 'hash', ?)", (user_id, created_at))
+            asyncio.run(store.create_user("new", "hash"))  # Recorded now
+            
+            first = asyncio.run(store.list_users_newest_first(limit=3))
+            self.assertEqual([user_id for user_id, _ in first], ["new", "c", "b"])
+            cursor = (first[-1][1], first[-1][0])
+            second = asyncio.run(store.list_users_newest_first(after=cursor, limit=3))
+            self.assertEqual(second, [("a", "2024-01-01 00:00:00"), ("old", "")])
+        finally:
+            asyncio.run(store.close())
+            os.unlink(legacy.name)
+    
+    def test_delete_all_users(self):
+        """Test bulk deletion reports the number of removed users"""
+        asyncio.run(self.store.register("user1", "password1"))
+        asyncio.run(self.store.register("user2", "password2"))
+        self.assertEqual(asyncio.run(self.store.delete_all_users()), 2)
+        self.assertEqual(asyncio.run(self.store.count_users()), 0)
+    
+    def test_pool_reuses_connections(self):
+        """Test that connections are returned to the pool instead of reopened"""
+        store = SQLiteUserStore(self.temp_db.name, pool_size=2, profile='default')
+        for _ in range(10):
+            with store.connection() as conn:
+                conn.execute("SELECT 1")
+        self.assertEqual(store._created, 1)
+        self.assertTrue(asyncio.run(self.store.health_check()))
+    
+    def test_tuned_profile(self):
+        """Test that the tuned profile enables WAL and keeps one connection per thread"""
+        store = SQLiteUserStore(self.temp_db.name, profile='tuned')
+        with store.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        with store.connection() as again:
+            self.assertIs(conn, again)
+        asyncio.run(store.close())
+    
+    def test_reads_run_off_the_event_loop(self):
+        """Test that lookups never hold the event loop thread, WAL or not"""
+        import threading
+        store = SQLiteUserStore(self.temp_db.name, profile='tuned')
+        threads = []
+        fetchone = store._fetchone
+        
+        def record(sql, params=()):
+            threads.append(threading.get_ident())
+            return fetchone(sql, params)
+        store._fetchone = record
+        
+        async def lookup():
+            await store.get_user("anyone")
+            return threading.get_ident()
+        loop_thread = asyncio.run(lookup())
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+        asyncio.run(store.close())
+    
+    def test_unknown_profile(self):
+        """Test that unknown profiles are rejected"""
+        with self.assertRaises(ValueError):
+            SQLiteUserStore(self.temp_db.name, profile='turbo')
+    
+    def test_long_passwords(self):
+        """Passwords are hashed in full; hashes of the first 72 bytes still verify"""
+        from authentication.store import hash_password, pwd_context, verify_password
+        password = "correct horse battery staple " * 4
+        hashed = hash_password(password)
+        self.assertTrue(verify_password(password, hashed))
+        self.assertFalse(verify_password(password[:-1] + "!", hashed))
+        legacy = pwd_context.hash(password.encode('utf-8')[:72].decode('utf-8'))
+        self.assertTrue(verify_password(password, legacy))
+        self.assertFalse(verify_password("x" + password, legacy))
+    
+    def test_store_selection(self):
+        """Test that DATABASE_URL picks the backend"""
+        self.assertIsInstance(create_user_store("postgresql://localhost/capsule"), PostgresUserStore)
+        self.assertIs(create_user_store("", sqlite_store=self.store), self.store)
+
+
 def run_all_tests():
     """Run all authentication module tests"""
     print("=" * 60)
@@ -225,6 +374,7 @@ def run_all_tests():
     # Add all test classes
     suite.addTests(loader.loadTestsFromTestCase(TestAuthModule))
     suite.addTests(loader.loadTestsFromTestCase(TestAuthServiceInterface))
+    suite.addTests(loader.loadTestsFromTestCase(TestUserStore))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,7 @@
+"""
+Benchmarks - Performance measurements for Capsule
+
+Each benchmark is a runnable module:
+    python -m benchmarks.sqlite_users
+    python -m benchmarks.micro run
+"""
@@ -0,0 +1,280 @@
+"""
+Stand-In Providers
+
+Local replacements for the LLM and vector providers, so the whole API can be
+load tested offline:
+
+- FakeChatServer:   OpenAI-compatible `POST /v1/chat/completions` (the Groq API
+                    shape) that answers after `latency_ms` plus the time to
+                    "generate" `completion_tokens` at `tokens_per_sec`.
+- VectorStore:      an in-memory vector index with deterministic hashed
+                    bag-of-words embeddings and brute-force cosine search.
+- FakeVectorServer: a VectorStore over HTTP.
+- FakePinecone:     the client the API workers use in place of `Pinecone`,
+                    talking to a FakeVectorServer (pass it as `DBHandler(client=...)`).
+- LocalPinecone:    the same client calling a VectorStore in-process, for
+                    micro-benchmarks that shouldn't measure HTTP.
+
+Both servers run on threads of the process that starts them. API workers in
+other processes reach them over HTTP, so every worker sees the same vectors.
+"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+import requests
+
+from concurrency.process import ProcessLocal
+
+WORDS = re.compile(r"[a-z0-9]+")
+
+
+def hash_word(word: str, dimension: int) -> Tuple[int, float]:
+    """Bucket and sign of one word in a hashed embedding"""
+    digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+    return int.from_bytes(digest[:4], 'little') % dimension, 1.0 if digest[4] & 1 else -1.0
+
+
+def hash_embedding(text: str, dimension: int) -> List[float]:
+    """Unit-length hashed bag-of-words vector: texts sharing words end up close"""
+    vector = [0.0] * dimension
+    for word in WORDS.findall(text.lower()):
+        bucket, sign = hash_word(word, dimension)
+        vector[bucket] += sign
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class _JSONServer:
+    """A threaded HTTP server dispatching JSON requests to `handle(method, path, body)`"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real providers
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, payload = owner.handle(method, self.path, body)
+                data = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if method != 'HEAD':
+                    self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_HEAD(self):
+                self._respond('HEAD')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.requests = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._count_lock:
+            self.requests += 1
+
+    def handle(self, method: str, path: str, body):
+        raise NotImplementedError
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeChatServer(_JSONServer):
+    """OpenAI-compatible chat completions with a configurable time to first byte and token rate"""
+
+    path = '/v1/chat/completions'
+
+    def __init__(self, latency_ms: float = 300, tokens_per_sec: float = 200, completion_tokens: int = 40, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+
+    @property
+    def completions_url(self) -> str:
+        return self.url + self.path
+
+    def _reply(self, prompt: str) -> str:
+        words = WORDS.findall(prompt.lower())[-12:] or ['memory']
+        filler = (words * (self.completion_tokens // len(words) + 1))[:self.completion_tokens]
+        text = ' '.join(filler)
+        if 'answer this question:' in prompt.lower():
+            return f"You mentioned {text}."  # Plain text, like the real answer step
+        # Refine and query steps return structured data
+        return json.dumps({'content': text, 'summary': ' '.join(words), 'tags': words[:3]})
+
+    def handle(self, method, path, body):
+        if method == 'HEAD' or method == 'GET':
+            return 200, None  # Connection warm-up
+        if path != self.path:
+            return 404, {'error': {'message': f'unknown path {path}'}}
+        self.count()
+        prompt = (body.get('messages') or [{}])[-1].get('content', '')
+        generation = self.completion_tokens / self.tokens_per_sec if self.tokens_per_sec else 0
+        time.sleep(self.latency + generation)
+        return 200, {
+            'id': 'fake-completion',
+            'object': 'chat.completion',
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': self._reply(prompt)}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': self.completion_tokens},
+        }
+
+
+class VectorStore:
+    """In-memory namespaced vector index with hashed embeddings and exact cosine search"""
+
+    def __init__(self, dimension: int = 1024):
+        self.dimension = dimension
+        self._namespaces: Dict[str, Dict[str, tuple]] = {}  # namespace -> id -> (vector, metadata)
+        self._lock = threading.Lock()
+
+    def call(self, path: str, body: dict) -> dict:
+        """Handle one API call (the same paths FakeVectorServer serves); KeyError if unknown"""
+        if path == '/embed':
+            return {'data': [{'values': hash_embedding(text, self.dimension)} for text in body['inputs']]}
+        if path == '/upsert':
+            with self._lock:
+                namespace = self._namespaces.setdefault(body['namespace'], {})
+                for vector_id, values, *metadata in body['vectors']:  # Metadata is optional, as in Pinecone
+                    namespace[vector_id] = (values, metadata[0] if metadata else {})
+            return {'upserted_count': len(body['vectors'])}
+        if path == '/query':
+            with self._lock:
+                candidates = list(self._namespaces.get(body['namespace'], {}).items())
+            query = body['vector']
+            scored = sorted(
+                ((sum(a * b for a, b in zip(query, values)), vector_id, metadata) for vector_id, (values, metadata) in candidates),
+                reverse=True, key=lambda match: match[0]
+            )[:body['top_k']]
+            return {'matches': [{'id': vector_id, 'score': score, 'metadata': metadata} for score, vector_id, metadata in scored]}
+        if path == '/delete':
+            with self._lock:
+                self._namespaces.pop(body['namespace'], None)
+            return {}
+        if path == '/stats':
+            with self._lock:
+                counts = {name: len(vectors) for name, vectors in self._namespaces.items()}
+            return {'namespaces': counts, 'dimension': self.dimension}
+        raise KeyError(path)
+
+
+class FakeVectorServer(_JSONServer):
+    """A VectorStore served over HTTP, with a fixed latency per call"""
+
+    def __init__(self, latency_ms: float = 20, dimension: int = 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency_ms / 1000
+        self.store = VectorStore(dimension)
+
+    def handle(self, method, path, body):
+        if method != 'POST':
+            return 200, None
+        self.count()
+        time.sleep(self.latency)
+        try:
+            return 200, self.store.call(path, body)
+        except KeyError:
+            return 404, {'error': f'unknown path {path}'}
+
+
+class FakeIndex:
+    """The subset of the Pinecone Index API that DBHandler uses"""
+
+    def __init__(self, client: 'FakePinecone'):
+        self._client = client
+
+    def upsert(self, vectors, namespace: str = ''):
+        return self._client._post('/upsert', {'vectors': [list(v) for v in vectors], 'namespace': namespace})
+
+    def query(self, vector, top_k: int = 5, include_metadata: bool = True, namespace: str = ''):
+        result = self._client._post('/query', {'vector': list(vector), 'top_k': top_k, 'namespace': namespace})
+        return SimpleNamespace(matches=[SimpleNamespace(**match) for match in result['matches']])
+
+    def delete(self, delete_all: bool = False, namespace: str = ''):
+        self._client._post('/delete', {'namespace': namespace})
+
+    def describe_index_stats(self):
+        stats = self._client._post('/stats', {})
+        return SimpleNamespace(
+            dimension=stats['dimension'],
+            namespaces={name: SimpleNamespace(vector_count=count) for name, count in stats['namespaces'].items()},
+        )
+
+
+class FakePinecone:
+    """Pinecone client stand-in backed by a FakeVectorServer"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self._session = ProcessLocal(requests.Session)
+        self._indexes = set()
+        self.inference = SimpleNamespace(embed=self._embed)
+
+    def _post(self, path: str, body: dict) -> dict:
+        response = self._session.get().post(self.url + path, json=body, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def _embed(self, model: str, inputs: List[str], parameters: dict = None):
+        return self._post('/embed', {'inputs': list(inputs)})['data']
+
+    def list_indexes(self):
+        return SimpleNamespace(names=lambda: list(self._indexes))
+
+    def create_index(self, name: str, **kwargs):
+        self._indexes.add(name)
+
+    def Index(self, name: str) -> FakeIndex:
+        return FakeIndex(self)
+
+
+class LocalPinecone(FakePinecone):
+    """FakePinecone calling a VectorStore directly, without HTTP"""
+
+    def __init__(self, store: VectorStore):
+        super().__init__('local')
+        self.store = store
+
+    def _post(self, path: str, body: dict) -> dict:
+        return self.store.call(path, body)
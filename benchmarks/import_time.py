@@ -0,0 +1,79 @@
+"""
+Import-Time Profile
+
+Cold start is mostly imports plus whatever runs at module level. This imports a
+module in a fresh interpreter under `python -X importtime` and reports the
+total time and the slowest imports, so a regression (a client built at import
+time, a heavy dependency pulled in eagerly) shows up as a number.
+
+Run:
+    python -m benchmarks.import_time develop.app --top 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+class ImportProfile(NamedTuple):
+    seconds: float  # Wall time of the import statement, module-level code included
+    records: List[ImportRecord]
+
+    @property
+    def modules(self) -> Dict[str, ImportRecord]:
+        return {record.module: record for record in self.records}
+
+    def slowest(self, count: int = 10) -> List[ImportRecord]:
+        return sorted(self.records, key=lambda r: r.cumulative_us, reverse=True)[:count]
+
+    def report(self, count: int = 10) -> str:
+        lines = [f"total {self.seconds * 1000:.0f} ms, {len(self.records)} modules",
+                 f"{'cumulative ms':>14} {'self ms':>8}  module"]
+        for record in self.slowest(count):
+            lines.append(f"{record.cumulative_us / 1000:14.1f} {record.self_us / 1000:8.1f}  {record.module}")
+        return "\n".join(lines)
+
+
+def profile_import(module: str, env: dict = None) -> ImportProfile:
+    """Import `module` in a new interpreter and parse its -X importtime output"""
+    code = f"import time; _start = time.perf_counter(); import {module}; print(time.perf_counter() - _start)"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, env={**os.environ, **(env or {})}, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us)))
+    # Modules print banners on import; the timing is the last line
+    seconds = float(result.stdout.strip().splitlines()[-1])
+    return ImportProfile(seconds, records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import (cold start) time of a module")
+    parser.add_argument('module', nargs='?', default='develop.app')
+    parser.add_argument('--top', type=int, default=20, help="slowest imports to list")
+    args = parser.parse_args()
+
+    print(f"Import-time profile: {args.module}")
+    print(profile_import(args.module).report(args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Offline Load Test
+
+Runs the real API (`APIRoutes`, its middleware and lifespan) under
+`api.prefork`, with Groq and Pinecone replaced by the stand-ins in
+benchmarks/fakes.py. Virtual users then drive a mixed register / login / add /
+query workload over HTTP at a fixed concurrency, and the run reports RPS and
+p50/p95/p99 latency per operation. Nothing leaves the machine, so runs are
+repeatable: compare a branch with the commit before it on the same laptop.
+
+Each virtual user registers and logs in once, then keeps picking operations by
+weight until the request budget is spent. Rate limiting is switched off; the
+users DB lives in a temporary directory.
+
+Run:
+    python -m benchmarks.load_test --users 32 --requests 2000 --mix register=1,login=1,add=3,query=5
+    python -m benchmarks.load_test --workers 4 --llm-latency-ms 500 --llm-tokens-per-sec 150
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from benchmarks.fakes import FakeChatServer, FakeVectorServer
+
+OPERATIONS = ('register', 'login', 'add', 'query')
+DEFAULT_MIX = 'register=1,login=1,add=3,query=5'
+
+MEMORIES = [
+    "my favorite food is pizza with olives",
+    "I parked the car on level three of the airport garage",
+    "my sister's birthday is on the ninth of March",
+    "the wifi password at the cabin is on the fridge",
+    "I started reading Dune by Frank Herbert",
+    "my dentist appointment is next Tuesday at ten",
+    "I keep the spare house key under the blue flower pot",
+    "my passport expires in June next year",
+]
+QUESTIONS = [
+    "what is my favorite food",
+    "where did I park the car",
+    "when is my sister's birthday",
+    "where is the wifi password",
+    "what book am I reading",
+    "when is my dentist appointment",
+    "where is the spare key",
+    "when does my passport expire",
+]
+
+
+def create_fake_app():
+    """App factory for the API workers: the real app, pointed at the stand-in providers"""
+    from api.routes import APIRoutes
+    from database.database import DBHandler
+    from database.interface import database_service
+    from llm.interface import llm_service
+    from llm.llm import LLMHandler
+    from benchmarks.fakes import FakePinecone
+
+    llm_handler = LLMHandler()
+    llm_handler.base_url = os.environ['FAKE_CHAT_URL']
+    llm_service.llm_handler = llm_handler
+    database_service.db_handler = DBHandler(client=FakePinecone(os.environ['FAKE_VECTOR_URL']))
+    return APIRoutes().get_app()
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """'register=1,add=3' -> {'register': 1.0, 'add': 3.0}"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}': Must be in {list(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def percentiles(samples: List[float]) -> Tuple[float, float, float]:
+    """p50, p95, p99 in milliseconds"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return value, value, value
+    quantiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000
+
+
+class VirtualUser:
+    """One client session: its own credentials and bearer token"""
+
+    def __init__(self, client: httpx.AsyncClient, name: str, rng: random.Random):
+        self.client = client
+        self.user_id = name
+        self.password = f"{name}-password"
+        self.rng = rng
+        self.token = None
+
+    async def register(self) -> httpx.Response:
+        # A brand-new account every time: the registration path includes password hashing
+        user_id = f"{self.user_id}-{self.rng.getrandbits(48):x}"
+        return await self.client.post('/register', data={'user_id': user_id, 'password': self.password})
+
+    async def login(self) -> httpx.Response:
+        response = await self.client.post('/login', data={'username': self.user_id, 'password': self.password})
+        if response.status_code == 200:
+            self.token = response.json()['access_token']
+        return response
+
+    async def add(self) -> httpx.Response:
+        return await self.client.post('/add', data={'memory': self.rng.choice(MEMORIES)}, headers=self._auth())
+
+    async def query(self) -> httpx.Response:
+        return await self.client.get('/query', params={'q': self.rng.choice(QUESTIONS)}, headers=self._auth())
+
+    def _auth(self) -> Dict[str, str]:
+        return {'Authorization': f"Bearer {self.token}"}
+
+
+class LoadTest:
+    """Drive a running API at `base_url` and collect latencies per operation"""
+
+    def __init__(self, base_url: str, users: int, requests: int, mix: Dict[str, float], seed: int = 0):
+        self.base_url = base_url
+        self.users = users
+        self.requests = requests
+        self.mix = mix
+        self.seed = seed
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def _timed(self, operation: str, call) -> bool:
+        start = time.perf_counter()
+        try:
+            response = await call()
+            ok = response.status_code < 400 and 'Error processing query' not in response.text
+        except httpx.HTTPError:
+            ok = False
+        self.latencies[operation].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[operation] += 1
+        return ok
+
+    async def _user(self, client: httpx.AsyncClient, index: int, budget: itertools.count):
+        rng = random.Random(self.seed * 100003 + index)
+        user = VirtualUser(client, f"load-user-{index}", rng)
+        await client.post('/register', data={'user_id': user.user_id, 'password': user.password})
+        await user.login()
+        operations, weights = zip(*self.mix.items())
+        while next(budget) < self.requests:
+            operation = rng.choices(operations, weights)[0]
+            await self._timed(operation, getattr(user, operation))
+
+    async def run(self) -> Dict:
+        budget = itertools.count()
+        limits = httpx.Limits(max_connections=self.users, max_keepalive_connections=self.users)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=120) as client:
+            # Setup (first registration and login per user) isn't part of the measurement
+            started = time.perf_counter()
+            await asyncio.gather(*(self._user(client, index, budget) for index in range(self.users)))
+            elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict:
+        operations = {}
+        for operation in OPERATIONS:
+            samples = self.latencies.get(operation)
+            if not samples:
+                continue
+            p50, p95, p99 = percentiles(samples)
+            operations[operation] = {
+                'count': len(samples), 'errors': self.errors.get(operation, 0),
+                'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        p50, p95, p99 = percentiles([s for samples in self.latencies.values() for s in samples])
+        return {
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'seconds': elapsed,
+            'rps': total / elapsed if elapsed else 0.0,
+            'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+            'operations': operations,
+        }
+
+
+class APIProcess:
+    """The API under api.prefork in a child process, wired to the stand-in providers"""
+
+    def __init__(self, chat_url: str, vector_url: str, workers: int = 1, workdir: str = None):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.workers = workers
+        self.workdir = workdir
+        self.env = {
+            **os.environ,
+            'PYTHONPATH': ROOT,
+            'FAKE_CHAT_URL': chat_url,
+            'FAKE_VECTOR_URL': vector_url,
+            'GROQ_API_KEY': 'fake', 'GROK_API_KEY': 'fake', 'PINECONE_API_KEY': 'fake',
+            'USE_LOCAL_EMBEDDINGS': 'false',
+            'ENABLE_RATE_LIMITING': 'false',
+            'USERS_DB_PATH': os.path.join(workdir, 'users.db'),
+            'LOG_FILE': '',
+            'LOG_LEVEL': 'WARNING',
+        }
+        self.env.pop('DATABASE_URL', None)
+        self.process = None
+
+    def start(self, timeout: float = 60):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'api.prefork', '--app', 'benchmarks.load_test:create_fake_app',
+             '--workers', str(self.workers), '--host', '127.0.0.1', '--port', str(self.port)],
+            cwd=self.workdir, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"API process exited with {self.process.returncode}")
+            try:
+                if httpx.get(self.url + '/ready', timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("API did not become ready")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def run_load_test(users: int = 16, requests: int = 500, mix: str = DEFAULT_MIX, workers: int = 1,
+                  llm_latency_ms: float = 300, llm_tokens_per_sec: float = 200, completion_tokens: int = 40,
+                  vector_latency_ms: float = 20, seed: int = 0) -> Dict:
+    """Start the stand-in providers and the API, run the workload, and return the report"""
+    weights = parse_mix(mix)
+    chat = FakeChatServer(llm_latency_ms, llm_tokens_per_sec, completion_tokens)
+    vectors = FakeVectorServer(vector_latency_ms)
+    with chat, vectors, tempfile.TemporaryDirectory() as tmp:
+        api = APIProcess(chat.completions_url, vectors.url, workers=workers, workdir=tmp).start()
+        try:
+            result = asyncio.run(LoadTest(api.url, users, requests, weights, seed).run())
+        finally:
+            api.stop()
+    result['provider_calls'] = {'llm': chat.requests, 'vector': vectors.requests}
+    return result
+
+
+def print_report(result: Dict):
+    print(f"{'operation':10} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for operation, stats in result['operations'].items():
+        print(f"{operation:10} {stats['count']:7d} {stats['errors']:7d} "
+              f"{stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}")
+    print(f"{'all':10} {result['requests']:7d} {result['errors']:7d} "
+          f"{result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f}")
+    print(f"\n{result['rps']:.1f} requests/s over {result['seconds']:.1f}s; "
+          f"provider calls: {result['provider_calls']['llm']} LLM, {result['provider_calls']['vector']} vector")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API offline against stand-in LLM and vector providers")
+    parser.add_argument('--users', type=int, default=16, help="concurrent virtual users")
+    parser.add_argument('--requests', type=int, default=500, help="measured requests in total")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="operation weights, e.g. register=1,login=1,add=3,query=5")
+    parser.add_argument('--workers', default='1', help="API worker processes (a number or 'auto')")
+    parser.add_argument('--llm-latency-ms', type=float, default=300, help="fake LLM time before generating")
+    parser.add_argument('--llm-tokens-per-sec', type=float, default=200, help="fake LLM generation speed")
+    parser.add_argument('--completion-tokens', type=int, default=40, help="tokens per fake completion")
+    parser.add_argument('--vector-latency-ms', type=float, default=20, help="fake vector store latency per call")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from config.settings import worker_count
+    workers = worker_count(args.workers)
+    print(f"Load test: {args.users} users, {args.requests} requests, mix {args.mix}, {workers} worker(s); "
+          f"LLM {args.llm_latency_ms:.0f}ms + {args.completion_tokens} tokens at {args.llm_tokens_per_sec:.0f}/s, "
+          f"vector {args.vector_latency_ms:.0f}ms")
+    result = run_load_test(args.users, args.requests, args.mix, workers, args.llm_latency_ms,
+                           args.llm_tokens_per_sec, args.completion_tokens, args.vector_latency_ms, args.seed)
+    print_report(result)
+
+
+if __name__ == "__main__":
+    main()
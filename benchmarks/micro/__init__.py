@@ -0,0 +1,53 @@
+"""
+Micro-Benchmarks - Repeatable timings of hot paths
+
+Suites (suites.py) build fixtures and return named callables, the runner
+(runner.py) samples them, and compare.py tells whether two runs differ:
+    python -m benchmarks.micro run
+    python -m benchmarks.micro compare .benchmarks/micro-<base>.json .benchmarks/micro-<head>.json
+"""
+
+import re
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, List
+
+from .runner import DEFAULT_MIN_TIME, DEFAULT_REPEAT, DEFAULT_WARMUP, Timer, environment, measure
+from .suites import SUITES
+
+
+def list_benchmarks(suites: Iterable[str] = None) -> List[str]:
+    """Names of the benchmarks in the given suites (builds their fixtures)"""
+    names = []
+    for suite in suites or SUITES:
+        with ExitStack() as stack:
+            names.extend(SUITES[suite](stack))
+    return names
+
+
+def run_benchmarks(suites: Iterable[str] = None, pattern: str = None, repeat: int = DEFAULT_REPEAT,
+                   min_time: float = DEFAULT_MIN_TIME, warmup: int = DEFAULT_WARMUP,
+                   progress: Callable[[str, Dict], None] = None) -> Dict:
+    """Run the selected benchmarks -> {'environment': ..., 'settings': ..., 'benchmarks': {name: stats}}"""
+    selected = re.compile(pattern) if pattern else None
+    results = {}
+    timer = Timer()
+    try:
+        for suite in suites or SUITES:
+            with ExitStack() as stack:
+                for name, fn in SUITES[suite](stack).items():
+                    if selected and not selected.search(name):
+                        continue
+                    stats = measure(name, fn, repeat, min_time, warmup, timer).to_dict()
+                    results[name] = stats
+                    if progress:
+                        progress(name, stats)
+    finally:
+        timer.close()
+    return {
+        'environment': environment(),
+        'settings': {'repeat': repeat, 'min_time': min_time, 'warmup': warmup},
+        'benchmarks': results,
+    }
+
+
+__all__ = ['run_benchmarks', 'list_benchmarks', 'measure', 'SUITES']
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark command line
+
+    python -m benchmarks.micro run [--suite chat --suite llm] [--filter REGEX] [--output FILE]
+    python -m benchmarks.micro compare BASE.json HEAD.json [--threshold 0.05] [--alpha 0.01]
+    python -m benchmarks.micro list
+
+`run` writes .benchmarks/micro-<commit>.json unless --output is given. `compare`
+exits with status 1 when any benchmark got slower, so it can gate CI.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from benchmarks.micro import run_benchmarks, list_benchmarks
+from benchmarks.micro.compare import DEFAULT_ALPHA, DEFAULT_THRESHOLD, compare, format_duration, format_rows
+from benchmarks.micro.runner import DEFAULT_MIN_TIME, DEFAULT_REPEAT, DEFAULT_WARMUP
+from benchmarks.micro.suites import SUITES
+
+
+def _run(args) -> int:
+    result = run_benchmarks(args.suite, args.filter, args.repeat, args.min_time, args.warmup,
+                            progress=lambda name, stats: print(
+                                f"{name:40} {format_duration(stats['median']):>10}  ±{format_duration(stats['iqr'])} IQR"
+                                f"  ({stats['loops']} loops x {len(stats['samples'])})"))
+    output = args.output or os.path.join('.benchmarks', f"micro-{result['environment']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=1)
+    print(f"\nwrote {output}")
+    return 0
+
+
+def _compare(args) -> int:
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    for key in ('python', 'machine', 'processor'):
+        if base['environment'].get(key) != head['environment'].get(key):
+            print(f"warning: results come from different environments ({key}: "
+                  f"{base['environment'].get(key)} vs {head['environment'].get(key)})")
+    print(f"{base['environment']['commit']} -> {head['environment']['commit']}\n")
+    rows = compare(base, head, args.threshold, args.alpha)
+    print(format_rows(rows))
+    slower = [row['name'] for row in rows if row['verdict'] == 'slower']
+    if slower:
+        print(f"\n{len(slower)} regression(s): {', '.join(slower)}")
+        return 1
+    return 0
+
+
+def _list(args) -> int:
+    for name in list_benchmarks(args.suite):
+        print(name)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.micro', description="Micro-benchmarks for hot paths")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="run benchmarks and write a JSON result file")
+    run.add_argument('--suite', action='append', choices=sorted(SUITES), help="limit to a suite (repeatable)")
+    run.add_argument('--filter', help="only benchmarks whose name matches this regular expression")
+    run.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="samples per benchmark")
+    run.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME, help="minimum seconds per sample")
+    run.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help="discarded samples before measuring")
+    run.add_argument('--output', help="result file (default .benchmarks/micro-<commit>.json)")
+    run.set_defaults(handler=_run)
+
+    diff = commands.add_parser('compare', help="compare two result files; exit 1 on regressions")
+    diff.add_argument('base')
+    diff.add_argument('head')
+    diff.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="minimum relative change of the median")
+    diff.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help="significance level of the Mann-Whitney U test")
+    diff.set_defaults(handler=_compare)
+
+    listing = commands.add_parser('list', help="list benchmark names")
+    listing.add_argument('--suite', action='append', choices=sorted(SUITES))
+    listing.set_defaults(handler=_list)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Micro-Benchmark Comparison
+
+Compares two result files benchmark by benchmark. A change counts only when
+it is both large enough (median moved by more than `threshold`) and unlikely
+to be noise (two-sided Mann-Whitney U test on the samples, p < `alpha`). The
+test makes no assumption about the shape of the timing distribution, which is
+usually skewed by the occasional slow sample.
+"""
+
+import math
+from typing import Dict, List, Sequence, Tuple
+
+DEFAULT_THRESHOLD = 0.05  # 5% change in the median
+DEFAULT_ALPHA = 0.01
+
+
+def mann_whitney_u(a: Sequence[float], b: Sequence[float]) -> Tuple[float, float]:
+    """U statistic for `a` and the two-sided p-value (normal approximation, tie-corrected)"""
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 0.0, 1.0
+    ranked = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    ranks = [0.0] * len(ranked)
+    tie_term = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[k] = average_rank
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+
+    rank_sum_a = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0)
+    u = rank_sum_a - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)  # With continuity correction
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def compare(base: Dict, head: Dict, threshold: float = DEFAULT_THRESHOLD, alpha: float = DEFAULT_ALPHA) -> List[Dict]:
+    """One row per benchmark present in either result: medians, relative change, p-value, verdict"""
+    rows = []
+    base_results, head_results = base['benchmarks'], head['benchmarks']
+    for name in sorted(set(base_results) | set(head_results)):
+        if name not in base_results or name not in head_results:
+            rows.append({'name': name, 'verdict': 'added' if name in head_results else 'removed'})
+            continue
+        before, after = base_results[name], head_results[name]
+        change = after['median'] / before['median'] - 1 if before['median'] else 0.0
+        _, p_value = mann_whitney_u(before['samples'], after['samples'])
+        verdict = 'same'
+        if p_value < alpha and abs(change) > threshold:
+            verdict = 'slower' if change > 0 else 'faster'
+        rows.append({
+            'name': name, 'base': before['median'], 'head': after['median'],
+            'change': change, 'p_value': p_value, 'verdict': verdict,
+        })
+    return rows
+
+
+def format_duration(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def format_rows(rows: List[Dict]) -> str:
+    lines = [f"{'benchmark':40} {'base':>10} {'head':>10} {'change':>8} {'p':>8}  verdict"]
+    for row in rows:
+        if 'base' not in row:
+            lines.append(f"{row['name']:40} {'':>10} {'':>10} {'':>8} {'':>8}  {row['verdict']}")
+            continue
+        lines.append(f"{row['name']:40} {format_duration(row['base']):>10} {format_duration(row['head']):>10} "
+                     f"{row['change']:+8.1%} {row['p_value']:8.3g}  {row['verdict']}")
+    return '\n'.join(lines)
@@ -0,0 +1,139 @@
+"""
+Micro-Benchmark Runner
+
+Times one callable (or coroutine function) the way timeit does, with the
+repeats kept as samples:
+
+- calibrate: grow the loop count until one sample takes at least `min_time`,
+  so timer resolution and call overhead stay negligible
+- warm up: run and discard `warmup` samples (first-use caches, lazy imports,
+  the interpreter's specialization of hot bytecode)
+- measure: `repeat` samples of `loops` calls each, with the garbage collector
+  off; each sample is stored as seconds per call
+
+Results keep every sample, so compare.py can test whether two runs differ
+rather than only comparing two numbers.
+"""
+
+import asyncio
+import gc
+import inspect
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+DEFAULT_REPEAT = 20
+DEFAULT_MIN_TIME = 0.01  # seconds per sample
+DEFAULT_WARMUP = 2
+
+
+class Measurement:
+    """Samples of one benchmark, in seconds per call"""
+
+    def __init__(self, name: str, samples: List[float], loops: int):
+        self.name = name
+        self.samples = samples
+        self.loops = loops
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.samples)
+
+    def to_dict(self) -> Dict:
+        samples = self.samples
+        q1, _, q3 = statistics.quantiles(samples, n=4) if len(samples) > 1 else (samples[0],) * 3
+        return {
+            'loops': self.loops,
+            'samples': samples,
+            'median': self.median,
+            'mean': statistics.fmean(samples),
+            'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            'min': min(samples),
+            'iqr': q3 - q1,
+        }
+
+
+class Timer:
+    """Runs sync callables directly and coroutine functions on one long-lived event loop"""
+
+    def __init__(self):
+        self._loop = None
+
+    def __call__(self, fn: Callable, loops: int) -> float:
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if inspect.iscoroutinefunction(fn):
+                return self._event_loop().run_until_complete(self._time_async(fn, loops))
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            return time.perf_counter() - start
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    @staticmethod
+    async def _time_async(fn, loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            await fn()
+        return time.perf_counter() - start
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+
+def measure(name: str, fn: Callable, repeat: int = DEFAULT_REPEAT, min_time: float = DEFAULT_MIN_TIME,
+            warmup: int = DEFAULT_WARMUP, timer: Timer = None) -> Measurement:
+    """Calibrate, warm up and sample `fn`"""
+    own_timer = timer is None
+    timer = timer or Timer()
+    try:
+        loops = 1
+        while True:
+            elapsed = timer(fn, loops)
+            if elapsed >= min_time or loops >= 1 << 24:
+                break
+            # Aim a little past min_time, at least doubling
+            loops = max(loops * 2, int(loops * min_time * 1.2 / elapsed) if elapsed > 0 else loops * 10)
+        for _ in range(warmup):
+            timer(fn, loops)
+        samples = [timer(fn, loops) / loops for _ in range(repeat)]
+    finally:
+        if own_timer:
+            timer.close()
+    return Measurement(name, samples, loops)
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def environment() -> Dict:
+    """Where a run happened: results from different machines shouldn't be compared"""
+    commit = _git('rev-parse', '--short', 'HEAD')
+    dirty = bool(_git('status', '--porcelain', '--untracked-files=no'))
+    return {
+        'commit': commit + ('-dirty' if commit and dirty else ''),
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+    }
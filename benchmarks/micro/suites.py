@@ -0,0 +1,168 @@
+"""
+Micro-Benchmark Suites
+
+Each suite builds its fixtures once and returns {benchmark name: callable}.
+Callables take no arguments; coroutine functions (including functools.partial
+of one) are awaited on one event loop.
+Providers are never called: the LLM gets a canned HTTP session and the vector
+store is benchmarks.fakes.VectorStore in-process, so only our own code is timed.
+"""
+
+import asyncio
+import os
+import tempfile
+from contextlib import ExitStack
+from functools import partial
+from typing import Callable, Dict
+from unittest.mock import patch
+
+import requests
+
+Suite = Callable[[ExitStack], Dict[str, Callable]]
+
+MARKDOWN_ANSWER = (
+    "You told me **three** things about food:\n"
+    "- your *favorite* is pizza with olives\n"
+    "- you **don't** like coriander\n"
+    "- you had *ramen* in Tokyo last spring"
+)
+
+
+def chat_suite(stack: ExitStack) -> Dict[str, Callable]:
+    from chat.handlers import (
+        ChatMessageHandler, CLIMessageHandler, WebMessageHandler, SlackMessageHandler, DiscordMessageHandler
+    )
+
+    parser = ChatMessageHandler()
+    benchmarks = {
+        'chat.parse_message.command': lambda: parser.parse_message("remember: my favorite food is pizza"),
+        # Natural language falls through every command pattern
+        'chat.parse_message.natural': lambda: parser.parse_message("what did I say about my sister's birthday?"),
+    }
+    response = {'results': MARKDOWN_ANSWER}
+    for name, handler_class in (('base', ChatMessageHandler), ('cli', CLIMessageHandler), ('web', WebMessageHandler),
+                                ('slack', SlackMessageHandler), ('discord', DiscordMessageHandler)):
+        handler = handler_class()
+        benchmarks[f'chat.format_response.{name}'] = (
+            lambda handler=handler: handler.format_response(response, query="what food do I like?"))
+    return benchmarks
+
+
+def database_suite(stack: ExitStack) -> Dict[str, Callable]:
+    from benchmarks.fakes import LocalPinecone, VectorStore
+    from database.database import DBHandler
+
+    # Small vectors keep the fake's brute-force search from drowning out DBHandler itself
+    handler = DBHandler(client=LocalPinecone(VectorStore(dimension=64)))
+    for i in range(200):
+        handler.add_memory('reader', f"memory number {i} about topic {i % 17}")
+    structured = {'content': 'my favorite food is pizza', 'summary': 'favorite food: pizza', 'tags': ['food']}
+    return {
+        'database.add_memory.text': lambda: handler.add_memory('writer', "I parked on level three"),
+        'database.add_memory.dict': lambda: handler.add_memory('writer', structured),
+        'database.query_memories': lambda: handler.query_memories('reader', "what about topic 5", top_k=5),
+    }
+
+
+class CannedResponse:
+    """What LLMHandler reads from a provider response, without the network"""
+
+    def __init__(self, content: str):
+        self._payload = {"choices": [{"message": {"content": content}}]}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class CannedSession(requests.Session):
+    def __init__(self, content: str):
+        super().__init__()
+        self.response = CannedResponse(content)
+
+    def post(self, *args, **kwargs):
+        return self.response
+
+
+def llm_suite(stack: ExitStack) -> Dict[str, Callable]:
+    from llm.llm import LLMHandler
+
+    stack.enter_context(patch.dict(os.environ, {'GROQ_API_KEY': os.getenv('GROQ_API_KEY') or 'benchmark'}))
+    structured = LLMHandler(session=CannedSession(
+        '{"content": "favorite food is pizza with olives", "summary": "favorite food: pizza", "tags": ["food", "pizza"]}'))
+    plain = LLMHandler(session=CannedSession("favorite food is pizza with olives"))
+    answer = LLMHandler(session=CannedSession("Your favorite food is pizza with olives."))
+    question = "Answer this question: 'what food do I like?' using only this information: ['pizza with olives']."
+    return {
+        'llm.process_input.json': lambda: structured.process_input('user', "my favorite food is pizza"),
+        'llm.process_input.not_json': lambda: plain.process_input('user', "my favorite food is pizza"),
+        'llm.process_input.answer': lambda: answer.process_input('user', question),
+    }
+
+
+def auth_suite(stack: ExitStack) -> Dict[str, Callable]:
+    from authentication.store import SQLiteUserStore
+
+    tmp = stack.enter_context(tempfile.TemporaryDirectory())
+    store = SQLiteUserStore(os.path.join(tmp, 'users.db'))
+    asyncio.run(store.init_schema())
+    for i in range(1000):
+        store._write("INSERT INTO users (user_id, hashed_password) VALUES (?, ?)", (f"user{i:04d}", "hash"))
+    # The bearer token is the user id: validating it is one primary-key lookup
+    return {
+        'auth.validate_token.valid': partial(store.get_user, 'user0500'),
+        'auth.validate_token.unknown': partial(store.get_user, 'nobody'),
+    }
+
+
+def pages_suite(stack: ExitStack) -> Dict[str, Callable]:
+    from api.config import RATE_LIMIT_CONFIG
+    from api.routes import APIRoutes
+
+    # The general rate-limit budget would start answering 429 within the first sample
+    with patch.dict(RATE_LIMIT_CONFIG, {'enabled': False}):
+        app = APIRoutes().get_app()
+
+    async def get(path: str, headers: Dict[str, str]) -> int:
+        """One GET through the whole ASGI stack (middleware, routing, page cache), no HTTP client"""
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 8000),
+        }
+        status = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, send)
+        return status[0]
+
+    etag = app_headers(app, '/').get('etag', '"none"')
+    return {
+        'pages.serve.gzip': partial(get, '/', {'accept-encoding': 'gzip, deflate'}),
+        'pages.serve.identity': partial(get, '/', {}),
+        'pages.serve.not_modified': partial(get, '/', {'accept-encoding': 'gzip, deflate', 'if-none-match': etag}),
+    }
+
+
+def app_headers(app, path: str) -> Dict[str, str]:
+    """Response headers of one GET, for fixtures like ETags"""
+    from fastapi.testclient import TestClient
+    return dict(TestClient(app).get(path, headers={'accept-encoding': 'gzip, deflate'}).headers)
+
+
+SUITES: Dict[str, Suite] = {
+    'chat': chat_suite,
+    'database': database_suite,
+    'llm': llm_suite,
+    'auth': auth_suite,
+    'pages': pages_suite,
+}
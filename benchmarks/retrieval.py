@@ -0,0 +1,492 @@
+"""
+Retrieval Quality vs Latency
+
+Measures what an index configuration costs in recall and what it buys in
+latency and memory, on synthetic per-user memory corpora:
+
+    python -m benchmarks.retrieval --scale 1000 --scale 10000 --scale 100000
+    python -m benchmarks.retrieval --scale 10000 --config flat --config ivf,nprobe=4 --top-k 5
+    python -m benchmarks.retrieval --scale 1000 --embedding hash-1024 --provider pinecone
+
+For each scale one user's corpus of memories and a set of held-out questions
+are generated and embedded. Exact neighbours (brute-force cosine over float32
+vectors of the first --embedding) are the ground truth. Every target then
+answers the questions one at a time, the way DBHandler.query_memories does,
+and the report shows recall@k, QPS, p50/p99 latency, build time and memory.
+
+Targets:
+- in-process indexes (--config): exact `flat` or inverted-file `ivf`, over
+  float32, int8 or binary codes, optionally rescoring the best candidates with
+  the float32 vectors
+- DBHandler providers (--provider): the corpus is upserted into a throwaway
+  namespace of the provider's real index, queried there and deleted. Needs the
+  provider's API key and an --embedding of the index's dimension.
+
+Embeddings: `hash-<dimension>` (benchmarks/fakes.py, offline) or
+`local:<model>` (SentenceTransformer). Later embeddings are scored against the
+first one's ground truth, so recall also shows how far a cheaper model's
+neighbours drift from the reference model's.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Callable, Dict, List, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from benchmarks.fakes import WORDS, hash_word
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+DEFAULT_EMBEDDINGS = ('hash-384',)
+DEFAULT_CONFIGS = (
+    'flat',
+    'flat,quant=int8',
+    'flat,quant=binary',
+    'flat,quant=binary,rescore=4',
+    'ivf,nprobe=4',
+    'ivf,nprobe=16',
+)
+DEFAULT_TOP_K = (1, 5, 10)
+
+# Synthetic memories: a topic, two of its subjects and details that make each one unique
+TOPICS = {
+    'food': ['pizza', 'ramen', 'sushi', 'tacos', 'curry', 'pasta', 'dumplings', 'olives', 'coriander', 'espresso'],
+    'travel': ['flight', 'hotel', 'passport', 'train', 'beach', 'museum', 'visa', 'luggage', 'hostel', 'ferry'],
+    'work': ['meeting', 'deadline', 'promotion', 'manager', 'project', 'salary', 'interview', 'report', 'client', 'review'],
+    'family': ['sister', 'brother', 'mother', 'father', 'cousin', 'grandmother', 'wedding', 'birthday', 'niece', 'uncle'],
+    'health': ['dentist', 'doctor', 'allergy', 'vitamins', 'prescription', 'gym', 'knee', 'sleep', 'therapy', 'checkup'],
+    'home': ['rent', 'landlord', 'plumber', 'garden', 'sofa', 'keys', 'garage', 'heating', 'neighbour', 'lease'],
+    'money': ['budget', 'savings', 'invoice', 'taxes', 'mortgage', 'pension', 'loan', 'refund', 'bank', 'insurance'],
+    'hobbies': ['guitar', 'chess', 'painting', 'hiking', 'climbing', 'novel', 'photography', 'cycling', 'pottery', 'choir'],
+}
+TEMPLATES = [
+    "I need to remember the {a} and the {b} with {person} in {place} on day {n}",
+    "{person} told me about the {a} near {place}, it cost {n} dollars and involved the {b}",
+    "note to self: {a} before {b}, ask {person} from {place} about item {n}",
+    "my {a} is connected to the {b}; {person} said so in {place} after {n} weeks",
+    "last time in {place} the {a} took {n} minutes and {person} forgot the {b}",
+]
+QUESTIONS = [
+    "what did I say about the {a} and the {b}",
+    "when was the {a} with {person}",
+    "anything about {a} in {place}",
+    "what did {person} tell me about the {b}",
+]
+PEOPLE = ['anna', 'bilal', 'chen', 'dara', 'eitan', 'femi', 'greta', 'hiro', 'ines', 'jonas', 'kemal', 'lucia',
+          'mateo', 'nadia', 'oskar', 'priya', 'quinn', 'rosa', 'sven', 'tariq', 'uma', 'viktor', 'wen', 'yara']
+PLACES = ['oslo', 'lisbon', 'tokyo', 'nairobi', 'lima', 'austin', 'hanoi', 'krakow', 'dublin', 'perth',
+          'quito', 'seoul', 'cairo', 'bergen', 'porto', 'denver', 'riga', 'cusco', 'osaka', 'tunis']
+
+
+def make_corpus(size: int, queries: int, seed: int = 0) -> Tuple[List[str], List[str]]:
+    """`size` memories of one user and `queries` questions about them"""
+    rng = random.Random(seed)
+
+    def fill(template: str) -> str:
+        subjects = TOPICS[rng.choice(list(TOPICS))]
+        a, b = rng.sample(subjects, 2)
+        return template.format(a=a, b=b, person=rng.choice(PEOPLE), place=rng.choice(PLACES), n=rng.randint(1, 500))
+
+    memories = [fill(rng.choice(TEMPLATES)) for _ in range(size)]
+    questions = [fill(rng.choice(QUESTIONS)) for _ in range(queries)]
+    return memories, questions
+
+
+class HashEmbedder:
+    """benchmarks.fakes.hash_embedding, vectorised: same vectors, fast enough for 100k texts"""
+
+    def __init__(self, dimension: int):
+        self.name = f"hash-{dimension}"
+        self.dimension = dimension
+        self._features = {}
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in WORDS.findall(text.lower()):
+                feature = self._features.get(word)
+                if feature is None:
+                    feature = self._features[word] = hash_word(word, self.dimension)
+                vectors[row, feature[0]] += feature[1]
+        return normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """A local SentenceTransformer model, as DBHandler uses with USE_LOCAL_EMBEDDINGS=true"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        from config.providers import EMBEDDING_CONFIG
+        self.name = f"local:{model_name}"
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.batch_size = EMBEDDING_CONFIG['batch_size']
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True)
+        return normalize(vectors.astype(np.float32))
+
+
+def create_embedder(spec: str):
+    """`hash-<dimension>` or `local:<model name>`"""
+    if spec.startswith('hash-'):
+        return HashEmbedder(int(spec[len('hash-'):]))
+    if spec.startswith('local:'):
+        return SentenceTransformerEmbedder(spec[len('local:'):])
+    raise ValueError(f"Unknown embedding '{spec}': use hash-<dimension> or local:<model>")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind='stable')]
+
+
+# Codecs store the vectors of an index and score a contiguous range of them against a query
+
+class Float32Codec:
+    def __init__(self, vectors: np.ndarray):
+        self.data = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def scores(self, query: np.ndarray, start: int, stop: int) -> np.ndarray:
+        return self.data[start:stop] @ query
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+
+class Int8Codec:
+    """Symmetric scalar quantization per dimension: 4x smaller than float32"""
+
+    BLOCK = 8192  # numpy has no int8 GEMM: rows are widened to float32 a block at a time
+
+    def __init__(self, vectors: np.ndarray):
+        self.scale = np.maximum(np.abs(vectors).max(axis=0), 1e-12) / 127
+        self.data = np.round(vectors / self.scale).astype(np.int8)
+
+    def scores(self, query: np.ndarray, start: int, stop: int) -> np.ndarray:
+        scaled = (query * self.scale).astype(np.float32)
+        return np.concatenate([
+            self.data[block:min(block + self.BLOCK, stop)].astype(np.float32) @ scaled
+            for block in range(start, stop, self.BLOCK)
+        ]) if stop > start else np.empty(0, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.scale.nbytes
+
+
+class BinaryCodec:
+    """One sign bit per dimension, scored by Hamming distance: 32x smaller than float32"""
+
+    # numpy >= 2.0 counts bits natively; older versions look them up per byte
+    POPCOUNT = getattr(np, 'bitwise_count', np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8).take)
+
+    def __init__(self, vectors: np.ndarray):
+        self.data = np.packbits(vectors > 0, axis=1)
+
+    def scores(self, query: np.ndarray, start: int, stop: int) -> np.ndarray:
+        bits = np.packbits(query > 0)
+        return -BinaryCodec.POPCOUNT(self.data[start:stop] ^ bits).sum(axis=1, dtype=np.int32).astype(np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+
+CODECS = {'float32': Float32Codec, 'int8': Int8Codec, 'binary': BinaryCodec}
+
+
+class Index:
+    """Base for in-process indexes: `build`, then `search` one query at a time"""
+
+    def __init__(self, quant: str = 'float32', rescore: int = 0):
+        if quant not in CODECS:
+            raise ValueError(f"Unknown quant '{quant}': use one of {sorted(CODECS)}")
+        self.quant = quant
+        self.rescore = rescore
+        self.codec = None
+        self.vectors = None  # float32 copy, only kept when rescoring
+
+    def build(self, vectors: np.ndarray):
+        raise NotImplementedError
+
+    def _ranges(self, query: np.ndarray):
+        """(start, stop) row ranges of the codec to scan for this query"""
+        raise NotImplementedError
+
+    def _ids(self, positions: np.ndarray) -> np.ndarray:
+        return positions
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        ranges = self._ranges(query)
+        positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        scores = np.concatenate([self.codec.scores(query, start, stop) for start, stop in ranges])
+        candidates = positions[top_k(scores, k * self.rescore if self.rescore else k)]
+        if self.rescore:
+            candidates = candidates[top_k(self.vectors[candidates] @ query, k)]
+        return self._ids(candidates)
+
+    def _store(self, vectors: np.ndarray):
+        self.codec = CODECS[self.quant](vectors)
+        if self.rescore:
+            self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codec.nbytes + (self.vectors.nbytes if self.vectors is not None else 0)
+
+    def close(self):
+        pass
+
+
+class FlatIndex(Index):
+    """Scans every vector"""
+
+    def build(self, vectors: np.ndarray):
+        self._store(vectors)
+        self.size = len(vectors)
+
+    def _ranges(self, query):
+        return [(0, self.size)]
+
+
+class IVFIndex(Index):
+    """Inverted file: vectors grouped by nearest of `nlist` k-means centroids; a query scans `nprobe` groups"""
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, iterations: int = 10, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.nlist = nlist  # 0: about sqrt(corpus size)
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+
+    def build(self, vectors: np.ndarray):
+        nlist = min(self.nlist or max(1, round(math.sqrt(len(vectors)))), len(vectors))
+        self.centroids = self._train(vectors, nlist)
+        assignment = self._assign(vectors, self.centroids)
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.searchsorted(assignment[self.order], np.arange(nlist + 1))
+        self._store(vectors[self.order])
+
+    def _train(self, vectors: np.ndarray, nlist: int) -> np.ndarray:
+        """Spherical k-means on a sample of the corpus"""
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(self.iterations):
+            assignment = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+        return centroids
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 16384) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + block] @ centroids.T, axis=1) for start in range(0, len(vectors), block)
+        ])
+
+    def _ranges(self, query):
+        probes = top_k(self.centroids @ query, self.nprobe)
+        return [(self.offsets[i], self.offsets[i + 1]) for i in probes]
+
+    def _ids(self, positions):
+        return self.order[positions]
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.centroids.nbytes + self.order.nbytes + self.offsets.nbytes
+
+
+INDEXES = {'flat': FlatIndex, 'ivf': IVFIndex}
+
+
+def create_index(spec: str) -> Index:
+    """`flat` or `ivf`, then comma-separated options: e.g. `ivf,nlist=256,nprobe=8,quant=int8,rescore=4`"""
+    kind, *options = spec.split(',')
+    if kind not in INDEXES:
+        raise ValueError(f"Unknown index '{kind}': use one of {sorted(INDEXES)}")
+    kwargs = {}
+    for option in options:
+        key, _, value = option.partition('=')
+        kwargs[key.strip()] = value.strip() if key.strip() == 'quant' else int(value)
+    return INDEXES[kind](**kwargs)
+
+
+class ProviderIndex:
+    """A DBHandler provider's real index, loaded into a throwaway namespace"""
+
+    BATCH = 100
+
+    def __init__(self, provider: str, client=None, settle_timeout: float = 120):
+        from database.database import DBHandler
+        # NotImplementedError for providers DBHandler doesn't support yet
+        self.handler = DBHandler(provider, client=client)
+        self.namespace = f"benchmark-retrieval-{uuid.uuid4().hex[:8]}"
+        self.settle_timeout = settle_timeout
+        self.nbytes = None  # Not observable for a hosted index
+
+    def build(self, vectors: np.ndarray):
+        if vectors.shape[1] != self.handler.dimension:
+            raise ValueError(f"Index '{self.handler.index_name}' has dimension {self.handler.dimension}, "
+                             f"the embedding has {vectors.shape[1]}: use --embedding hash-{self.handler.dimension}")
+        index = self.handler.get_index()
+        for start in range(0, len(vectors), self.BATCH):
+            batch = vectors[start:start + self.BATCH]
+            index.upsert(vectors=[(f"m{start + i}", row.tolist()) for i, row in enumerate(batch)], namespace=self.namespace)
+        # Writes become visible to queries asynchronously
+        deadline = time.monotonic() + self.settle_timeout
+        while self.handler.count_namespace(self.namespace) < len(vectors):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Namespace {self.namespace} did not reach {len(vectors)} vectors")
+            time.sleep(1)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        result = self.handler.get_index().query(vector=query.tolist(), top_k=k, namespace=self.namespace)
+        return np.array([int(match.id[1:]) for match in result.matches], dtype=np.int64)
+
+    def close(self):
+        self.handler.delete_namespace(self.namespace)
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int, block: int = 32) -> np.ndarray:
+    """Ground truth: ids of the k most similar corpus vectors for every query, best first"""
+    return np.vstack([
+        np.vstack([top_k(row, k) for row in queries[start:start + block] @ corpus.T])
+        for start in range(0, len(queries), block)
+    ])
+
+
+def recall_at_k(retrieved: Sequence[np.ndarray], truth: np.ndarray, corpus: np.ndarray, queries: np.ndarray,
+                k: int) -> float:
+    """Share of the true top k found; a result tied in score with the k-th true neighbour counts as found"""
+    found = 0
+    for query, ids, true_ids in zip(queries, retrieved, truth):
+        kth_score = corpus[true_ids[k - 1]] @ query
+        scores = corpus[ids[:k]] @ query if len(ids) else np.empty(0)
+        found += min(k, int(np.sum(scores >= kth_score - 1e-6)))
+    return found / (k * len(truth))
+
+
+def evaluate(index, queries: np.ndarray, k: int) -> Dict:
+    """Run every query once, one at a time -> retrieved ids and latency stats"""
+    retrieved, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        retrieved.append(index.search(query, k))
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'retrieved': retrieved,
+        'qps': len(latencies) / sum(latencies) if sum(latencies) else float('inf'),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run_benchmark(scales: Sequence[int] = DEFAULT_SCALES, embeddings: Sequence[str] = DEFAULT_EMBEDDINGS,
+                  configs: Sequence[str] = DEFAULT_CONFIGS, providers: Sequence[str] = (),
+                  ks: Sequence[int] = DEFAULT_TOP_K, queries: int = 200, seed: int = 0,
+                  progress: Callable[[Dict], None] = None) -> List[Dict]:
+    """One row per scale, embedding, target and k"""
+    embedders = [create_embedder(spec) for spec in embeddings]
+    targets = [(spec, lambda spec=spec: create_index(spec)) for spec in configs]
+    targets += [(f"provider:{name}", lambda name=name: ProviderIndex(name)) for name in providers]
+    rows = []
+    for scale in scales:
+        memories, questions = make_corpus(scale, queries, seed)
+        reference = truth = None
+        for embedder in embedders:
+            started = time.perf_counter()
+            corpus = embedder.embed(memories)
+            embed_seconds = time.perf_counter() - started
+            query_vectors = embedder.embed(questions)
+            if reference is None:
+                reference = (corpus, query_vectors)
+                truth = exact_neighbours(corpus, query_vectors, max(ks))
+            for name, factory in targets:
+                index = factory()
+                try:
+                    started = time.perf_counter()
+                    index.build(corpus)
+                    build_seconds = time.perf_counter() - started
+                    for k in ks:
+                        result = evaluate(index, query_vectors, k)
+                        row = {
+                            'scale': scale, 'embedding': embedder.name, 'target': name, 'k': k,
+                            'recall': recall_at_k(result['retrieved'], truth, reference[0], reference[1], k),
+                            'qps': result['qps'], 'p50_ms': result['p50_ms'], 'p99_ms': result['p99_ms'],
+                            'build_s': build_seconds, 'memory_bytes': index.nbytes,
+                            'embed_ms_per_memory': embed_seconds * 1000 / scale,
+                        }
+                        rows.append(row)
+                        if progress:
+                            progress(row)
+                finally:
+                    index.close()
+    return rows
+
+
+def print_row(row: Dict):
+    memory = f"{row['memory_bytes'] / 2 ** 20:.1f}" if row['memory_bytes'] is not None else 'n/a'
+    print(f"{row['scale']:>7} {row['embedding']:16} {row['target']:30} {row['k']:>3} {row['recall']:7.3f} "
+          f"{row['qps']:9.0f} {row['p50_ms']:8.2f} {row['p99_ms']:8.2f} {row['build_s']:8.2f} {memory:>9}")
+
+
+def print_header():
+    print(f"{'scale':>7} {'embedding':16} {'target':30} {'k':>3} {'recall':>7} "
+          f"{'QPS':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'memory MB':>9}")
+
+
+def main():
+    from config.providers import DATABASE_PROVIDERS
+
+    parser = argparse.ArgumentParser(description="Recall vs latency and memory of vector retrieval configurations")
+    parser.add_argument('--scale', type=int, action='append', help="memories per user (repeatable; default 1k, 10k, 100k)")
+    parser.add_argument('--embedding', action='append', help="hash-<dimension> or local:<model> (repeatable; the first is the reference)")
+    parser.add_argument('--config', action='append', help="in-process index, e.g. flat,quant=int8 or ivf,nlist=256,nprobe=8 (repeatable)")
+    parser.add_argument('--provider', action='append', default=[], choices=sorted(DATABASE_PROVIDERS),
+                        help="also benchmark a DBHandler provider's real index (repeatable)")
+    parser.add_argument('--top-k', default=','.join(map(str, DEFAULT_TOP_K)), help="comma-separated k values")
+    parser.add_argument('--queries', type=int, default=200, help="questions per scale")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="also write the rows and environment to this JSON file")
+    args = parser.parse_args()
+
+    settings = {
+        'scales': args.scale or list(DEFAULT_SCALES), 'embeddings': args.embedding or list(DEFAULT_EMBEDDINGS),
+        'configs': args.config or list(DEFAULT_CONFIGS), 'providers': args.provider,
+        'ks': [int(k) for k in args.top_k.split(',')], 'queries': args.queries, 'seed': args.seed,
+    }
+    print_header()
+    rows = run_benchmark(**settings, progress=print_row)
+    if args.output:
+        from benchmarks.micro.runner import environment
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'settings': settings, 'rows': rows}, f, indent=1)
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+SQLite User Store Benchmark
+
+Compares user-table throughput under concurrent load for:
+- legacy:  a new connection per call in rollback-journal mode (the old AuthHandler)
+- default: SQLiteUserStore with stock settings and a shared connection pool
+- tuned:   SQLiteUserStore with WAL, synchronous=NORMAL, mmap and per-thread connections
+
+Registrations and logins are mixed; password hashing is left out so the numbers
+reflect database cost only.
+
+Run:
+    python -m benchmarks.sqlite_users --threads 8 --ops 2000
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from authentication.store import SQLiteUserStore
+
+HASH = "$argon2id$v=19$m=65536,t=3,p=4$benchmark"
+
+
+class LegacyUsers:
+    """Connection-per-call access pattern used before the UserStore"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def setup(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, hashed_password TEXT)")
+        conn.commit()
+        conn.close()
+
+    def register(self, user_id):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
+        if not cursor.fetchone():
+            cursor.execute("INSERT INTO users (user_id, hashed_password) VALUES (?, ?)", (user_id, HASH))
+            conn.commit()
+        conn.close()
+
+    def login(self, user_id):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT hashed_password FROM users WHERE user_id = ?", (user_id,))
+        cursor.fetchone()
+        conn.close()
+
+
+class StoreUsers:
+    """Same operations through SQLiteUserStore"""
+
+    def __init__(self, db_path, profile):
+        self.store = SQLiteUserStore(db_path, profile=profile)
+
+    def setup(self):
+        asyncio.run(self.store.init_schema())
+
+    def register(self, user_id):
+        self.store._write("INSERT OR IGNORE INTO users (user_id, hashed_password) VALUES (?, ?)", (user_id, HASH))
+
+    def login(self, user_id):
+        self.store._fetchone("SELECT hashed_password FROM users WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        asyncio.run(self.store.close())
+
+
+def run_profile(name, users, threads, ops, write_ratio):
+    """Run ops operations per thread and return throughput and latency stats"""
+    users.setup()
+    write_every = max(1, round(1 / write_ratio)) if write_ratio > 0 else 0
+    latencies = [[] for _ in range(threads)]
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        barrier.wait()
+        samples = latencies[index]
+        for i in range(ops):
+            user_id = f"user_{index}_{i}"
+            start = time.perf_counter()
+            try:
+                if write_every and i % write_every == 0:
+                    users.register(user_id)
+                else:
+                    users.login(f"user_{index}_{i - i % max(write_every, 1)}")
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+            samples.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    if hasattr(users, 'close'):
+        users.close()
+
+    all_samples = sorted(s for samples in latencies for s in samples)
+    quantiles = statistics.quantiles(all_samples, n=100)
+    return {
+        'profile': name,
+        'ops_per_sec': len(all_samples) / elapsed,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite user store profiles")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=2000, help="operations per thread")
+    parser.add_argument('--write-ratio', type=float, default=0.2, help="fraction of operations that register")
+    args = parser.parse_args()
+
+    print(f"SQLite user store benchmark: {args.threads} threads x {args.ops} ops, {args.write_ratio:.0%} writes")
+    print(f"{'profile':10} {'ops/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        candidates = [
+            ('legacy', LegacyUsers(os.path.join(tmp, 'legacy.db'))),
+            ('default', StoreUsers(os.path.join(tmp, 'default.db'), 'default')),
+            ('tuned', StoreUsers(os.path.join(tmp, 'tuned.db'), 'tuned')),
+        ]
+        for name, users in candidates:
+            result = run_profile(name, users, args.threads, args.ops, args.write_ratio)
+            print(f"{result['profile']:10} {result['ops_per_sec']:10.0f} {result['p50_ms']:8.3f} "
+                  f"{result['p95_ms']:8.3f} {result['p99_ms']:8.3f} {result['errors']:7d}")
+
+
+if __name__ == "__main__":
+    main()
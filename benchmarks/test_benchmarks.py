@@ -0,0 +1,178 @@
+"""
+Benchmarks Tests - Test everything in this module
+
+Run this to test the benchmark tools before merging to develop.
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import LocalPinecone, VectorStore, hash_embedding
+from benchmarks.load_test import parse_mix, run_load_test
+from benchmarks.micro import run_benchmarks
+from benchmarks.micro.compare import compare, mann_whitney_u
+from benchmarks.retrieval import HashEmbedder, ProviderIndex, create_index, exact_neighbours, make_corpus, recall_at_k, run_benchmark
+from config.providers import DATABASE_PROVIDERS
+
+
+class TestLoadHarness(unittest.TestCase):
+    """Test the offline load test against the stand-in providers"""
+    
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('add=3,query'), {'add': 3.0, 'query': 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix('delete=1')
+    
+    def test_mixed_workload(self):
+        """Every operation succeeds end to end and each add/query reaches the fake providers"""
+        result = run_load_test(users=2, requests=12, mix='register=1,login=1,add=1,query=1',
+                               llm_latency_ms=0, llm_tokens_per_sec=0, vector_latency_ms=0)
+        self.assertEqual(result['requests'], 12)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['rps'], 0)
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(result['provider_calls']['llm'], 0)
+        self.assertGreater(result['provider_calls']['vector'], 0)
+
+
+class TestMicroBenchmarks(unittest.TestCase):
+    """Test the micro-benchmark runner and regression comparison"""
+    
+    @staticmethod
+    def result(**medians):
+        """A result file whose samples scatter ±2% around each median"""
+        return {'benchmarks': {
+            name: {'median': median, 'samples': [median * (1 + (i % 5 - 2) / 100) for i in range(20)]}
+            for name, median in medians.items()
+        }}
+    
+    def test_mann_whitney_u(self):
+        _, p_same = mann_whitney_u([1, 2, 3, 4, 5] * 4, [1, 2, 3, 4, 5] * 4)
+        _, p_shifted = mann_whitney_u(list(range(20)), list(range(100, 120)))
+        self.assertGreater(p_same, 0.5)
+        self.assertLess(p_shifted, 1e-6)
+    
+    def test_compare_flags_regressions_only_beyond_noise(self):
+        base = self.result(parse=1e-6, query=1e-3, format=2e-6, gone=1e-6)
+        head = self.result(parse=1.2e-6, query=0.8e-3, format=2.02e-6, new=1e-6)
+        verdicts = {row['name']: row['verdict'] for row in compare(base, head)}
+        self.assertEqual(verdicts, {'parse': 'slower', 'query': 'faster', 'format': 'same',
+                                    'gone': 'removed', 'new': 'added'})
+    
+    def test_every_suite_runs(self):
+        """Each benchmark's fixtures work and it yields positive timings"""
+        with patch.dict(os.environ, {'GROQ_API_KEY': 'test'}):
+            result = run_benchmarks(repeat=2, min_time=0.0001, warmup=0)
+        suites = {name.split('.')[0] for name in result['benchmarks']}
+        self.assertEqual(suites, {'chat', 'database', 'llm', 'auth', 'pages'})
+        for name, stats in result['benchmarks'].items():
+            self.assertEqual(len(stats['samples']), 2, name)
+            self.assertGreater(stats['median'], 0, name)
+        self.assertIn('commit', result['environment'])
+        json.dumps(result)
+
+
+class TestRetrievalBenchmark(unittest.TestCase):
+    """Test the retrieval recall/latency benchmark on a small corpus"""
+    
+    @classmethod
+    def setUpClass(cls):
+        memories, questions = make_corpus(2000, 50)
+        embedder = HashEmbedder(128)
+        cls.corpus, cls.queries = embedder.embed(memories), embedder.embed(questions)
+        cls.truth = exact_neighbours(cls.corpus, cls.queries, 10)
+    
+    def recall(self, index, k=10):
+        index.build(self.corpus)
+        retrieved = [index.search(query, k) for query in self.queries]
+        return recall_at_k(retrieved, self.truth, self.corpus, self.queries, k)
+    
+    def test_hash_embedder_matches_fake_provider(self):
+        text = "I parked on level three, near the lifts"
+        vector = HashEmbedder(64).embed([text])[0]
+        self.assertTrue(all(abs(a - b) < 1e-6 for a, b in zip(vector, hash_embedding(text, 64))))
+    
+    def test_exact_indexes_have_full_recall(self):
+        self.assertEqual(self.recall(create_index('flat')), 1.0)
+        # Probing every list is an exhaustive search
+        self.assertEqual(self.recall(create_index('ivf,nlist=16,nprobe=16')), 1.0)
+    
+    def test_approximate_indexes_trade_recall(self):
+        few, more = self.recall(create_index('ivf,nlist=64,nprobe=2')), self.recall(create_index('ivf,nlist=64,nprobe=16'))
+        self.assertLess(few, more)
+        self.assertGreater(self.recall(create_index('flat,quant=int8')), 0.9)
+        binary = create_index('flat,quant=binary')
+        rescored = create_index('flat,quant=binary,rescore=4')
+        self.assertLessEqual(self.recall(binary), self.recall(rescored))
+        self.assertLess(binary.nbytes, rescored.nbytes)
+    
+    def test_create_index_rejects_unknown_options(self):
+        with self.assertRaises(ValueError):
+            create_index('hnsw')
+        with self.assertRaises(ValueError):
+            create_index('flat,quant=pq')
+    
+    def test_provider_index(self):
+        """The provider target loads, queries and deletes a namespace through DBHandler"""
+        dimension = DATABASE_PROVIDERS['pinecone']['dimension']
+        store = VectorStore(dimension=dimension)
+        memories, questions = make_corpus(200, 10)
+        embedder = HashEmbedder(dimension)
+        corpus, queries = embedder.embed(memories), embedder.embed(questions)
+        index = ProviderIndex('pinecone', client=LocalPinecone(store))
+        index.build(corpus)
+        truth = exact_neighbours(corpus, queries, 5)
+        retrieved = [index.search(query, 5) for query in queries]
+        self.assertEqual(recall_at_k(retrieved, truth, corpus, queries, 5), 1.0)
+        index.close()
+        self.assertEqual(store.call('/stats', {})['namespaces'], {})
+    
+    def test_report_rows(self):
+        rows = run_benchmark(scales=[300], configs=['flat', 'ivf,nprobe=2'], ks=[1, 5], queries=20)
+        self.assertEqual([(row['target'], row['k']) for row in rows],
+                         [('flat', 1), ('flat', 5), ('ivf,nprobe=2', 1), ('ivf,nprobe=2', 5)])
+        for row in rows:
+            self.assertGreater(row['qps'], 0)
+            self.assertGreater(row['memory_bytes'], 0)
+
+
+def run_all_tests():
+    """Run all benchmarks module tests"""
+    print("=" * 60)
+    print("RUNNING BENCHMARKS MODULE TESTS")
+    print("=" * 60)
+
+    # Create test suite
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+
+    # Add all test classes
+    suite.addTests(loader.loadTestsFromTestCase(TestLoadHarness))
+    suite.addTests(loader.loadTestsFromTestCase(TestMicroBenchmarks))
+    suite.addTests(loader.loadTestsFromTestCase(TestRetrievalBenchmark))
+
+    # Run tests
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+
+    # Print summary
+    print("\n" + "=" * 60)
+    if result.wasSuccessful():
+        print("✅ ALL BENCHMARKS MODULE TESTS PASSED!")
+        print("Benchmarks module is ready for merge to develop branch.")
+    else:
+        print(f"❌ {len(result.failures)} FAILURE(S), {len(result.errors)} ERROR(S)")
+        print("Fix issues before merging to develop branch.")
+    print("=" * 60)
+
+    return result.wasSuccessful()
+
+
+if __name__ == "__main__":
+    run_all_tests()
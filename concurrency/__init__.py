@@ -0,0 +1,12 @@
+"""
+Concurrency Module - Shared helpers for concurrent request handling
+
+Callers import the primitive they need:
+    from concurrency.singleflight import SingleFlight
+    from concurrency.process import ProcessLocal
+"""
+
+from .singleflight import SingleFlight, AsyncSingleFlight, normalize_key
+from .process import ProcessLocal, ForkSafeLocal, reset_after_fork
+
+__all__ = ['SingleFlight', 'AsyncSingleFlight', 'normalize_key', 'ProcessLocal', 'ForkSafeLocal', 'reset_after_fork']
@@ -0,0 +1,76 @@
+"""
+Process-Local State
+
+Connection pools, HTTP sessions, SQLite connections and sockets must never be
+shared between a parent and a forked child: two processes writing to one socket
+interleave their requests, and SQLite connections are documented as unusable
+after fork. Objects holding them register here and are reset in every forked
+child, which then opens its own on first use. Plain `uvicorn --workers` spawns
+fresh interpreters and doesn't need this; `api.prefork` forks, and so does
+anything else that preloads before forking.
+"""
+
+import os
+import threading
+import weakref
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar('T')
+
+_registered = weakref.WeakSet()
+# Values a child dropped: still referenced so they're never closed (finalized) in the child
+_inherited = []
+
+
+def reset_after_fork(obj):
+    """Call `obj._after_fork()` in every forked child (obj is held weakly)"""
+    _registered.add(obj)
+    return obj
+
+
+def _reset_registered():
+    for obj in list(_registered):
+        obj._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_registered)
+
+
+class ProcessLocal(Generic[T]):
+    """One value per process, built by `factory` on first use; a forked child builds its own"""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._built = False
+        reset_after_fork(self)
+
+    def get(self) -> T:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._factory()
+                    self._built = True
+        return self._value
+
+    def _after_fork(self):
+        # The parent's lock may have been held by a thread that doesn't exist here
+        self._lock = threading.Lock()
+        if self._built:
+            _inherited.append(self._value)
+        self._value = None
+        self._built = False
+
+
+class ForkSafeLocal(threading.local):
+    """threading.local whose values are dropped in a forked child (e.g. per-thread connections)"""
+
+    def __init__(self):
+        reset_after_fork(self)
+
+    def _after_fork(self):
+        # Only the forking thread survives a fork, so its values are the only ones left
+        _inherited.append(dict(self.__dict__))
+        self.__dict__.clear()
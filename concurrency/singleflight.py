@@ -0,0 +1,100 @@
+"""
+Single-Flight
+
+Coalesces identical concurrent calls: the first caller for a key does the
+work, callers that arrive while it is running wait for and share its result
+(or its exception). Nothing is cached; once the call finishes the next caller
+starts a fresh one. Shared results are the same object for every caller, so
+treat them as read-only.
+
+`SingleFlight` is for blocking code running in threads (LLM and embedding
+calls), `AsyncSingleFlight` for coroutines on the event loop (whole requests).
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from monitoring.metrics import SINGLEFLIGHT_COALESCED
+
+
+def normalize_key(payload: Any) -> str:
+    """Key text that ignores incidental differences (surrounding/repeated whitespace, dict order)"""
+    if isinstance(payload, str):
+        return ' '.join(payload.split())
+    return json.dumps(payload, sort_keys=True, default=str)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe single-flight group for blocking calls"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLEFLIGHT_COALESCED.inc(group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Single-flight group for coroutines on one event loop"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        task = self._tasks.get(key)
+        if task is None:
+            # A task of its own, so one caller disconnecting doesn't cancel the others' result
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            SINGLEFLIGHT_COALESCED.inc(group=self.name)
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved; every waiter may have gone away
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
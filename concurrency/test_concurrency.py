@@ -0,0 +1,248 @@
+"""
+Concurrency Module Tests - Test everything in this module
+
+Run this to test all concurrency functionality before merging to develop.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency.singleflight import SingleFlight, AsyncSingleFlight, normalize_key
+from concurrency.process import ProcessLocal, ForkSafeLocal
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test coalescing of blocking calls across threads"""
+
+    def _run_concurrently(self, flight, key, fn, count=4):
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return [0.1, 0.2]
+
+        results, errors = self._run_concurrently(flight, 'pizza', slow)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[0.1, 0.2]] * 4)
+        self.assertEqual(errors, [])
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_error_shared_then_retried(self):
+        flight = SingleFlight('test')
+
+        def failing():
+            time.sleep(0.1)
+            raise RuntimeError("provider down")
+
+        results, errors = self._run_concurrently(flight, 'pizza', failing)
+        self.assertEqual(len(errors), 4)
+        # Nothing is cached: the next call runs again
+        self.assertEqual(flight.do('pizza', lambda: 'ok'), 'ok')
+
+    def test_normalize_key(self):
+        self.assertEqual(normalize_key("  what  did I\neat "), "what did I eat")
+        self.assertEqual(normalize_key({'b': 1, 'a': 2}), normalize_key({'a': 2, 'b': 1}))
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+    """Test coalescing of coroutines on the event loop"""
+
+    def test_duplicates_await_one_task(self):
+        async def scenario():
+            flight = AsyncSingleFlight('test')
+            calls = []
+
+            async def pipeline(q):
+                calls.append(q)
+                await asyncio.sleep(0.05)
+                return {"results": q}
+
+            results = await asyncio.gather(*(flight.do(('u1', 'food'), pipeline, 'food') for _ in range(3)))
+            other = await flight.do(('u2', 'food'), pipeline, 'food')
+            return calls, results, other, flight.in_flight()
+
+        calls, results, other, in_flight = asyncio.run(scenario())
+        self.assertEqual(calls, ['food', 'food'])  # Once for u1's three requests, once for u2
+        self.assertEqual(results, [{"results": "food"}] * 3)
+        self.assertEqual(other, {"results": "food"})
+        self.assertEqual(in_flight, 0)
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        async def scenario():
+            flight = AsyncSingleFlight('test')
+
+            async def pipeline():
+                await asyncio.sleep(0.05)
+                return 'answer'
+
+            first = asyncio.ensure_future(flight.do('k', pipeline))
+            second = asyncio.ensure_future(flight.do('k', pipeline))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(scenario()), 'answer')
+
+
+class TestHandlerCoalescing(unittest.TestCase):
+    """Test that the LLM handler coalesces identical concurrent prompts"""
+
+    @patch.dict(os.environ, {'GROQ_API_KEY': 'test_key', 'GROK_API_KEY': 'test_key'})
+    @patch('requests.Session.post')
+    def test_llm_process_input(self, mock_post):
+        from llm.llm import LLMHandler
+
+        def slow_post(*args, **kwargs):
+            time.sleep(0.1)
+            response = Mock()
+            response.json.return_value = {"choices": [{"message": {"content": "pizza"}}]}
+            return response
+
+        mock_post.side_effect = slow_post
+        handler = LLMHandler()
+        threads = [
+            threading.Thread(target=handler.process_input, args=('user', text), kwargs={'is_query': True})
+            for text in ('favorite food', ' favorite  food', 'favorite food')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(mock_post.call_count, 1)
+
+        # Different users never share a call
+        handler.process_input('other', 'favorite food', is_query=True)
+        self.assertEqual(mock_post.call_count, 2)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "needs fork")
+class TestProcessLocal(unittest.TestCase):
+    """Test that per-process state is rebuilt, not shared, in a forked child"""
+
+    def in_child(self, check) -> bool:
+        """Run `check` in a forked child; True if it returned True there"""
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ok = check()
+            except BaseException:
+                ok = False
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        return os.WEXITSTATUS(status) == 0
+
+    def test_process_local(self):
+        local = ProcessLocal(object)
+        parent_value = local.get()
+        self.assertIs(local.get(), parent_value)
+        self.assertTrue(self.in_child(lambda: local.get() is not parent_value and local.get() is local.get()))
+        self.assertIs(local.get(), parent_value)
+
+    def test_process_local_leaves_parent_value_open(self):
+        closed = []
+
+        class Connection:
+            def __del__(self):
+                closed.append(True)
+
+        # No reference outside the ProcessLocal, so dropping it in the child would finalize it
+        local = ProcessLocal(Connection)
+        local.get()
+        self.assertTrue(self.in_child(lambda: isinstance(local.get(), Connection) and not closed))
+        self.assertFalse(closed)
+
+    def test_fork_safe_local(self):
+        local = ForkSafeLocal()
+        local.conn = 'parent connection'
+        self.assertTrue(self.in_child(lambda: getattr(local, 'conn', None) is None))
+        self.assertEqual(local.conn, 'parent connection')
+
+    @patch.dict(os.environ, {'GROQ_API_KEY': 'test_key', 'GROK_API_KEY': 'test_key'})
+    def test_llm_session_per_process(self):
+        from llm.llm import LLMHandler
+        handler = LLMHandler()
+        session = handler.session
+        self.assertTrue(self.in_child(lambda: handler.session is not session))
+
+    def test_sqlite_user_store_reconnects_in_child(self):
+        from authentication.store import SQLiteUserStore
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteUserStore(os.path.join(tmp, 'users.db'))
+            asyncio.run(store.init_schema())
+            asyncio.run(store.create_user('parent', 'hash'))
+            with store.connection() as parent_conn:
+                pass
+
+            def child():
+                with store.connection() as conn:
+                    fresh = conn is not parent_conn
+                asyncio.run(store.create_user('child', 'hash'))
+                return fresh
+
+            self.assertTrue(self.in_child(child))
+            self.assertEqual(asyncio.run(store.list_users()), ['child', 'parent'])
+            asyncio.run(store.close())
+
+
+def run_all_tests():
+    """Run all concurrency module tests"""
+    print("=" * 60)
+    print("RUNNING CONCURRENCY MODULE TESTS")
+    print("=" * 60)
+
+    # Create test suite
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+
+    # Add all test classes
+    suite.addTests(loader.loadTestsFromTestCase(TestSingleFlight))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncSingleFlight))
+    suite.addTests(loader.loadTestsFromTestCase(TestHandlerCoalescing))
+    suite.addTests(loader.loadTestsFromTestCase(TestProcessLocal))
+
+    # Run tests
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+
+    # Print summary
+    print("\n" + "=" * 60)
+    if result.wasSuccessful():
+        print("✅ ALL CONCURRENCY MODULE TESTS PASSED!")
+        print("Concurrency module is ready for merge to develop branch.")
+    else:
+        print(f"❌ {len(result.failures)} FAILURE(S), {len(result.errors)} ERROR(S)")
+        print("Fix issues before merging to develop branch.")
+    print("=" * 60)
+
+    return result.wasSuccessful()
+
+
+if __name__ == "__main__":
+    run_all_tests()
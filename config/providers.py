@@ -93,4 +93,8 @@ EMBEDDING_CONFIG = {
     'cache_dir': os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache'),
     'batch_size': int(os.getenv('EMBEDDING_BATCH_SIZE', '32')),
     'normalize_embeddings': os.getenv('NORMALIZE_EMBEDDINGS', 'true').lower() == 'true',
+    # Local embedding server (database/embedding_server.py); empty socket = embed in-process
+    'server_socket': os.getenv('EMBEDDING_SOCKET', ''),
+    'server_threads': int(os.getenv('EMBEDDING_THREADS', os.cpu_count() or 1)),
+    'max_batch_wait_ms': float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '0')),
 }
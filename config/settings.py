@@ -10,6 +10,23 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+
+def worker_count(value) -> int:
+    """A worker count, or 'auto' for one per CPU available to this container"""
+    if str(value).strip().lower() != 'auto':
+        return max(1, int(value))
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    try:
+        # cgroup v2 CPU quota, e.g. "200000 100000" = 2 CPUs (the host may have many more)
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
 # Application settings
 APP_CONFIG = {
     'name': 'Capsule',
@@ -25,8 +42,10 @@ SERVER_CONFIG = {
     'host': os.getenv('HOST', '0.0.0.0'),
     'port': int(os.getenv('PORT', '8000')),
     'reload': os.getenv('RELOAD', 'false').lower() == 'true',
-    'workers': int(os.getenv('WORKERS', '1')),
+    'workers': worker_count(os.getenv('WORKERS', '1')),  # >1 (or 'auto'): run with `python -m api.prefork`
     'cors_origins': os.getenv('CORS_ORIGINS', '*').split(','),
+    # Proxies whose X-Forwarded-For/-Proto uvicorn trusts for the client address ('*' behind Render's proxy)
+    'forwarded_allow_ips': os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1'),
 }
 
 # Database settings
@@ -34,6 +53,12 @@ DATABASE_CONFIG = {
     'users_db_path': os.getenv('USERS_DB_PATH', 'users.db'),
     'backup_interval': int(os.getenv('BACKUP_INTERVAL', '3600')),  # seconds
     'max_connections': int(os.getenv('MAX_DB_CONNECTIONS', '10')),
+    'min_connections': int(os.getenv('MIN_DB_CONNECTIONS', '1')),
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),  # seconds to wait for a pooled connection
+    # 'tuned' = WAL + persistent per-thread connections, 'default' = stock SQLite settings
+    'sqlite_profile': os.getenv('SQLITE_PROFILE', 'tuned'),
+    'sqlite_busy_timeout_ms': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'sqlite_mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', '268435456')),  # 256MB
 }
 
 # Security settings
@@ -67,4 +92,24 @@ LOGGING_CONFIG = {
     'max_log_size': int(os.getenv('MAX_LOG_SIZE', '10485760')),  # 10MB
     'backup_count': int(os.getenv('LOG_BACKUP_COUNT', '5')),
     'log_format': os.getenv('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'),
+    'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+    'json': os.getenv('LOG_JSON', 'true').lower() == 'true',  # False uses log_format instead
+    'debug_sample_rate': float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.01')),  # Share of DEBUG records kept
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000')),  # Records beyond this are dropped, never blocked on
+}
+
+# Request tracing (see monitoring/tracing.py): one span per request stage, exported
+# in the background to a rotating JSONL file or an OTLP/HTTP (JSON) collector
+TRACING_CONFIG = {
+    'enabled': os.getenv('TRACING_ENABLED', 'false').lower() == 'true',
+    'exporter': os.getenv('TRACING_EXPORTER', 'jsonl'),  # 'jsonl' or 'otlp'
+    'file': os.getenv('TRACING_FILE', 'traces.jsonl'),  # One file per process when running several workers
+    'max_file_size': int(os.getenv('TRACING_MAX_FILE_SIZE', '10485760')),  # 10MB
+    'backup_count': int(os.getenv('TRACING_BACKUP_COUNT', '5')),
+    'otlp_endpoint': os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318'),
+    'service_name': os.getenv('OTEL_SERVICE_NAME', 'capsule'),
+    'sample_rate': float(os.getenv('TRACING_SAMPLE_RATE', '1.0')),  # Share of requests traced
+    'queue_size': int(os.getenv('TRACING_QUEUE_SIZE', '10000')),  # Spans beyond this are dropped, never blocked on
+    'batch_size': int(os.getenv('TRACING_BATCH_SIZE', '512')),
+    'flush_interval': float(os.getenv('TRACING_FLUSH_INTERVAL', '1.0')),  # Seconds between exports
 }
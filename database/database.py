@@ -4,7 +4,12 @@ import logging
 from datetime import datetime
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
-from config.providers import DATABASE_PROVIDERS as DB_PROVIDERS, DEFAULT_DATABASE_PROVIDER as DEFAULT_DB_PROVIDER
+from config.providers import DATABASE_PROVIDERS as DB_PROVIDERS, DEFAULT_DATABASE_PROVIDER as DEFAULT_DB_PROVIDER, EMBEDDING_CONFIG
+from monitoring.metrics import EMBEDDING_SECONDS, EMBEDDING_BATCH_SIZE, VECTOR_QUERY_SECONDS, VECTOR_UPSERT_SECONDS
+from monitoring.timing import stage
+from concurrency.process import ProcessLocal, reset_after_fork
+from concurrency.singleflight import SingleFlight
+from .embedding_server import EmbeddingClient
 
 # Only import if not using Pinecone inference
 USE_LOCAL_EMBEDDINGS = os.getenv('USE_LOCAL_EMBEDDINGS', 'false').lower() == 'true'
@@ -14,50 +19,97 @@ if USE_LOCAL_EMBEDDINGS:
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Concurrent requests embedding the same text share one embedding call
+_inflight_embeddings = SingleFlight('embed')
+
 class DBHandler:
     _model = None
     
-    def __init__(self, provider: str = DEFAULT_DB_PROVIDER):
+    def __init__(self, provider: str = DEFAULT_DB_PROVIDER, client=None):
+        """`client` replaces the provider client (e.g. the stand-in vector store in benchmarks/fakes.py)"""
         self.provider = provider
         if provider not in DB_PROVIDERS:
             raise ValueError(f"Provider '{provider}' not in DB_PROVIDERS")
         provider_config = DB_PROVIDERS[provider]
         if provider == 'pinecone':
             api_key = os.getenv(provider_config['api_key_env'])
-            if not api_key:
+            if not api_key and client is None:
                 raise ValueError(f"No {provider_config['api_key_env']}")
-            self.pc = Pinecone(api_key=api_key)
+            # Client and index hold HTTP pools: built per process so forked workers never share them
+            self._pinecone = ProcessLocal(lambda: client or Pinecone(api_key=api_key))
             self.index_name = provider_config['index_name']
             self.dimension = provider_config['dimension']
             self.metric = provider_config['metric']
             self.spec = ServerlessSpec(cloud=provider_config['cloud'], region=provider_config['region'])
             self._index = None
             self.use_inference = not USE_LOCAL_EMBEDDINGS
+            # Local embeddings from the shared embedding server instead of a model in this process
+            self.embedding_client = EmbeddingClient(EMBEDDING_CONFIG['server_socket']) if (
+                USE_LOCAL_EMBEDDINGS and EMBEDDING_CONFIG['server_socket']) else None
+            reset_after_fork(self)
         else:
             # TODO: Add new provider setup here, e.g., elif provider == 'chroma': self.client = chromadb.Client(provider_config['path'])
             raise NotImplementedError(f"Provider '{provider}' not implemented yet—add in __init__ using provider_config")
 
+    @property
+    def pc(self) -> Pinecone:
+        return self._pinecone.get()
+
+    def _after_fork(self):
+        self._index = None
+
     @property
     def model(self):
         if not USE_LOCAL_EMBEDDINGS:
             return None
-        if DBHandler._model is None:
-            DBHandler._model = SentenceTransformer('all-MiniLM-L6-v2')
-        return DBHandler._model
+        return DBHandler.load_model()
+
+    @classmethod
+    def load_model(cls):
+        """Load the shared SentenceTransformer (class-level, so a pre-fork master can load it for its workers)"""
+        if cls._model is None:
+            cls._model = SentenceTransformer('all-MiniLM-L6-v2')
+        return cls._model
     
-    def _embed_text(self, text: str):
-        """Generate embeddings using Pinecone inference or local model"""
+    @property
+    def embedding_backend(self) -> str:
         if self.use_inference:
-            # Use Pinecone's inference API - no local model needed
-            embeddings = self.pc.inference.embed(
-                model="multilingual-e5-large",
-                inputs=[text],
-                parameters={"input_type": "passage"}
-            )
-            return embeddings[0]['values']
-        else:
-            # Use local SentenceTransformer
-            return self.model.encode(text).tolist()
+            return 'inference'
+        return 'server' if self.embedding_client is not None else 'local'
+
+    def _embed_text(self, text: str):
+        """Generate embeddings using Pinecone inference, the local embedding server or a local model"""
+        return _inflight_embeddings.do((self.embedding_backend, text), self._compute_embedding, text)
+
+    def _compute_embedding(self, text: str):
+        backend = self.embedding_backend
+        EMBEDDING_BATCH_SIZE.observe(1, backend=backend)
+        with EMBEDDING_SECONDS.time(backend=backend), stage('embed', backend=backend) as span:
+            if self.use_inference:
+                # Use Pinecone's inference API - no local model needed
+                span.set(model="multilingual-e5-large")
+                embeddings = self.pc.inference.embed(
+                    model="multilingual-e5-large",
+                    inputs=[text],
+                    parameters={"input_type": "passage"}
+                )
+                return embeddings[0]['values']
+            elif self.embedding_client is not None:
+                # Shared embedding server batches this with other workers' requests
+                return self.embedding_client.embed_one(text)
+            else:
+                # Use local SentenceTransformer
+                span.set(model='all-MiniLM-L6-v2')
+                return self.model.encode(text).tolist()
+
+    def warm_up(self):
+        """Resolve the index, open its data-plane connection and load the embedding model"""
+        self.get_index().describe_index_stats()
+        if self.embedding_client is not None:
+            self.embedding_client.embed_one("warm up")  # Connects; fails early if the server isn't running
+        elif not self.use_inference:
+            # The first encode allocates buffers and picks kernels; pay for it here, not in a request
+            self.model.encode("warm up")
 
     def get_index(self):
         if self.provider == 'pinecone':
@@ -93,7 +145,9 @@ class DBHandler:
                     "memory": content,
                     "timestamp": timestamp
                 }
-            index.upsert(vectors=[(f"id_{user_id}_{uuid.uuid4()}", vector, metadata)], namespace=user_id)
+            with VECTOR_UPSERT_SECONDS.time(provider=self.provider), \
+                    stage('vector_upsert', provider=self.provider, index=self.index_name, vectors=1):
+                index.upsert(vectors=[(f"id_{user_id}_{uuid.uuid4()}", vector, metadata)], namespace=user_id)
         else:
             raise NotImplementedError(f"add_memory not implemented for '{self.provider}'")
 
@@ -110,13 +164,40 @@ class DBHandler:
                 text_content = ' '
             
             query_vector = self._embed_text(text_content)
-            results = index.query(vector=query_vector, top_k=top_k, include_metadata=True, namespace=user_id)
+            with VECTOR_QUERY_SECONDS.time(provider=self.provider), \
+                    stage('vector_query', provider=self.provider, index=self.index_name, top_k=top_k) as span:
+                results = index.query(vector=query_vector, top_k=top_k, include_metadata=True, namespace=user_id)
+                matches = getattr(results, 'matches', None)
+                span.set(matches=len(matches) if isinstance(matches, list) else 0)
             if not results or not hasattr(results, 'matches') or not results.matches:
                 return []
             return [match.metadata.get("memory", match.metadata.get("summary", "")) for match in results.matches if match.metadata]
         else:
             raise NotImplementedError(f"query_memories not implemented for '{self.provider}'")
 
+    def count_namespace(self, user_id: str) -> int:
+        """Number of vectors stored in a user's namespace"""
+        if self.provider == 'pinecone':
+            stats = self.get_index().describe_index_stats()
+            namespace = (getattr(stats, 'namespaces', None) or {}).get(user_id)
+            return getattr(namespace, 'vector_count', 0) if namespace else 0
+        else:
+            raise NotImplementedError(f"count_namespace not implemented for '{self.provider}'")
+
+    def delete_namespace(self, user_id: str) -> bool:
+        """Delete every vector in a user's namespace; False if it was already empty"""
+        if self.provider == 'pinecone':
+            try:
+                self.get_index().delete(delete_all=True, namespace=user_id)
+            except Exception as e:
+                # Pinecone answers 404 for namespaces that were never written to
+                if getattr(e, 'status', None) == 404:
+                    return False
+                raise
+            return True
+        else:
+            raise NotImplementedError(f"delete_namespace not implemented for '{self.provider}'")
+
 if __name__ == "__main__":
     from dotenv import load_dotenv
     load_dotenv()
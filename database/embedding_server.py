@@ -0,0 +1,289 @@
+"""
+Local Embedding Server
+
+One process owns the SentenceTransformer and embeds for every API worker on the
+host. Workers talk to it over a Unix domain socket (EMBEDDING_CONFIG['server_socket']).
+Requests that arrive while a batch is encoding are queued and encoded together
+in the next batch, up to EMBEDDING_CONFIG['batch_size'] texts. This is dynamic
+batching across all workers, with no added latency unless `max_batch_wait_ms`
+is set. Encoding runs on one executor thread; the model's own thread count is
+set by `server_threads`. The API workers stay free of the model and the GIL
+contention that comes with it.
+
+Wire format (big-endian lengths):
+    request: u32 count, then count x (u32 length, UTF-8 text)
+    reply:   u32 count, u32 dim, then count*dim native float32 values
+    error:   u32 0xFFFFFFFF, u32 length, UTF-8 message
+Vectors are written straight from the encoder's float32 buffer and read into a
+preallocated buffer on the client, with no per-float encoding on either side.
+
+Run:
+    EMBEDDING_SOCKET=/tmp/capsule-embed.sock python -m database.embedding_server
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency.process import ForkSafeLocal
+from config.providers import EMBEDDING_CONFIG
+from monitoring.logs import configure_logging, get_logger
+
+logger = get_logger('embedding_server')
+
+ERROR = 0xFFFFFFFF
+MAX_TEXTS = 1024  # Per request
+MAX_TEXT_BYTES = 1 << 20
+
+_U32 = struct.Struct('!I')
+_HEADER = struct.Struct('!II')
+
+
+class EmbeddingServerError(Exception):
+    """The server failed to embed a request (the message comes from the server)"""
+
+
+def _float32_buffer(vectors) -> Tuple[memoryview, int]:
+    """Flat float32 bytes and dimension for a numpy array or a list of lists"""
+    if hasattr(vectors, 'astype'):
+        vectors = vectors.astype('float32', copy=False)
+        if not vectors.flags['C_CONTIGUOUS']:
+            vectors = vectors.copy(order='C')
+        return memoryview(vectors).cast('B'), (vectors.shape[1] if vectors.ndim == 2 else 0)
+    dim = len(vectors[0]) if len(vectors) else 0
+    flat = array('f')
+    for vector in vectors:
+        flat.extend(vector)
+    return memoryview(flat).cast('B'), dim
+
+
+def load_sentence_transformer(threads: int = None) -> Callable[[List[str]], Sequence]:
+    """Load the model and return an encode function (imports torch only here)"""
+    threads = threads or EMBEDDING_CONFIG['server_threads']
+    os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    model = SentenceTransformer(EMBEDDING_CONFIG['model_name'])
+    batch_size = EMBEDDING_CONFIG['batch_size']
+
+    def encode(texts: List[str]):
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return encode
+
+
+class EmbeddingServer:
+    """Unix-socket server batching embedding requests from all workers"""
+
+    def __init__(self, path: str, encode: Callable[[List[str]], Sequence] = None,
+                 batch_size: int = None, max_batch_wait_ms: float = None):
+        self.path = path
+        self._encode = encode
+        self.batch_size = batch_size or EMBEDDING_CONFIG['batch_size']
+        self.max_batch_wait = (EMBEDDING_CONFIG['max_batch_wait_ms'] if max_batch_wait_ms is None else max_batch_wait_ms) / 1000
+        self.batches = 0
+        self.texts = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embed')
+        self._loop = None
+        self._stopped = None
+        self.ready = threading.Event()
+
+    async def serve(self):
+        if self._encode is None:
+            self._encode = load_sentence_transformer()
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._queue = asyncio.Queue()
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+        batcher = asyncio.create_task(self._batcher())
+        if threading.current_thread() is threading.main_thread():
+            self._loop.add_signal_handler(signal.SIGTERM, self._stopped.set)
+        logger.info("embedding server listening on %s (batch size %d)", self.path, self.batch_size)
+        self.ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            batcher.cancel()
+            server.close()
+            await server.wait_closed()
+            self._executor.shutdown(wait=False)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def stop(self):
+        """Stop serving (safe to call from any thread)"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (count,) = _U32.unpack(await reader.readexactly(4))
+                if count > MAX_TEXTS:
+                    raise ValueError(f"too many texts in one request ({count})")
+                texts = []
+                for _ in range(count):
+                    (size,) = _U32.unpack(await reader.readexactly(4))
+                    if size > MAX_TEXT_BYTES:
+                        raise ValueError(f"text too long ({size} bytes)")
+                    texts.append((await reader.readexactly(size)).decode('utf-8'))
+
+                future = self._loop.create_future()
+                await self._queue.put((texts, future))
+                try:
+                    payload, dim = await future
+                except Exception as e:
+                    message = str(e).encode('utf-8')
+                    writer.write(_HEADER.pack(ERROR, len(message)) + message)
+                else:
+                    writer.write(_HEADER.pack(count, dim))
+                    writer.write(payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Client closed the connection
+        except ValueError as e:
+            logger.warning("closing connection after bad request: %s", e)
+        finally:
+            writer.close()
+
+    async def _batcher(self):
+        while True:
+            batch = [await self._queue.get()]
+            total = len(batch[0][0])
+            # Everything that queued up while the last batch was encoding joins this one
+            deadline = self._loop.time() + self.max_batch_wait
+            while total < self.batch_size:
+                try:
+                    if self._queue.empty() and self.max_batch_wait > 0:
+                        item = await asyncio.wait_for(self._queue.get(), max(0, deadline - self._loop.time()))
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                batch.append(item)
+                total += len(item[0])
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch):
+        texts = [text for item_texts, _ in batch for text in item_texts]
+        try:
+            vectors = await self._loop.run_in_executor(self._executor, self._encode, texts) if texts else []
+            payload, dim = _float32_buffer(vectors)
+        except Exception as e:
+            logger.exception("embedding batch of %d failed", len(texts))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts += len(texts)
+        row_bytes = dim * 4
+        offset = 0
+        for item_texts, future in batch:
+            end = offset + len(item_texts) * row_bytes
+            if not future.done():
+                future.set_result((payload[offset:end], dim))  # Slices of one buffer, not copies
+            offset = end
+
+
+class EmbeddingClient:
+    """Blocking client with one connection per thread (requests from a thread are sequential)"""
+
+    def __init__(self, path: str, timeout: float = 30):
+        self.path = path
+        self.timeout = timeout
+        self._local = ForkSafeLocal()  # A forked worker opens its own connection
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    @staticmethod
+    def _recv_into(sock: socket.socket, view: memoryview):
+        while view:
+            received = sock.recv_into(view)
+            if not received:
+                raise ConnectionError("embedding server closed the connection")
+            view = view[received:]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        request = bytearray(_U32.pack(len(texts)))
+        for text in texts:
+            encoded = text.encode('utf-8')
+            request += _U32.pack(len(encoded))
+            request += encoded
+
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(request)
+                header = bytearray(_HEADER.size)
+                self._recv_into(sock, memoryview(header))
+                count, dim = _HEADER.unpack(header)
+                if count == ERROR:
+                    message = bytearray(dim)
+                    self._recv_into(sock, memoryview(message))
+                    raise EmbeddingServerError(message.decode('utf-8'))
+                body = bytearray(count * dim * 4)
+                self._recv_into(sock, memoryview(body))
+                floats = memoryview(body).cast('f')
+                return [floats[i * dim:(i + 1) * dim].tolist() for i in range(count)]
+            except (ConnectionError, FileNotFoundError, socket.timeout):
+                # Reconnect once: the server may have restarted since this thread last used it
+                self._reset()
+                if attempt:
+                    raise
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    def close(self):
+        self._reset()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve local embeddings to the API workers over a Unix socket")
+    parser.add_argument('--socket', default=EMBEDDING_CONFIG['server_socket'] or '/tmp/capsule-embed.sock')
+    parser.add_argument('--threads', type=int, default=EMBEDDING_CONFIG['server_threads'])
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_CONFIG['batch_size'])
+    parser.add_argument('--max-batch-wait-ms', type=float, default=EMBEDDING_CONFIG['max_batch_wait_ms'])
+    args = parser.parse_args()
+
+    configure_logging()
+    server = EmbeddingServer(args.socket, load_sentence_transformer(args.threads),
+                             batch_size=args.batch_size, max_batch_wait_ms=args.max_batch_wait_ms)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
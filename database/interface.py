@@ -5,6 +5,7 @@ This is what other modules import to interact with database functionality.
 """
 
 import logging
+import threading
 from typing import Union, List, Dict, Any
 from .database import DBHandler
 
@@ -15,7 +16,25 @@ class DatabaseService:
     Database service that provides a clean interface to other modules
     """
     def __init__(self):
-        self.db_handler = DBHandler()
+        # Built on first use (or by initialize() at startup), so importing the module stays cheap
+        self._db_handler = None
+        self._lock = threading.Lock()
+    
+    @property
+    def db_handler(self) -> DBHandler:
+        if self._db_handler is None:
+            with self._lock:
+                if self._db_handler is None:
+                    self._db_handler = DBHandler()
+        return self._db_handler
+    
+    @db_handler.setter
+    def db_handler(self, handler: DBHandler):
+        self._db_handler = handler
+    
+    def initialize(self) -> None:
+        """Construct the provider client now rather than on the first request"""
+        self.db_handler
     
     def add_memory(self, user_id: str, memory: Union[str, Dict[str, Any]]) -> None:
         """Add a memory for a user"""
@@ -33,6 +52,26 @@ class DatabaseService:
             logger.error(f"Failed to query memories for user {user_id}: {e}")
             raise
     
+    def count_namespace(self, user_id: str) -> int:
+        """Count the vectors stored for a user"""
+        try:
+            return self.db_handler.count_namespace(user_id)
+        except Exception as e:
+            logger.error(f"Failed to count vectors for user {user_id}: {e}")
+            raise
+    
+    def delete_namespace(self, user_id: str) -> bool:
+        """Delete all vectors stored for a user"""
+        try:
+            return self.db_handler.delete_namespace(user_id)
+        except Exception as e:
+            logger.error(f"Failed to delete namespace for user {user_id}: {e}")
+            raise
+    
+    def warm_up(self) -> None:
+        """Resolve the index handle and load the embedding model ahead of the first request"""
+        self.db_handler.warm_up()
+    
     def get_provider(self) -> str:
         """Get the database provider name"""
         return self.db_handler.provider
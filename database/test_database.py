@@ -4,8 +4,12 @@ Database Module Tests - Test everything in this module
 Run this to test all database functionality before merging to develop.
 """
 
+import asyncio
 import os
 import sys
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import Mock, patch
 
@@ -14,6 +18,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.database import DBHandler
 from database.interface import database_service
+from database.embedding_server import EmbeddingServer, EmbeddingClient, EmbeddingServerError
 from config.providers import DATABASE_PROVIDERS as DB_PROVIDERS
 
 
@@ -108,6 +113,100 @@ class TestDatabaseModule(unittest.TestCase):
         except Exception as e:
             self.fail(f"query_memories failed: {e}")
 
+    @patch.dict(os.environ, {'PINECONE_API_KEY': 'test_key'})
+    @patch('database.database.Pinecone')
+    def test_delete_namespace(self, mock_pinecone):
+        """Test deleting a user's namespace"""
+        mock_pinecone_instance = Mock()
+        mock_pinecone.return_value = mock_pinecone_instance
+        mock_index = Mock()
+        mock_pinecone_instance.Index.return_value = mock_index
+        mock_pinecone_instance.list_indexes.return_value.names.return_value = ['test-index']
+        
+        db = DBHandler()
+        self.assertTrue(db.delete_namespace("test_user"))
+        mock_index.delete.assert_called_once_with(delete_all=True, namespace="test_user")
+
+    @patch.dict(os.environ, {'PINECONE_API_KEY': 'test_key'})
+    @patch('database.database.Pinecone')
+    def test_warm_up(self, mock_pinecone):
+        """Warm-up resolves the index once and opens its connection"""
+        mock_pinecone_instance = Mock()
+        mock_pinecone.return_value = mock_pinecone_instance
+        mock_index = Mock()
+        mock_pinecone_instance.Index.return_value = mock_index
+        mock_pinecone_instance.list_indexes.return_value.names.return_value = ['test-index']
+        
+        db = DBHandler()
+        db.warm_up()
+        mock_index.describe_index_stats.assert_called_once()
+        db.get_index()
+        mock_pinecone_instance.list_indexes.assert_called_once()
+
+
+class TestEmbeddingServer(unittest.TestCase):
+    """Test the local embedding server and its client"""
+    
+    def setUp(self):
+        self.batches = []
+        
+        def encode(texts):
+            self.batches.append(len(texts))
+            if "fail" in texts:
+                raise RuntimeError("model exploded")
+            time.sleep(0.05)  # Long enough for concurrent requests to queue up
+            return [[float(len(text)), 0.5, -1.0] for text in texts]
+        
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = EmbeddingServer(os.path.join(self.tmp.name, "embed.sock"), encode, batch_size=32)
+        self.thread = threading.Thread(target=asyncio.run, args=(self.server.serve(),), daemon=True)
+        self.thread.start()
+        self.assertTrue(self.server.ready.wait(5))
+        self.client = EmbeddingClient(self.server.path, timeout=5)
+    
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.thread.join(5)
+        self.tmp.cleanup()
+    
+    def test_float32_round_trip(self):
+        self.assertEqual(self.client.embed(["abc", "hello"]), [[3.0, 0.5, -1.0], [5.0, 0.5, -1.0]])
+        self.assertEqual(self.client.embed_one("ßü"), [2.0, 0.5, -1.0])  # Arrives decoded: two characters, not four bytes
+    
+    def test_concurrent_requests_batched(self):
+        """Requests from several workers arriving during an encode share the next batch"""
+        results = {}
+        
+        def worker(i):
+            client = EmbeddingClient(self.server.path, timeout=5)
+            results[i] = client.embed_one("x" * i)
+            client.close()
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual({i: vector[0] for i, vector in results.items()}, {i: float(i) for i in range(1, 9)})
+        self.assertEqual(sum(self.batches), 8)
+        self.assertLess(len(self.batches), 8)
+    
+    def test_error_reported_and_connection_reused(self):
+        with self.assertRaises(EmbeddingServerError):
+            self.client.embed(["fail"])
+        self.assertEqual(self.client.embed_one("ok"), [2.0, 0.5, -1.0])
+    
+    @patch.dict(os.environ, {'PINECONE_API_KEY': 'test_key'})
+    @patch('database.database.Pinecone')
+    def test_db_handler_uses_server(self, mock_pinecone):
+        db = DBHandler()
+        db.use_inference = False
+        db.embedding_client = self.client
+        self.assertEqual(db.embedding_backend, 'server')
+        self.assertEqual(db._embed_text("pizza"), [5.0, 0.5, -1.0])
+
 
 class TestIntegrationWithRealAPI(unittest.TestCase):
     """Integration tests with real API (only if keys are available)"""
@@ -151,6 +250,7 @@ def run_all_tests():
     
     # Add all test classes
     suite.addTests(loader.loadTestsFromTestCase(TestDatabaseModule))
+    suite.addTests(loader.loadTestsFromTestCase(TestEmbeddingServer))
     suite.addTests(loader.loadTestsFromTestCase(TestIntegrationWithRealAPI))
     
     # Run tests
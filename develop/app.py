@@ -34,7 +34,7 @@ class CapsuleApplication:
     Main Capsule application that integrates all modules
     """
     
-    def __init__(self):
+    def __init__(self, check_services: bool = True):
         self.database = database_service
         self.llm = llm_service
         self.auth = auth_service
@@ -42,7 +42,8 @@ class CapsuleApplication:
         self.web = web_service
         
         print("🚀 Initializing Capsule Application")
-        self._check_services()
+        if check_services:
+            self._check_services()
     
     def _check_services(self):
         """Check health of all services"""
@@ -118,7 +119,7 @@ class CapsuleApplication:
                 },
                 'authentication': {
                     'status': self.auth.health_check() if hasattr(self.auth, 'health_check') else 'unknown',
-                    'users': len(getattr(self.auth, 'list_users', lambda: [])())
+                    'users': getattr(self.auth, 'count_users', lambda: 0)()
                 },
                 'api': {
                     'status': self.api.health_check() if hasattr(self.api, 'health_check') else 'unknown',
@@ -140,8 +141,7 @@ class CapsuleApplication:
         try:
             # 1. User Management
             print("1️⃣ User Management:")
-            users = self.auth.list_users()
-            print(f"   Current users: {len(users)}")
+            print(f"   Current users: {self.auth.count_users()}")
             
             # 2. Memory Storage (mock)
             print("\n2️⃣ Memory Storage:")
@@ -174,11 +174,9 @@ class CapsuleApplication:
 
 def create_app():
     """Create the Capsule application"""
-    # Initialize database tables before creating app
-    from web.web import init_user_db
-    init_user_db()
-
-    app_instance = CapsuleApplication()
+    # No health checks here: they call the LLM and vector store on every cold start.
+    # Services are built and the users table created by the API lifespan instead.
+    app_instance = CapsuleApplication(check_services=False)
     return app_instance.get_app()
 
 
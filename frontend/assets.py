@@ -0,0 +1,112 @@
+"""
+Frontend Asset Pipeline
+
+Builds the files found by `FrontendService._discover_static_files` into
+minified, content-hashed assets held in memory. A fingerprinted URL such as
+`/assets/app.3f2a9c1b7d.js` changes whenever the file does, so the API can
+serve it with `Cache-Control: immutable` and repeat visits make no requests.
+"""
+
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from monitoring.metrics import record_cache
+from .cache import CachedPage
+
+ASSET_URL_PREFIX = '/assets'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def minify_js(source: str) -> str:
+    """Conservative JS minifier: drops indentation, blank lines and whole-line comments.
+
+    Newlines are kept so automatic semicolon insertion still applies, and lines
+    inside multi-line template literals are left untouched.
+    """
+    out = []
+    in_block_comment = False
+    in_template = False
+    for line in source.splitlines():
+        if in_template:
+            out.append(line)
+            in_template = line.count('`') % 2 == 0
+            continue
+        stripped = line.strip()
+        if in_block_comment:
+            in_block_comment = '*/' not in stripped
+            continue
+        if not stripped or stripped.startswith('//'):
+            continue
+        if stripped.startswith('/*'):
+            in_block_comment = '*/' not in stripped
+            continue
+        out.append(stripped)
+        in_template = stripped.count('`') % 2 == 1
+    return '\n'.join(out) + '\n'
+
+
+def minify_css(source: str) -> str:
+    """Strip comments and collapse whitespace around CSS punctuation"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{}:;,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+MINIFIERS = {'js': minify_js, 'css': minify_css}
+
+
+class AssetPipeline:
+    """Minified, fingerprinted copies of the static JS/CSS files"""
+
+    def __init__(self, static_dir: Path, static_files: Dict[str, list]):
+        self.static_dir = Path(static_dir)
+        self.static_files = static_files
+        self._assets: Dict[str, CachedPage] = {}  # hashed name -> asset
+        self._urls: Dict[str, str] = {}  # /static/js/app.js -> /assets/app.<hash>.js
+        self._lock = threading.Lock()
+
+    def build(self) -> int:
+        """Minify and fingerprint every discovered asset; returns the number built"""
+        assets, urls = {}, {}
+        for file_type, minify in MINIFIERS.items():
+            for filename in self.static_files.get(file_type, []):
+                path = self.static_dir / file_type / filename
+                asset = CachedPage(path, transform=lambda body, m=minify: m(body.decode('utf-8')).encode('utf-8'))
+                hashed_name = f"{path.stem}.{asset.digest[:10]}{path.suffix}"
+                assets[hashed_name] = asset
+                urls[f"/static/{file_type}/{filename}"] = f"{ASSET_URL_PREFIX}/{hashed_name}"
+        with self._lock:
+            self._assets, self._urls = assets, urls
+        return len(assets)
+
+    def get(self, hashed_name: str) -> Optional[CachedPage]:
+        """Get a built asset by its fingerprinted file name"""
+        asset = self._assets.get(hashed_name)
+        record_cache('assets', asset is not None)
+        return asset
+
+    def url_for(self, file_type: str, filename: str) -> Optional[str]:
+        """Fingerprinted URL of a static file, e.g. url_for('js', 'app.js')"""
+        return self._urls.get(f"/static/{file_type}/{filename}")
+
+    def rewrite_html(self, body: bytes) -> bytes:
+        """Point `/static/...` references in an HTML page at the fingerprinted URLs"""
+        html = body.decode('utf-8')
+        for original, hashed in self._urls.items():
+            html = html.replace(f'"{original}"', f'"{hashed}"').replace(f"'{original}'", f"'{hashed}'")
+        return html.encode('utf-8')
+
+    def refresh(self) -> bool:
+        """Rebuild if any source file changed; returns True when URLs changed"""
+        try:
+            stale = any(asset.path.stat().st_mtime != asset.mtime for asset in self._assets.values())
+        except FileNotFoundError:
+            stale = True
+        if not stale:
+            return False
+        old_urls = dict(self._urls)
+        self.build()
+        return self._urls != old_urls
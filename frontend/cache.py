@@ -0,0 +1,160 @@
+"""
+Static Page Cache
+
+Keeps the HTML components in memory so page requests never touch the disk.
+Each page is read once, hashed for a strong ETag and precompressed (gzip, and
+brotli when the `brotli` package is installed). In development the cache can
+poll the files and reload the ones that changed.
+"""
+
+import gzip
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from monitoring.logs import get_logger
+from monitoring.metrics import record_cache
+
+logger = get_logger('frontend')
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+class CachedPage:
+    """One file (an HTML page or a built asset) with its precompressed variants"""
+
+    def __init__(self, path: Path, body: Optional[bytes] = None, transform: Optional[Callable[[bytes], bytes]] = None):
+        self.path = path
+        self.mtime = path.stat().st_mtime
+        if body is None:
+            body = path.read_bytes()
+        if transform is not None:
+            body = transform(body)
+        self.digest = hashlib.sha256(body).hexdigest()
+        digest = self.digest[:32]
+        # Strong ETags must differ per content-coding, so each variant gets a suffix
+        self.variants = {'identity': (body, f'"{digest}"')}
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def select(self, accept_encoding: str = '') -> tuple:
+        """Pick the best variant for an Accept-Encoding header -> (encoding, body, etag)"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                body, etag = self.variants[encoding]
+                return encoding, body, etag
+        body, etag = self.variants['identity']
+        return 'identity', body, etag
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True when an If-None-Match header names any variant of this page"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return bool(candidates & self.etags)
+
+
+class StaticPageCache:
+    """In-memory cache of `components/*.html`, loaded once at startup
+
+    When an AssetPipeline is given, asset references in the HTML are rewritten
+    to their fingerprinted URLs, and a refresh rebuilds changed assets too.
+    """
+
+    def __init__(self, components_dir: Path, assets=None):
+        self.components_dir = Path(components_dir)
+        self.assets = assets
+        self._pages: Dict[str, CachedPage] = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def load(self) -> int:
+        """(Re)load every HTML component; returns the number of pages cached"""
+        pages = {}
+        if self.components_dir.exists():
+            for path in self.components_dir.glob("*.html"):
+                pages[path.name] = self._load_page(path)
+        with self._lock:
+            self._pages = pages
+        return len(pages)
+
+    def get(self, name: str) -> Optional[CachedPage]:
+        """Get a cached page by file name, or None if it does not exist"""
+        page = self._pages.get(name)
+        record_cache('pages', page is not None)
+        return page
+
+    def refresh(self) -> list:
+        """Reload pages whose files changed, appeared or disappeared; returns their names"""
+        current = {p.name: p for p in self.components_dir.glob("*.html")} if self.components_dir.exists() else {}
+        changed = []
+        with self._lock:
+            pages = dict(self._pages)
+            if self.assets is not None and self.assets.refresh():
+                pages = {}  # Asset URLs changed, so every page must be rewritten
+            for name in set(pages) - set(current):
+                del pages[name]
+                changed.append(name)
+            for name, path in current.items():
+                try:
+                    if name not in pages or path.stat().st_mtime != pages[name].mtime:
+                        pages[name] = self._load_page(path)
+                        changed.append(name)
+                except FileNotFoundError:
+                    pages.pop(name, None)
+                    changed.append(name)
+            self._pages = pages
+        return changed
+
+    def _load_page(self, path: Path) -> CachedPage:
+        transform = self.assets.rewrite_html if self.assets is not None else None
+        return CachedPage(path, transform=transform)
+
+    def start_watching(self, interval: float = 1.0):
+        """Poll the components directory in a daemon thread (development only)"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                changed = self.refresh()
+                if changed:
+                    logger.info("reloaded frontend pages", extra={"pages": sorted(changed)})
+
+        self._watcher = threading.Thread(target=watch, name="page-cache-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
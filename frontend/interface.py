@@ -7,6 +7,9 @@ This is what other modules import to interact with frontend functionality.
 import os
 from pathlib import Path
 
+from .assets import AssetPipeline
+from .cache import StaticPageCache
+
 class FrontendService:
     """
     Frontend service that provides a clean interface to other modules
@@ -17,6 +20,10 @@ class FrontendService:
         self.components_dir = self.frontend_dir / "components"
         self.static_dir = self.frontend_dir / "static"
         self.static_files = self._discover_static_files()
+        self.assets = AssetPipeline(self.static_dir, self.static_files)
+        self.assets.build()
+        self.page_cache = StaticPageCache(self.components_dir, assets=self.assets)
+        self.page_cache.load()
     
     def _discover_static_files(self):
         """Discover all static frontend files"""
@@ -57,6 +64,14 @@ class FrontendService:
         else:
             raise ValueError(f"Unknown file type: {file_type}")
     
+    def get_page(self, name):
+        """Get a cached HTML component (see cache.CachedPage), or None"""
+        return self.page_cache.get(name)
+    
+    def get_asset(self, hashed_name):
+        """Get a minified, fingerprinted asset (e.g. 'app.3f2a9c1b7d.js'), or None"""
+        return self.assets.get(hashed_name)
+    
     def list_static_files(self):
         """List all available static files"""
         return self.static_files
@@ -239,6 +239,7 @@ class CapsuleApp {
         }
         
         const finalOptions = { ...defaultOptions, ...options };
+        finalOptions.headers = { ...defaultOptions.headers, ...(options.headers || {}) };
         
         try {
             const response = await fetch(url, finalOptions);
@@ -368,6 +369,11 @@ class CapsuleApp {
         setTimeout(() => input.classList.remove('shake'), 500);
     }
     
+    newIdempotencyKey() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+    
     async addMemory(memory) {
         try {
             this.clearOutput();
@@ -389,9 +395,11 @@ class CapsuleApp {
             const formData = new FormData();
             formData.append('memory', contextualMemory);
             
+            // Same key on any retry of this submission, so the server stores the memory once
             await this.makeRequest('/add', {
                 method: 'POST',
-                body: formData
+                body: formData,
+                headers: { 'Idempotency-Key': this.newIdempotencyKey() }
             });
             
             this.showStatus('memory saved.');
@@ -4,6 +4,8 @@ LLM Module Interface - Clean abstraction layer for other modules
 This is what other modules import to interact with LLM functionality.
 """
 
+import threading
+
 from .llm import LLMHandler
 
 class LLMService:
@@ -11,12 +13,34 @@ class LLMService:
     LLM service that provides a clean interface to other modules
     """
     def __init__(self):
-        self.llm_handler = LLMHandler()
+        # Built on first use (or by initialize() at startup), so importing the module stays cheap
+        self._llm_handler = None
+        self._lock = threading.Lock()
+    
+    @property
+    def llm_handler(self) -> LLMHandler:
+        if self._llm_handler is None:
+            with self._lock:
+                if self._llm_handler is None:
+                    self._llm_handler = LLMHandler()
+        return self._llm_handler
+    
+    @llm_handler.setter
+    def llm_handler(self, handler: LLMHandler):
+        self._llm_handler = handler
+    
+    def initialize(self) -> None:
+        """Construct the provider handler now rather than on the first request"""
+        self.llm_handler
     
     def process_input(self, user_id: str, input_text, is_query: bool = False, db_provider: str = None):
         """Process input through the LLM"""
         return self.llm_handler.process_input(user_id, input_text, is_query, db_provider)
     
+    def warm_up(self):
+        """Open the provider connection ahead of the first request"""
+        self.llm_handler.warm_up()
+    
     def get_provider(self):
         """Get the LLM provider name"""
         return self.llm_handler.provider
@@ -4,12 +4,23 @@ from typing import Dict, Any
 import json
 from dotenv import load_dotenv
 from config.providers import LLM_PROVIDERS as PROVIDERS, DEFAULT_LLM_PROVIDER as DEFAULT_PROVIDER
+from monitoring.metrics import LLM_REQUEST_SECONDS
+from monitoring.timing import stage
+from concurrency.process import ProcessLocal
+from concurrency.singleflight import SingleFlight, normalize_key
 
 load_dotenv()
 
+# Identical concurrent prompts (double-clicks, several tabs) share one provider call
+_inflight = SingleFlight('llm')
+
 class LLMHandler:
-    def __init__(self, provider: str = DEFAULT_PROVIDER):
+    def __init__(self, provider: str = DEFAULT_PROVIDER, session: requests.Session = None):
+        """`session` replaces the HTTP session (e.g. a canned one in benchmarks)"""
         self.provider = provider
+        # Keep-alive pool: one TLS handshake per connection instead of one per call.
+        # One per process, so forked workers never share a connection
+        self._session = ProcessLocal(lambda: session or requests.Session())
         if provider not in PROVIDERS:
             raise ValueError(f"Provider '{provider}' not in PROVIDERS")
         provider_config = PROVIDERS[provider]
@@ -25,7 +36,19 @@ class LLMHandler:
             # TODO: Add new provider setup here, e.g., elif provider == 'anthropic': self.client = Anthropic(os.getenv(provider_config['api_key_env']))
             raise NotImplementedError(f"Provider '{provider}' not implemented yet—add in __init__ using provider_config")
 
+    @property
+    def session(self) -> requests.Session:
+        return self._session.get()
+
+    def warm_up(self):
+        """Open a pooled connection to the provider (DNS, TCP, TLS) before the first real call"""
+        self.session.head(self.base_url, timeout=10)
+
     def process_input(self, user_id: str, input_text: str | Dict[str, Any], is_query: bool = False, db_provider: str = None) -> str:
+        key = (self.provider, user_id, normalize_key(input_text), is_query, db_provider)
+        return _inflight.do(key, self._process_input, user_id, input_text, is_query, db_provider)
+
+    def _process_input(self, user_id: str, input_text: str | Dict[str, Any], is_query: bool = False, db_provider: str = None) -> str:
         # Parse input: str or MCP dict (future-ready)
         if isinstance(input_text, str):
             content = input_text
@@ -37,10 +60,12 @@ class LLMHandler:
         if self.provider in ['grok', 'groq']:
             # Check if this is a natural language response request (contains "Answer this question")
             if "Answer this question:" in content:
+                mode = 'answer'
                 # Use a different system prompt for natural language responses
                 system_prompt = "You are Capsule, a helpful memory assistant. When answering questions about the user's memories, ALWAYS respond in second person ('you', 'your') as if speaking directly to the user. Never use first person ('I', 'my'). Answer naturally and directly based on the provided information. Do not return JSON or structured data."
                 prompt = content
             else:
+                mode = 'query' if is_query else 'refine'
                 # Use the original system prompt for data processing
                 system_prompt = self.system_prompt
                 prompt = f"Optimize this query for search in {db_provider or 'abstracted'} storage in user {user_id}'s sovereign DB: {content}" if is_query else f"Refine this input for {db_provider or 'abstracted'} storage in user {user_id}'s sovereign DB: {content}"
@@ -53,9 +78,14 @@ class LLMHandler:
                 ],
                 "temperature": 0.7
             }
-            response = requests.post(self.base_url, headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}, json=payload)
-            response.raise_for_status()
-            response_data = response.json()
+            with LLM_REQUEST_SECONDS.time(provider=self.provider, mode=mode), \
+                    stage(f"llm_{mode}", provider=self.provider, model=self.model) as span:
+                response = self.session.post(self.base_url, headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}, json=payload)
+                response.raise_for_status()
+                response_data = response.json()
+                usage = response_data.get("usage")
+                if isinstance(usage, dict):
+                    span.set(**{key: usage[key] for key in ("prompt_tokens", "completion_tokens", "total_tokens") if key in usage})
             content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
             if not content:
                 return {'content': 'No response from LLM', 'tags': [], 'summary': 'No response'}
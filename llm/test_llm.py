@@ -46,7 +46,7 @@ class TestLLMModule(unittest.TestCase):
             self.fail(f"LLMHandler initialization failed: {e}")
     
     @patch.dict(os.environ, {'GROK_API_KEY': 'test_key'})
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_process_input_storage(self, mock_post):
         """Test processing input for storage"""
         # Mock successful response
@@ -67,7 +67,7 @@ class TestLLMModule(unittest.TestCase):
             self.fail(f"process_input for storage failed: {e}")
     
     @patch.dict(os.environ, {'GROK_API_KEY': 'test_key'})
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_process_input_query(self, mock_post):
         """Test processing input for queries"""
         # Mock successful response
@@ -88,7 +88,7 @@ class TestLLMModule(unittest.TestCase):
             self.fail(f"process_input for query failed: {e}")
     
     @patch.dict(os.environ, {'GROK_API_KEY': 'test_key'})
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_natural_language_response(self, mock_post):
         """Test natural language response generation"""
         # Mock successful response
@@ -0,0 +1,12 @@
+"""
+Monitoring Module - Metrics for the whole application
+
+Instrumented modules import the metric they record into:
+    from monitoring.metrics import LLM_REQUEST_SECONDS
+
+The API serves everything at /metrics when FEATURE_FLAGS['enable_metrics'] is on.
+"""
+
+from .metrics import registry
+
+__all__ = ['registry']
@@ -0,0 +1,174 @@
+"""
+Structured Logging
+
+Request handlers log through `logging.getLogger('capsule.<area>')`. Records
+are put on a bounded in-memory queue by a QueueHandler and written by a
+background QueueListener thread, so the event loop never waits on stdout or
+disk. Output is one JSON object per line (file rotated per LOGGING_CONFIG),
+every record carries the request's correlation id, and high-volume DEBUG
+events are sampled.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from config.settings import LOGGING_CONFIG, SERVER_CONFIG
+
+ROOT_LOGGER = 'capsule'
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_request_id: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(area: str) -> logging.Logger:
+    """Logger for one area of the app, e.g. get_logger('api') -> 'capsule.api'"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{area}")
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Bind a correlation id to the current request context (reusing a sane incoming one)"""
+    request_id = incoming if incoming and len(incoming) <= 64 and incoming.isprintable() else uuid.uuid4().hex
+    _request_id.set(request_id)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the correlation id while still on the caller's thread/task"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps only a fraction of DEBUG records; INFO and above always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed with `extra=`"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Merge args and render the traceback now; formatting happens on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def per_worker_path(path: str) -> str:
+    """`name.<pid>.ext` when several workers run: one rotating file per process, since
+    processes rotating a shared file lose and truncate each other's lines"""
+    if SERVER_CONFIG['workers'] <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def configure_logging(level: str = None, log_file: str = None) -> logging.Logger:
+    """Route the `capsule` loggers through a background queue (idempotent)"""
+    global _listener
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return logger
+
+    formatter = JSONFormatter() if LOGGING_CONFIG['json'] else logging.Formatter(LOGGING_CONFIG['log_format'])
+    handlers = []
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+    log_file = LOGGING_CONFIG['log_file'] if log_file is None else log_file
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            per_worker_path(log_file),
+            maxBytes=LOGGING_CONFIG['max_log_size'],
+            backupCount=LOGGING_CONFIG['backup_count'],
+            encoding='utf-8',
+            delay=True
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOGGING_CONFIG['queue_size']))
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(DebugSamplingFilter(LOGGING_CONFIG['debug_sample_rate']))
+
+    logger.setLevel(level or LOGGING_CONFIG['level'])
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            logger.removeHandler(handler)
@@ -0,0 +1,218 @@
+"""
+Metrics
+
+A small, dependency-free metrics registry that renders the Prometheus text
+exposition format. Recording is a lock plus a bisect, and a no-op when
+FEATURE_FLAGS['enable_metrics'] is off, so instrumentation can stay on hot
+paths permanently.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Tuple
+
+from config.settings import FEATURE_FLAGS
+
+# Latency buckets in seconds, from sub-millisecond DB reads to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, registry, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            series = dict(self._series)
+        return self.header() + [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                                for key, value in sorted(series.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram"""
+    kind = 'histogram'
+
+    def __init__(self, registry, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> list:
+        with self._lock:
+            series = {key: (list(counts), total, n) for key, (counts, total, n) in self._series.items()}
+        lines = self.header()
+        for key, (counts, total, n) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound)) if bound != math.inf else "+Inf"}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {n}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose samples are read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, registry, name: str, help: str, labelnames: Iterable[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(registry, name, help, labelnames)
+        self.collect = collect
+
+    def render(self) -> list:
+        return self.header() + [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                                for key, value in sorted(self.collect().items())]
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them for /metrics"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str], collect: Callable) -> Gauge:
+        return self._register(Gauge(self, name, help, labelnames, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+registry = MetricsRegistry(enabled=FEATURE_FLAGS['enable_metrics'])
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'capsule_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+LLM_REQUEST_SECONDS = registry.histogram(
+    'capsule_llm_request_duration_seconds', 'LLM call latency by provider and mode', ('provider', 'mode'))
+EMBEDDING_SECONDS = registry.histogram(
+    'capsule_embedding_duration_seconds', 'Embedding latency by backend', ('backend',))
+EMBEDDING_BATCH_SIZE = registry.histogram(
+    'capsule_embedding_batch_size', 'Texts embedded per call', ('backend',), buckets=SIZE_BUCKETS)
+VECTOR_QUERY_SECONDS = registry.histogram(
+    'capsule_vector_query_duration_seconds', 'Vector store query latency', ('provider',))
+VECTOR_UPSERT_SECONDS = registry.histogram(
+    'capsule_vector_upsert_duration_seconds', 'Vector store upsert latency', ('provider',))
+AUTH_DB_SECONDS = registry.histogram(
+    'capsule_auth_db_duration_seconds', 'Time spent in the user database, including pool waits', ('backend',))
+CACHE_REQUESTS = registry.counter(
+    'capsule_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ('cache', 'result'))
+SINGLEFLIGHT_COALESCED = registry.counter(
+    'capsule_singleflight_coalesced_total', 'Calls that shared an identical in-flight call instead of repeating it', ('group',))
+
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, list] = {}
+    with CACHE_REQUESTS._lock:
+        for (cache, result), value in CACHE_REQUESTS._series.items():
+            hits_total = totals.setdefault(cache, [0, 0])
+            hits_total[1] += value
+            if result == 'hit':
+                hits_total[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+CACHE_HIT_RATIO = registry.gauge(
+    'capsule_cache_hit_ratio', 'Share of cache lookups that hit', ('cache',), _cache_hit_ratios)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
@@ -0,0 +1,192 @@
+"""
+Profiling
+
+Looks inside a running worker without redeploying it. Output is collapsed
+stacks, one `root;caller;callee weight` line per distinct stack, which
+flamegraph.pl, speedscope and inferno read directly.
+
+SamplingProfiler: a daemon thread wakes every `interval` seconds and records
+every other thread's stack from sys._current_frames(). Nothing is hooked into
+the profiled threads, so the cost is one stack walk per thread per sample. In
+'cpu' mode a thread only counts when its CPU clock moved since the previous
+sample: the event loop waiting in select and idle executor threads drop out,
+and the profile shows where CPU time goes. 'wall' mode counts every thread.
+
+AllocationProfiler: tracemalloc for a window. Weights are the bytes
+allocated during the window and still alive at its end.
+
+One profile runs per process at a time; a second start raises ProfilerBusy.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+MODES = ('cpu', 'wall', 'alloc')
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Another profile is already running in this process"""
+
+
+def _short_path(path: str) -> str:
+    """Repo-relative for our code, package-relative for libraries, file name for the stdlib"""
+    if path.startswith(ROOT):
+        return path[len(ROOT):]
+    marker = 'site-packages' + os.sep
+    index = path.rfind(marker)
+    return path[index + len(marker):] if index >= 0 else os.path.basename(path)
+
+
+def render_collapsed(stacks: Counter) -> str:
+    """One `frame;frame;frame weight` line per stack, heaviest first"""
+    return ''.join(f"{stack} {weight}\n" for stack, weight in stacks.most_common())
+
+
+class _Exclusive:
+    def _acquire(self):
+        if not _busy.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running in this process")
+
+    def _release(self):
+        _busy.release()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class SamplingProfiler(_Exclusive):
+    """Periodic stack samples of all threads, counted per distinct stack"""
+
+    def __init__(self, interval: float = 0.01, mode: str = 'cpu'):
+        if mode not in ('cpu', 'wall'):
+            raise ValueError(f"Unknown sampling mode '{mode}'")
+        # Per-thread CPU clocks are POSIX-only; elsewhere every thread counts
+        self.mode = mode if hasattr(time, 'pthread_getcpuclockid') else 'wall'
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self._labels = {}  # code object -> frame label
+        self._cpu_ns = {}  # thread ident -> CPU clock at the previous sample
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._acquire()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self._started
+        self._release()
+
+    def _run(self):
+        own = threading.get_ident()
+        due = time.perf_counter()
+        while not self._stop.is_set():
+            self._sample(own)
+            due += self.interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                due = time.perf_counter()  # Fell behind: skip the missed samples rather than burst
+
+    def _sample(self, own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        self.samples += 1
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (self.mode == 'cpu' and not self._ran(ident)):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+                stack.append(label)
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(';', ','))  # The thread is the root frame
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def _ran(self, ident: int) -> bool:
+        """Whether the thread used CPU since the previous sample"""
+        try:
+            now = time.clock_gettime_ns(time.pthread_getcpuclockid(ident))
+        except OSError:  # The thread exited after the frame snapshot
+            return False
+        previous = self._cpu_ns.get(ident)
+        self._cpu_ns[ident] = now
+        return previous is not None and now > previous
+
+    def collapsed(self) -> str:
+        return render_collapsed(self.stacks)
+
+    def summary(self) -> Dict:
+        return {'mode': self.mode, 'samples': self.samples, 'seconds': round(self.seconds, 3),
+                'interval_ms': self.interval * 1000}
+
+
+class AllocationProfiler(_Exclusive):
+    """Memory allocated during a window and still held at its end, by allocation stack"""
+
+    def __init__(self, frames: int = 25):
+        self.mode = 'alloc'
+        self.frames = frames
+        self.stacks = Counter()
+        self.seconds = 0.0
+        self._baseline = None
+
+    def start(self):
+        self._acquire()
+        self._started = time.perf_counter()
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start(self.frames)
+        else:
+            # Someone else (PYTHONTRACEMALLOC) is tracing already: report only what grew during the window
+            self._baseline = tracemalloc.take_snapshot()
+
+    def stop(self):
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            self.seconds = time.perf_counter() - self._started
+        finally:
+            if self._owns_tracing:
+                tracemalloc.stop()
+            self._release()
+        self.stacks = self._group(snapshot)
+
+    def _group(self, snapshot) -> Counter:
+        """Bytes per allocation stack (frames are `file:line`; tracemalloc keeps no function names)"""
+        if self._baseline is not None:
+            stats = [(stat.traceback, stat.size_diff)
+                     for stat in snapshot.compare_to(self._baseline, 'traceback') if stat.size_diff > 0]
+        else:
+            stats = [(stat.traceback, stat.size) for stat in snapshot.statistics('traceback')]
+        stacks = Counter()
+        for traceback, size in stats:
+            stacks[';'.join(f"{_short_path(frame.filename)}:{frame.lineno}" for frame in traceback)] += size
+        return stacks
+
+    def collapsed(self) -> str:
+        return render_collapsed(self.stacks)
+
+    def summary(self) -> Dict:
+        return {'mode': self.mode, 'bytes': sum(self.stacks.values()), 'frames': self.frames,
+                'seconds': round(self.seconds, 3)}
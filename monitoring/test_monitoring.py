@@ -0,0 +1,421 @@
+"""
+Monitoring Module Tests - Test everything in this module
+
+Run this to test all monitoring functionality before merging to develop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from authentication.store import PostgresUserStore, SQLiteUserStore
+from monitoring import logs
+from monitoring.profiler import AllocationProfiler, ProfilerBusy, SamplingProfiler
+from monitoring.timing import stage
+from monitoring.tracing import (
+    Collector, JSONLExporter, MemoryExporter, OTLPExporter, Tracer, analyze, from_otlp, load_spans, to_otlp, tracer
+)
+from monitoring.metrics import (
+    MetricsRegistry, registry, record_cache,
+    LLM_REQUEST_SECONDS, AUTH_DB_SECONDS, CACHE_REQUESTS
+)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test metric types and the text exposition format"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry(enabled=True)
+
+    def test_histogram_render(self):
+        """Buckets are cumulative and end with +Inf, _sum and _count"""
+        histogram = self.registry.histogram('test_seconds', 'Test latency', ('route',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, route='/a')
+        histogram.observe(0.5, route='/a')
+        histogram.observe(5, route='/a')
+
+        text = self.registry.render()
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="/a",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum{route="/a"} 5.55', text)
+        self.assertIn('test_seconds_count{route="/a"} 3', text)
+
+    def test_counter_and_label_escaping(self):
+        counter = self.registry.counter('test_total', 'Test counter', ('name',))
+        counter.inc(name='a "quoted" value')
+        counter.inc(2, name='a "quoted" value')
+        self.assertIn('test_total{name="a \\"quoted\\" value"} 3', self.registry.render())
+
+    def test_disabled_is_noop(self):
+        """Nothing is recorded while metrics are switched off"""
+        histogram = self.registry.histogram('off_seconds', 'Off')
+        self.registry.enabled = False
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count(), 0)
+
+    def test_duplicate_name_rejected(self):
+        self.registry.counter('dup_total', 'Dup')
+        with self.assertRaises(ValueError):
+            self.registry.counter('dup_total', 'Dup')
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test that the handlers record into the shared registry"""
+
+    def setUp(self):
+        self._enabled = registry.enabled
+        registry.enabled = True
+        registry.reset()
+
+    def tearDown(self):
+        registry.enabled = self._enabled
+        registry.reset()
+
+    @patch.dict(os.environ, {'GROQ_API_KEY': 'test_key', 'GROK_API_KEY': 'test_key'})
+    @patch('requests.Session.post')
+    def test_llm_latency_by_mode(self, mock_post):
+        from llm.llm import LLMHandler
+        mock_response = Mock()
+        mock_response.json.return_value = {"choices": [{"message": {"content": "answer"}}]}
+        mock_post.return_value = mock_response
+
+        handler = LLMHandler()
+        handler.process_input('user', 'pizza', is_query=True)
+        handler.process_input('user', 'Answer this question: what food?')
+
+        self.assertEqual(LLM_REQUEST_SECONDS.count(provider=handler.provider, mode='query'), 1)
+        self.assertEqual(LLM_REQUEST_SECONDS.count(provider=handler.provider, mode='answer'), 1)
+
+    def test_auth_db_time(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteUserStore(os.path.join(tmp, 'users.db'))
+            store._write("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, hashed_password TEXT)")
+            store._fetchone("SELECT user_id FROM users WHERE user_id = ?", ('nobody',))
+            self.assertEqual(AUTH_DB_SECONDS.count(backend='sqlite'), 2)
+
+    def test_postgres_auth_db_time(self):
+        """Every PostgreSQL query, user listings included, is timed"""
+        cursor = Mock(fetchone=AsyncMock(return_value=(2,)), fetchall=AsyncMock(return_value=[('alice',), ('bob',)]))
+        conn = Mock(execute=AsyncMock(return_value=cursor))
+        pool = Mock(connection=Mock(return_value=Mock(__aenter__=AsyncMock(return_value=conn), __aexit__=AsyncMock())))
+        store = PostgresUserStore("postgresql://localhost/capsule")
+        store._pool = pool
+
+        async def queries():
+            return await store.list_users(limit=2), await store.count_users()
+
+        self.assertEqual(asyncio.run(queries()), (['alice', 'bob'], 2))
+        self.assertEqual(AUTH_DB_SECONDS.count(backend='postgres'), 2)
+
+    def test_cache_hit_ratio(self):
+        record_cache('pages', True)
+        record_cache('pages', True)
+        record_cache('pages', False)
+        self.assertEqual(CACHE_REQUESTS.value(cache='pages', result='hit'), 2)
+        self.assertIn('capsule_cache_hit_ratio{cache="pages"} 0.6666', registry.render())
+
+    def test_metrics_endpoint(self):
+        """/metrics exists and reports route templates when enabled"""
+        from fastapi.testclient import TestClient
+        from api.routes import APIRoutes
+
+        client = TestClient(APIRoutes().get_app())
+        client.get("/api")
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('capsule_http_request_duration_seconds_count{method="GET",route="/api",status="200"} 1', response.text)
+
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test the queue-based JSON logging"""
+
+    def _record(self, level=logging.INFO, msg="hello %s", args=("world",), **extra):
+        record = logging.LogRecord("capsule.test", level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter(self):
+        entry = json.loads(logs.JSONFormatter().format(self._record(request_id="abc", user_id="u1")))
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["user_id"], "u1")
+        self.assertEqual(entry["level"], "INFO")
+
+    def test_debug_sampling(self):
+        keep_none = logs.DebugSamplingFilter(0.0)
+        self.assertFalse(keep_none.filter(self._record(level=logging.DEBUG)))
+        self.assertTrue(keep_none.filter(self._record(level=logging.INFO)))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = logs.DroppingQueueHandler(queue.Queue(maxsize=1))
+        before = logs.DroppingQueueHandler.dropped
+        handler.handle(self._record())
+        handler.handle(self._record())
+        self.assertEqual(logs.DroppingQueueHandler.dropped, before + 1)
+
+    def test_records_written_with_request_id(self):
+        logs.shutdown_logging()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capsule.log")
+            logs.configure_logging(log_file=path)
+            try:
+                logs.new_request_id("req-123")
+                logs.get_logger("test").info("query matched", extra={"matches": 3})
+            finally:
+                logs.shutdown_logging()
+            with open(path) as f:
+                entry = json.loads(f.readline())
+        self.assertEqual(entry["request_id"], "req-123")
+        self.assertEqual(entry["matches"], 3)
+
+    def test_one_log_file_per_worker(self):
+        logs.shutdown_logging()
+        with tempfile.TemporaryDirectory() as tmp, patch.dict(logs.SERVER_CONFIG, {'workers': 2}):
+            logs.configure_logging(log_file=os.path.join(tmp, "capsule.log"))
+            try:
+                logs.get_logger("test").info("hello")
+            finally:
+                logs.shutdown_logging()
+            self.assertEqual(os.listdir(tmp), [f"capsule.{os.getpid()}.log"])
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+class TestProfiler(unittest.TestCase):
+    """Test the sampling and allocation profilers behind /admin/profile"""
+
+    def setUp(self):
+        self.stop = threading.Event()
+        self.threads = [threading.Thread(target=_spin, args=(self.stop,), name='busy'),
+                        threading.Thread(target=self.stop.wait, name='idle')]
+        for thread in self.threads:
+            thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def test_cpu_mode_samples_only_running_threads(self):
+        with SamplingProfiler(interval=0.005) as profiler:
+            time.sleep(0.3)
+        roots = {stack.split(';')[0] for stack in profiler.stacks}
+        self.assertIn('busy', roots)
+        self.assertNotIn('idle', roots)
+        self.assertGreater(profiler.samples, 10)
+
+    def test_wall_mode_collapsed_stacks(self):
+        with SamplingProfiler(interval=0.005, mode='wall') as profiler:
+            time.sleep(0.1)
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(any(line.startswith('idle;') for line in lines))
+        busy = next(line for line in lines if line.startswith('busy;'))
+        stack, count = busy.rsplit(' ', 1)
+        self.assertIn('_spin (monitoring/test_monitoring.py:', stack)
+        self.assertGreater(int(count), 0)
+
+    def test_allocation_snapshot(self):
+        with AllocationProfiler() as profiler:
+            kept = [bytearray(1000) for _ in range(500)]
+        heaviest, weight = profiler.stacks.most_common(1)[0]
+        self.assertIn('monitoring/test_monitoring.py:', heaviest.split(';')[-1])
+        self.assertGreaterEqual(weight, 500 * 1000)
+        self.assertEqual(profiler.summary()['bytes'], sum(profiler.stacks.values()))
+        del kept
+
+    def test_one_profile_at_a_time(self):
+        with SamplingProfiler():
+            with self.assertRaises(ProfilerBusy):
+                AllocationProfiler().start()
+        with AllocationProfiler():  # Released again
+            pass
+
+
+class TestTracing(unittest.TestCase):
+    """Test request spans, their export and the outlier analysis"""
+
+    def setUp(self):
+        self.exporter = MemoryExporter()
+        self.patches = [patch.object(tracer, 'enabled', True), patch.object(tracer, 'exporter', self.exporter)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def spans(self):
+        tracer.flush()
+        return {span['name']: span for span in self.exporter.spans}
+
+    def test_stages_become_child_spans(self):
+        async def request():
+            with tracer.trace('GET /query', request_id='req-1') as root:
+                with stage('embed', backend='local'):
+                    pass
+                # Worker threads inherit the request's span through the copied context
+                await asyncio.to_thread(self._vector_query)
+            return root
+
+        root = asyncio.run(request())
+        spans = self.spans()
+        self.assertEqual(set(spans), {'GET /query', 'embed', 'vector_query'})
+        self.assertEqual(spans['GET /query']['kind'], 'server')
+        self.assertEqual(spans['GET /query']['attributes'], {'request_id': 'req-1'})
+        for name in ('embed', 'vector_query'):
+            self.assertEqual(spans[name]['trace_id'], root.trace_id)
+            self.assertEqual(spans[name]['parent_id'], root.span_id)
+        self.assertEqual(spans['vector_query']['attributes'], {'top_k': 5, 'matches': 3})
+
+    @staticmethod
+    def _vector_query():
+        with stage('vector_query', top_k=5) as span:
+            span.set(matches=3)
+
+    def test_no_spans_outside_traced_requests(self):
+        with stage('embed') as span:
+            span.set(model='x')  # The no-op span accepts attributes too
+        with patch.object(tracer, 'sample_rate', 0.0), tracer.trace('GET /query'):
+            with stage('embed'):
+                pass
+        self.assertEqual(self.spans(), {})
+
+    def test_errors_and_incoming_traceparent(self):
+        traceparent = '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+        with self.assertRaises(ValueError):
+            with tracer.trace('POST /add', traceparent=traceparent):
+                with stage('llm_refine'):
+                    raise ValueError("provider down")
+        spans = self.spans()
+        self.assertEqual(spans['POST /add']['trace_id'], 'a' * 32)
+        self.assertEqual(spans['POST /add']['parent_id'], 'b' * 16)
+        self.assertEqual(spans['llm_refine']['status'], 'error')
+        self.assertIn('provider down', spans['llm_refine']['error'])
+
+    def test_full_queue_drops_spans(self):
+        blocked = threading.Event()
+        slow = Mock(export=lambda spans: blocked.wait(5))
+        local = Tracer(enabled=True, exporter=slow, queue_size=2, batch_size=1, flush_interval=0)
+        for _ in range(10):
+            with local.trace('GET /'):
+                pass
+        blocked.set()
+        self.assertGreater(local.dropped, 0)
+
+    def test_export_errors_keep_the_exporter_running(self):
+        failing = Mock(export=Mock(side_effect=OSError("disk full")))
+        local = Tracer(enabled=True, exporter=failing, flush_interval=0)
+        with self.assertLogs('capsule.monitoring.tracing', level='WARNING') as logged:
+            for _ in range(3):
+                with local.trace('GET /'):
+                    pass
+                local.flush()
+        self.assertEqual(local.failed, 3)
+        self.assertEqual(len(logged.records), 1)  # Rate-limited
+        failing.export.side_effect = None
+        with local.trace('GET /'):
+            pass
+        local.flush()
+        self.assertEqual(failing.export.call_count, 4)
+        self.assertEqual(local._queue.unfinished_tasks, 0)
+
+    def test_otlp_round_trip_through_collector(self):
+        """OTLPExporter -> stand-in collector -> JSONL -> analysis"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'traces.jsonl')
+            collector = Collector(output, port=0).serve_in_thread()
+            local = Tracer(enabled=True, exporter=OTLPExporter(collector.endpoint), flush_interval=0.01)
+            for delay in (0, 0, 0.05):
+                with local.trace('GET /query', request_id=f"req-{delay}") as root:
+                    with local.span('vector_query', top_k=5, cached=False, tags=['a']):
+                        time.sleep(delay)
+            local.flush()
+            collector.close()
+            spans = load_spans([output])
+        self.assertEqual(len(spans), 6)
+        query = next(span for span in spans if span['name'] == 'vector_query')
+        self.assertEqual(query['attributes'], {'top_k': 5, 'cached': False, 'tags': ['a']})
+        result = analyze(spans, top=1, percentile=90)
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(result['stages']['vector_query']['count'], 3)
+        slowest = result['outliers'][0]
+        self.assertEqual(slowest['attributes']['request_id'], 'req-0.05')
+        self.assertGreaterEqual(slowest['stages'][0]['duration_ms'], 50)
+
+    def test_otlp_encoding(self):
+        with tracer.trace('GET /', count=2, ratio=0.5, cached=True):
+            pass
+        span = self.spans()['GET /']
+        encoded = to_otlp([span], 'capsule')
+        otlp_span = encoded['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+        self.assertEqual(otlp_span['kind'], 2)
+        self.assertEqual(otlp_span['attributes'][0], {'key': 'count', 'value': {'intValue': '2'}})
+        self.assertNotIn('parentSpanId', otlp_span)
+        self.assertEqual(from_otlp(encoded), [span])
+
+    def test_jsonl_rotation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'traces.jsonl')
+            exporter = JSONLExporter(path, max_bytes=2000, backup_count=2)
+            span = {'trace_id': 't', 'span_id': 's', 'name': 'embed', 'attributes': {'pad': 'x' * 200}}
+            exporter.export([span] * 30)
+            exporter.close()
+            self.assertTrue(os.path.exists(path + '.2'))
+            self.assertFalse(os.path.exists(path + '.3'))
+            self.assertLessEqual(os.path.getsize(path), 2000)
+            self.assertTrue(all(loaded == span for loaded in load_spans([path + '*'])))
+
+
+def run_all_tests():
+    """Run all monitoring module tests"""
+    print("=" * 60)
+    print("RUNNING MONITORING MODULE TESTS")
+    print("=" * 60)
+
+    # Create test suite
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+
+    # Add all test classes
+    suite.addTests(loader.loadTestsFromTestCase(TestMetricsRegistry))
+    suite.addTests(loader.loadTestsFromTestCase(TestInstrumentation))
+    suite.addTests(loader.loadTestsFromTestCase(TestStructuredLogging))
+    suite.addTests(loader.loadTestsFromTestCase(TestProfiler))
+    suite.addTests(loader.loadTestsFromTestCase(TestTracing))
+
+    # Run tests
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+
+    # Print summary
+    print("\n" + "=" * 60)
+    if result.wasSuccessful():
+        print("✅ ALL MONITORING MODULE TESTS PASSED!")
+        print("Monitoring module is ready for merge to develop branch.")
+    else:
+        print(f"❌ {len(result.failures)} FAILURE(S), {len(result.errors)} ERROR(S)")
+        print("Fix issues before merging to develop branch.")
+    print("=" * 60)
+
+    return result.wasSuccessful()
+
+
+if __name__ == "__main__":
+    run_all_tests()
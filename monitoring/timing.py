@@ -0,0 +1,72 @@
+"""
+Request Timing
+
+Per-request stage timings carried in a context variable. Middleware starts a
+RequestTiming for the routes it cares about; handlers deep in the stack wrap
+their work in `stage('embed')` without knowing whether anyone is listening.
+Outside a timed or traced request `stage()` costs two ContextVar lookups.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .tracing import tracer
+
+
+class RequestTiming:
+    """Accumulated duration per stage for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}  # name -> seconds (summed if a stage repeats)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing_header(self) -> str:
+        """Render as a Server-Timing header value (durations in milliseconds)"""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def breakdown_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar('request_timing', default=None)
+
+
+def start_timing() -> RequestTiming:
+    """Begin timing the current request (the context is per asyncio task)"""
+    timing = RequestTiming()
+    _current.set(timing)
+    return timing
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a block as a named stage of the current request, if one is being timed.
+
+    The stage is also a span when the request is traced (see tracing.py); the span
+    is yielded so attributes known only at the end (token counts, matches) can be set.
+    """
+    with tracer.span(name, **attributes) as span:
+        timing = _current.get()
+        if timing is None:
+            yield span
+            return
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            timing.add(name, time.perf_counter() - start)
@@ -0,0 +1,510 @@
+"""
+Request Tracing
+
+Distributed-tracing style spans for the stages of a request. TracingMiddleware
+opens a root span per request; `stage()` in timing.py opens a child span for
+each stage (auth, embed, vector_query, llm_refine, ...), so every instrumented
+call site gets a span without importing this module. Spans carry attributes
+(provider, model, token counts, top_k, matches) and follow the request into
+worker threads, because asyncio.to_thread copies the context.
+
+Finished spans go on a bounded queue; a background thread exports them in
+batches to a rotating JSONL file or to an OTLP/HTTP collector (JSON
+encoding). A full queue drops spans rather than blocking a request. With
+tracing off, or for a request that was not sampled, `span()` returns a shared
+no-op span after one ContextVar lookup.
+
+    python -m monitoring.tracing collect --port 4318 --output traces.jsonl
+    python -m monitoring.tracing analyze traces.jsonl --top 10
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import TRACING_CONFIG
+from concurrency.process import reset_after_fork
+from .logs import get_logger, per_worker_path
+
+logger = get_logger('monitoring.tracing')
+
+ERROR_LOG_INTERVAL = 60  # Seconds between export failure logs
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = 'internal', attributes: Dict = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes) -> 'Span':
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def traceparent(self) -> str:
+        """W3C trace context header value pointing at this span"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'name': self.name, 'kind': self.kind, 'start_ns': self.start_ns, 'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3), 'attributes': self.attributes,
+            'status': 'error' if self.error else 'ok', **({'error': self.error} if self.error else {}),
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is traced, so call sites never check"""
+
+    trace_id = span_id = parent_id = traceparent = None
+
+    def set(self, **attributes) -> '_NoopSpan':
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar('span', default=None)
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+class MemoryExporter:
+    """Keeps exported spans in a list (tests)"""
+
+    def __init__(self):
+        self.spans: List[Dict] = []
+
+    def export(self, spans: List[Dict]):
+        self.spans.extend(spans)
+
+    def close(self):
+        pass
+
+
+class JSONLExporter:
+    """One span per line in a size-rotated file (rotation as in LOGGING_CONFIG)"""
+
+    def __init__(self, path: str, max_bytes: int = TRACING_CONFIG['max_file_size'],
+                 backup_count: int = TRACING_CONFIG['backup_count']):
+        self.handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                            encoding='utf-8', delay=True)
+
+    def export(self, spans: List[Dict]):
+        for span in spans:
+            self.handler.emit(logging.makeLogRecord({'msg': json.dumps(span, default=str)}))
+
+    def close(self):
+        self.handler.close()
+
+
+class OTLPExporter:
+    """POSTs batches to an OTLP/HTTP collector's /v1/traces in the JSON encoding"""
+
+    def __init__(self, endpoint: str = TRACING_CONFIG['otlp_endpoint'], service_name: str = TRACING_CONFIG['service_name'],
+                 timeout: float = 5):
+        import requests
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.failed = 0
+
+    def export(self, spans: List[Dict]):
+        try:
+            self.session.post(self.url, json=to_otlp(spans, self.service_name), timeout=self.timeout).raise_for_status()
+        except Exception:
+            self.failed += len(spans)  # The collector being down must not affect requests
+
+    def close(self):
+        self.session.close()
+
+
+def create_exporter(kind: str = None):
+    kind = kind or TRACING_CONFIG['exporter']
+    if kind == 'jsonl':
+        return JSONLExporter(per_worker_path(TRACING_CONFIG['file']))
+    if kind == 'otlp':
+        return OTLPExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER '{kind}': use 'jsonl' or 'otlp'")
+
+
+class Tracer:
+    """Creates spans and exports finished ones from a background thread"""
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0, exporter=None,
+                 queue_size: int = 10000, batch_size: int = 512, flush_interval: float = 1.0):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._configured_exporter = exporter  # None: built from TRACING_CONFIG on first export
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.failed = 0  # Spans lost to exporter errors
+        self._error_logged = -ERROR_LOG_INTERVAL
+        self._after_fork()
+        reset_after_fork(self)
+
+    def _after_fork(self):
+        # Spans queued by the parent are its to export; the exporter thread didn't survive the fork,
+        # and a JSONL exporter the parent built writes to the parent's file
+        self.exporter = self._configured_exporter
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, traceparent: str = None, **attributes):
+        """Root span of a request; continues the caller's trace if `traceparent` is valid"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield NOOP_SPAN
+            return
+        match = TRACEPARENT.match(traceparent or '')
+        trace_id, parent_id = match.groups() if match else (os.urandom(16).hex(), None)
+        with self._run(Span(name, trace_id, parent_id, kind='server', attributes=attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child of the current span; a no-op outside a traced request"""
+        parent = _current.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+        with self._run(Span(name, parent.trace_id, parent.span_id, attributes=attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _run(self, span: Span):
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            self._submit(span)
+
+    def _submit(self, span: Span):
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._export_loop, name='span-exporter', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _export_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._export(batch)
+
+    def _export(self, batch: List[Dict]):
+        try:
+            if self.exporter is None:
+                self.exporter = create_exporter()
+            self.exporter.export(batch)
+        except Exception:
+            # An unwritable file or a collector that is down loses this batch, not the exporter thread
+            self.failed += len(batch)
+            now = time.monotonic()
+            if now - self._error_logged >= ERROR_LOG_INTERVAL:
+                self._error_logged = now
+                logger.warning("span export failed", exc_info=True, extra={"spans": len(batch), "failed": self.failed})
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5):
+        """Wait until queued spans are exported (at exit, and in tests)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+tracer = Tracer(
+    enabled=TRACING_CONFIG['enabled'],
+    sample_rate=TRACING_CONFIG['sample_rate'],
+    queue_size=TRACING_CONFIG['queue_size'],
+    batch_size=TRACING_CONFIG['batch_size'],
+    flush_interval=TRACING_CONFIG['flush_interval'],
+)
+
+
+# OTLP/HTTP JSON encoding (opentelemetry-proto, trace/v1)
+
+_OTLP_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(v) for v in value]}}
+    return {'stringValue': str(value)}
+
+
+def _from_otlp_value(value: Dict):
+    if 'arrayValue' in value:
+        return [_from_otlp_value(v) for v in value['arrayValue'].get('values', [])]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    for key in ('boolValue', 'doubleValue', 'stringValue'):
+        if key in value:
+            return value[key]
+    return None
+
+
+def to_otlp(spans: Iterable[Dict], service_name: str) -> Dict:
+    """ExportTraceServiceRequest for span dicts"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{
+            'scope': {'name': 'capsule'},
+            'spans': [{
+                'traceId': span['trace_id'],
+                'spanId': span['span_id'],
+                **({'parentSpanId': span['parent_id']} if span['parent_id'] else {}),
+                'name': span['name'],
+                'kind': _OTLP_KINDS.get(span['kind'], 1),
+                'startTimeUnixNano': str(span['start_ns']),
+                'endTimeUnixNano': str(span['end_ns']),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span['attributes'].items()],
+                'status': {'code': 2, 'message': span['error']} if span.get('error') else {'code': 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+def from_otlp(request: Dict) -> List[Dict]:
+    """Span dicts (the JSONL format) from an ExportTraceServiceRequest"""
+    kinds = {code: name for name, code in _OTLP_KINDS.items()}
+    spans = []
+    for resource_spans in request.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for item in scope_spans.get('spans', []):
+                start, end = int(item['startTimeUnixNano']), int(item['endTimeUnixNano'])
+                status = item.get('status', {})
+                span = {
+                    'trace_id': item['traceId'], 'span_id': item['spanId'], 'parent_id': item.get('parentSpanId') or None,
+                    'name': item['name'], 'kind': kinds.get(item.get('kind'), 'internal'),
+                    'start_ns': start, 'end_ns': end, 'duration_ms': round((end - start) / 1e6, 3),
+                    'attributes': {a['key']: _from_otlp_value(a['value']) for a in item.get('attributes', [])},
+                    'status': 'error' if status.get('code') == 2 else 'ok',
+                }
+                if status.get('code') == 2:
+                    span['error'] = status.get('message', '')
+                spans.append(span)
+    return spans
+
+
+class Collector:
+    """Stand-in OTLP/HTTP collector: accepts JSON exports on /v1/traces and writes spans as JSONL"""
+
+    def __init__(self, output: str, host: str = '127.0.0.1', port: int = 4318):
+        self.exporter = JSONLExporter(output)
+        self.received = 0
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path != '/v1/traces' or 'json' not in self.headers.get('Content-Type', ''):
+                    # The protobuf encoding isn't supported by this stand-in
+                    self.send_response(404 if self.path != '/v1/traces' else 415)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                collector.receive(json.loads(body))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def receive(self, request: Dict):
+        spans = from_otlp(request)
+        with self._lock:
+            self.exporter.export(spans)
+            self.received += len(spans)
+
+    def serve_in_thread(self) -> 'Collector':
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.exporter.close()
+
+
+# Outlier analysis
+
+def load_spans(paths: Iterable[str]) -> List[Dict]:
+    """Spans from JSONL files (rotated backups and per-worker files included by glob)"""
+    spans = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding='utf-8') as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+    return spans
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def analyze(spans: List[Dict], top: int = 10, percentile: float = 99) -> Dict:
+    """Latency per stage, and the slowest requests above `percentile` with their stage breakdown"""
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span['trace_id']].append(span)
+    stages = defaultdict(list)
+    requests = []
+    for trace_spans in traces.values():
+        ids = {span['span_id'] for span in trace_spans}
+        roots = [span for span in trace_spans if span['parent_id'] not in ids]
+        root = max(roots, key=lambda span: span['duration_ms'])
+        children = sorted((span for span in trace_spans if span is not root), key=lambda span: span['start_ns'])
+        for child in children:
+            stages[child['name']].append(child['duration_ms'])
+        requests.append({
+            'trace_id': root['trace_id'], 'name': root['name'], 'duration_ms': root['duration_ms'],
+            'attributes': root['attributes'], 'status': root['status'],
+            'stages': [{'name': child['name'], 'offset_ms': round((child['start_ns'] - root['start_ns']) / 1e6, 3),
+                        'duration_ms': child['duration_ms'], 'attributes': child['attributes'], 'status': child['status']}
+                       for child in children],
+        })
+    durations = [request['duration_ms'] for request in requests]
+    threshold = _percentile(durations, percentile) if durations else 0.0
+    outliers = sorted((r for r in requests if r['duration_ms'] >= threshold), key=lambda r: -r['duration_ms'])[:top]
+    return {
+        'requests': len(requests),
+        'percentile': percentile,
+        'threshold_ms': threshold,
+        'stages': {name: {'count': len(values), 'p50_ms': statistics.median(values),
+                          'p95_ms': _percentile(values, 95), 'p99_ms': _percentile(values, 99), 'max_ms': max(values)}
+                   for name, values in sorted(stages.items())},
+        'outliers': outliers,
+    }
+
+
+def print_analysis(result: Dict):
+    print(f"{result['requests']} requests; outliers are at or above p{result['percentile']:g} "
+          f"({result['threshold_ms']:.1f} ms)\n")
+    print(f"{'stage':16} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in result['stages'].items():
+        print(f"{name:16} {stats['count']:7d} {stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} "
+              f"{stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}")
+    for request in result['outliers']:
+        request_id = request['attributes'].get('request_id', '')
+        print(f"\n{request['duration_ms']:9.1f} ms  {request['name']}  trace={request['trace_id']}  request_id={request_id}")
+        accounted = 0.0
+        for stage in request['stages']:
+            accounted += stage['duration_ms']
+            attributes = ' '.join(f"{k}={v}" for k, v in stage['attributes'].items())
+            flag = '  ERROR' if stage['status'] == 'error' else ''
+            print(f"  +{stage['offset_ms']:8.1f} {stage['duration_ms']:9.1f} ms  {stage['name']:14} {attributes}{flag}")
+        print(f"  {'':9} {request['duration_ms'] - accounted:9.1f} ms  (outside stages)")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m monitoring.tracing', description="Trace collection and analysis")
+    commands = parser.add_subparsers(dest='command', required=True)
+    collect = commands.add_parser('collect', help="run a stand-in OTLP/HTTP collector writing JSONL")
+    collect.add_argument('--host', default='127.0.0.1')
+    collect.add_argument('--port', type=int, default=4318)
+    collect.add_argument('--output', default=TRACING_CONFIG['file'])
+    report = commands.add_parser('analyze', help="stage latencies and the slowest requests")
+    report.add_argument('files', nargs='+', help="JSONL span files or globs, e.g. 'traces*.jsonl*'")
+    report.add_argument('--top', type=int, default=10, help="outlier requests to show")
+    report.add_argument('--percentile', type=float, default=99, help="only requests at or above this percentile")
+    report.add_argument('--json', action='store_true', help="print the analysis as JSON")
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        collector = Collector(args.output, args.host, args.port)
+        print(f"collecting OTLP/HTTP JSON on {collector.endpoint}/v1/traces into {args.output}")
+        try:
+            collector.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            collector.exporter.close()
+        return
+    result = analyze(load_spans(args.files), args.top, args.percentile)
+    if args.json:
+        print(json.dumps(result, indent=1))
+    else:
+        print_analysis(result)
+
+
+if __name__ == "__main__":
+    main()
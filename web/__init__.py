@@ -14,20 +14,27 @@ Other modules should import from here:
 
 from .interface import web_service
 
-# Import the app for Render deployment (since Render is using 'uvicorn web:app')
-try:
-    import sys
-    import os
-    # Add parent directory to path so we can import from develop
-    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-    from develop.app import create_app
-    
-    # Create the app instance that Render expects
-    app = create_app()
-    print("FastAPI app created successfully for deployment")
-except Exception as e:
-    print(f"Warning: Could not create FastAPI app: {e}")
-    app = None
+_app = None
+
+
+def __getattr__(name):
+    """Build the app for 'uvicorn web:app' on first access, not whenever the module is imported"""
+    global _app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        try:
+            import sys
+            import os
+            # Add parent directory to path so we can import from develop
+            sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+            from develop.app import create_app
+            
+            _app = create_app()
+            print("FastAPI app created successfully for deployment")
+        except Exception as e:
+            print(f"Warning: Could not create FastAPI app: {e}")
+    return _app
 
 # Export the main service and app
 __all__ = ['web_service', 'app']
@@ -189,6 +189,50 @@ class TestWebFiles(unittest.TestCase):
         self.assertIn('.btn', content)
 
 
+class TestAdminUsers(unittest.TestCase):
+    """Test the /admin/users listing contract"""
+    
+    def setUp(self):
+        import asyncio
+        import tempfile
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from unittest.mock import patch
+        from fastapi.testclient import TestClient
+        from authentication.store import SQLiteUserStore
+        import web.web as web_app
+        
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteUserStore(os.path.join(self.tmp.name, 'users.db'))
+        asyncio.run(self.store.init_schema())
+        for user_id, created_at in (("alice", "2024-01-01 00:00:00"), ("bob", "2024-02-01 00:00:00"),
+                                    ("carol", "2024-03-01 00:00:00")):
+            self.store._write("INSERT INTO users VALUES (?, 'hash', ?)", (user_id, created_at))
+        self.patch = patch.object(web_app, 'user_store', self.store)
+        self.patch.start()
+        web_app.app.dependency_overrides[web_app.get_current_user] = lambda: {"user_id": "admin"}
+        self.web_app = web_app
+        self.client = TestClient(web_app.app)
+    
+    def tearDown(self):
+        import asyncio
+        self.web_app.app.dependency_overrides.clear()
+        self.patch.stop()
+        asyncio.run(self.store.close())
+        self.tmp.cleanup()
+    
+    def test_newest_first_with_created_at(self):
+        first = self.client.get("/admin/users?limit=2").json()
+        self.assertEqual(first["users"], [{"user_id": "carol", "created_at": "2024-03-01 00:00:00"},
+                                          {"user_id": "bob", "created_at": "2024-02-01 00:00:00"}])
+        self.assertEqual(first["count"], 3)
+        second = self.client.get("/admin/users", params={"after": first["next_after"], "limit": 2}).json()
+        self.assertEqual(second["users"], [{"user_id": "alice", "created_at": "2024-01-01 00:00:00"}])
+        self.assertIsNone(second["next_after"])
+    
+    def test_rejects_non_positive_limit(self):
+        self.assertEqual(self.client.get("/admin/users?limit=0").status_code, 422)
+
+
 def run_all_tests():
     """Run all web module tests"""
     print("=" * 60)
@@ -202,6 +246,7 @@ def run_all_tests():
     # Add all test classes
     suite.addTests(loader.loadTestsFromTestCase(TestWebModule))
     suite.addTests(loader.loadTestsFromTestCase(TestWebFiles))
+    suite.addTests(loader.loadTestsFromTestCase(TestAdminUsers))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
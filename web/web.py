@@ -1,183 +1,106 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Form
+from fastapi import FastAPI, Depends, HTTPException, status, Form, Query
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from passlib.context import CryptContext
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from database.database import DBHandler
 from llm.llm import LLMHandler
-import sqlite3
+import asyncio
 import uvicorn
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
+from authentication.store import create_user_store, is_postgres_url, verify_password
+from monitoring.logs import configure_logging, get_logger
+from api.middleware import RequestIdMiddleware
 
-try:
-    import psycopg
-    POSTGRES_AVAILABLE = True
-    POSTGRES_MODULE = 'psycopg'
-except ImportError:
-    try:
-        import psycopg2
-        POSTGRES_AVAILABLE = True
-        POSTGRES_MODULE = 'psycopg2'
-    except ImportError:
-        POSTGRES_AVAILABLE = False
-        POSTGRES_MODULE = None
-        print("⚠️  PostgreSQL driver not available, using SQLite fallback")
+configure_logging()
+logger = get_logger('web')
 
-try:
-    handler = LLMHandler()
-    print("✓ LLM Handler initialized successfully")
-except Exception as e:
-    print(f"✗ LLM Handler initialization failed: {e}")
-    handler = None
+# Built by the lifespan, so importing this module doesn't construct provider clients
+handler = None
+db = None
 
-try:
-    db = DBHandler()
-    print("✓ Database Handler initialized successfully")
-except Exception as e:
-    print(f"✗ Database Handler initialization failed: {e}")
-    db = None
+def init_handlers():
+    """Construct the LLM and database handlers (routes answer 500 for any that fail)"""
+    global handler, db
+    try:
+        handler = LLMHandler()
+        logger.info("LLM handler initialized")
+    except Exception as e:
+        logger.error("LLM handler initialization failed: %s", e)
+        handler = None
 
-app = FastAPI()
+    try:
+        db = DBHandler()
+        logger.info("database handler initialized")
+    except Exception as e:
+        logger.error("database handler initialization failed: %s", e)
+        db = None
 
-# Database connection helper
-@contextmanager
-def get_db_connection():
-    """Get database connection (PostgreSQL if available, SQLite fallback)"""
-    database_url = os.getenv('DATABASE_URL')
-    
-    if database_url and database_url.startswith('postgresql') and POSTGRES_AVAILABLE:
-        # Use PostgreSQL (psycopg3 or psycopg2)
-        if POSTGRES_MODULE == 'psycopg':
-            import psycopg
-            conn = psycopg.connect(database_url)
-        else:
-            import psycopg2
-            conn = psycopg2.connect(database_url)
-        try:
-            yield conn
-        finally:
-            conn.close()
-    else:
-        # Fallback to SQLite for local development
-        conn = sqlite3.connect("users.db")
-        try:
-            yield conn
-        finally:
-            conn.close()
+# PostgreSQL (async pool) if DATABASE_URL is set, SQLite fallback for local development
+user_store = create_user_store()
 
 def is_postgres():
     """Check if using PostgreSQL"""
-    database_url = os.getenv('DATABASE_URL')
-    return database_url and database_url.startswith('postgresql') and POSTGRES_AVAILABLE
-
-# Initialize database for users
-def init_user_db():
-    database_url = os.getenv('DATABASE_URL')
-    print(f"🔍 init_user_db called - DATABASE_URL: {bool(database_url)}, POSTGRES_AVAILABLE: {POSTGRES_AVAILABLE}")
-    
-    if database_url and database_url.startswith('postgresql') and POSTGRES_AVAILABLE:
-        # PostgreSQL initialization
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id TEXT PRIMARY KEY,
-                        hashed_password TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                conn.commit()
-                cursor.close()
-            print("✅ PostgreSQL users table initialized")
-        except Exception as e:
-            print(f"❌ PostgreSQL initialization failed: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        # SQLite initialization
-        conn = sqlite3.connect("users.db")
-        cursor = conn.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, hashed_password TEXT)")
-        conn.commit()
-        conn.close()
-        print("✓ SQLite users database initialized (local fallback)")
+    return is_postgres_url(os.getenv('DATABASE_URL'))
+
+@asynccontextmanager
+async def lifespan(app):
+    """Build the handlers, open the user store and create the users table before serving"""
+    await asyncio.to_thread(init_handlers)
+    await user_store.open()
+    await user_store.init_schema()
+    logger.info("users table initialized", extra={"backend": user_store.backend})
+    try:
+        yield
+    finally:
+        await user_store.close()
 
-# Initialize database on startup
-print("🔧 Starting database initialization...")
-init_user_db()
-print("🔧 Database initialization complete")
+app = FastAPI(lifespan=lifespan)
 
-# Debug environment variables on startup
-print("=== Environment Variables Debug ===")
-print(f"GROK_API_KEY: {'Set' if os.getenv('GROK_API_KEY') else 'Not set'}")
-print(f"PINECONE_API_KEY: {'Set' if os.getenv('PINECONE_API_KEY') else 'Not set'}")
-print(f"DEFAULT_PROVIDER: {os.getenv('DEFAULT_PROVIDER', 'grok')}")
-print(f"DEFAULT_DB_PROVIDER: {os.getenv('DEFAULT_DB_PROVIDER', 'pinecone')}")
-print(f"DATABASE_URL: {'Set (PostgreSQL)' if os.getenv('DATABASE_URL') else 'Not set (SQLite)'}")
-print(f"Using database: {'PostgreSQL' if is_postgres() else 'SQLite'}")
-print("=====================================")
+# Startup environment summary (presence only, never values)
+logger.info("environment", extra={
+    "grok_api_key": bool(os.getenv('GROK_API_KEY')),
+    "pinecone_api_key": bool(os.getenv('PINECONE_API_KEY')),
+    "default_provider": os.getenv('DEFAULT_PROVIDER', 'grok'),
+    "default_db_provider": os.getenv('DEFAULT_DB_PROVIDER', 'pinecone'),
+    "user_db": 'postgres' if is_postgres() else 'sqlite',
+})
 
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+app.add_middleware(RequestIdMiddleware)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        placeholder = "%s" if is_postgres() else "?"
-        cursor.execute(f"SELECT user_id FROM users WHERE user_id = {placeholder}", (token,))
-        user = cursor.fetchone()
-        
-    if not user:
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    user_id = await user_store.get_user(token)
+    if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     
-    return {"user_id": user[0]}
+    return {"user_id": user_id}
 
 @app.post("/register")
 async def register(user_id: str = Form(), password: str = Form()):
-    print(f"[REGISTER] Registering user: {user_id}, using PostgreSQL: {is_postgres()}")
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        placeholder = "%s" if is_postgres() else "?"
-        
-        # Check if user exists
-        cursor.execute(f"SELECT user_id FROM users WHERE user_id = {placeholder}", (user_id,))
-        if cursor.fetchone():
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="user already exists")
-        
-        # Hash password and insert
-        hashed_password = pwd_context.hash(password)
-        cursor.execute(f"INSERT INTO users (user_id, hashed_password) VALUES ({placeholder}, {placeholder})", (user_id, hashed_password))
-        conn.commit()
-        print(f"[REGISTER] Successfully registered {user_id}")
+    if not await user_store.register(user_id, password):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="user already exists")
+    logger.info("user registered", extra={"user_id": user_id})
         
     return {"status": "registered"}
 
 @app.post("/login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    print(f"[LOGIN] Login attempt: {form_data.username}, using PostgreSQL: {is_postgres()}")
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        placeholder = "%s" if is_postgres() else "?"
-        cursor.execute(f"SELECT hashed_password FROM users WHERE user_id = {placeholder}", (form_data.username,))
-        user = cursor.fetchone()
+    hashed_password = await user_store.get_password_hash(form_data.username)
         
-    if not user:
-        print(f"[LOGIN] User not found: {form_data.username}")
+    if not hashed_password:
+        logger.info("login rejected: unknown user", extra={"user_id": form_data.username})
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="user not found")
     
-    hashed_password = user[0]
-    
-    if not pwd_context.verify(form_data.password, hashed_password):
-        print(f"[LOGIN] Wrong password for: {form_data.username}")
+    if not await asyncio.to_thread(verify_password, form_data.password, hashed_password):
+        logger.info("login rejected: wrong password", extra={"user_id": form_data.username})
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="wrong password")
     
-    print(f"[LOGIN] Success: {form_data.username}")
+    logger.info("login succeeded", extra={"user_id": form_data.username})
     return {"access_token": form_data.username, "token_type": "bearer"}
 
 @app.post("/add")
@@ -193,7 +116,7 @@ async def add(memory: str = Form(), user: dict = Depends(get_current_user)):
         db.add_memory(user_id, refined_memory)
         return {"status": "added"}
     except Exception as e:
-        print(f"Error in /add: {str(e)}")
+        logger.exception("add failed", extra={"user_id": user["user_id"]})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/query")
@@ -205,15 +128,14 @@ async def query(q: str, user: dict = Depends(get_current_user)):
             raise HTTPException(status_code=500, detail="Database Handler not initialized")
             
         user_id = user["user_id"]
-        print(f"Processing query for user {user_id}: {q}")
+        logger.debug("query received", extra={"user_id": user_id, "query_chars": len(q)})
         
         # Process the query
         refined_query = handler.process_input(user_id, q, is_query=True, db_provider=db.provider)
-        print(f"Refined query: {refined_query}")
         
         # Query memories
         results = db.query_memories(user_id, refined_query)
-        print(f"Query results: {results}")
+        logger.debug("query matched", extra={"user_id": user_id, "matches": len(results or [])})
         
         if results and len(results) > 0:
             # Filter out empty results
@@ -221,7 +143,6 @@ async def query(q: str, user: dict = Depends(get_current_user)):
             if filtered_results:
                 summary_prompt = f"Answer this question: '{q}' using only this information: {filtered_results}. Give a direct, natural answer without any metadata."
                 response = handler.process_input(user_id, summary_prompt, is_query=False, db_provider=db.provider)
-                print(f"LLM response: {response}")
                 
                 # The LLM should now return a natural language string directly
                 if isinstance(response, str):
@@ -235,9 +156,7 @@ async def query(q: str, user: dict = Depends(get_current_user)):
         
         return {"results": "No matching memories found."}
     except Exception as e:
-        print(f"Error in /query: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("query failed", extra={"user_id": user["user_id"]})
         return {"results": f"Error processing query: {str(e)}"}
 
 @app.post("/upload")
@@ -283,23 +202,24 @@ async def get_providers():
 
 # Admin endpoints for user management
 @app.get("/admin/users")
-async def list_all_users(user: dict = Depends(get_current_user)):
-    """List all users (requires authentication)"""
+async def list_all_users(after: str = None, limit: int = Query(100, ge=1), user: dict = Depends(get_current_user)):
+    """List users newest first, one keyset page at a time (requires authentication).
+
+    `after` is the previous page's `next_after`: "<created_at>|<user_id>" of its last row.
+    """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id, created_at FROM users ORDER BY created_at DESC")
-            users = cursor.fetchall()
-        
-        return {
-            "users": [
-                {
-                    "user_id": u[0],
-                    "created_at": str(u[1]) if len(u) > 1 and u[1] else "unknown"
-                } for u in users
-            ],
-            "count": len(users)
+        cursor = None
+        if after is not None:
+            created_at, _, last_user_id = after.partition('|')
+            cursor = (created_at, last_user_id)
+        rows = await user_store.list_users_newest_first(after=cursor, limit=limit)
+        page = {
+            "users": [{"user_id": user_id, "created_at": created_at or "unknown"} for user_id, created_at in rows],
+            "next_after": f"{rows[-1][1]}|{rows[-1][0]}" if len(rows) == limit else None
         }
+        if after is None:
+            page["count"] = await user_store.count_users()
+        return page
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -307,18 +227,8 @@ async def list_all_users(user: dict = Depends(get_current_user)):
 async def delete_user(user_id: str, user: dict = Depends(get_current_user)):
     """Delete a specific user (requires authentication)"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            placeholder = "%s" if is_postgres() else "?"
-            
-            # Check if user exists
-            cursor.execute(f"SELECT user_id FROM users WHERE user_id = {placeholder}", (user_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail="user not found")
-            
-            # Delete user
-            cursor.execute(f"DELETE FROM users WHERE user_id = {placeholder}", (user_id,))
-            conn.commit()
+        if not await user_store.delete_user(user_id):
+            raise HTTPException(status_code=404, detail="user not found")
         
         return {"status": "deleted", "user_id": user_id}
     except HTTPException:
@@ -330,14 +240,7 @@ async def delete_user(user_id: str, user: dict = Depends(get_current_user)):
 async def delete_all_users(user: dict = Depends(get_current_user)):
     """Delete all users - USE WITH CAUTION (requires authentication)"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM users")
-            count = cursor.fetchone()[0]
-            
-            cursor.execute("DELETE FROM users")
-            conn.commit()
-        
+        count = await user_store.delete_all_users()
         return {"status": "all users deleted", "count": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))